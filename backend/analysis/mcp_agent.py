@@ -10,7 +10,10 @@ MCP 集成与 LangChain 管道占位实现
 from typing import Dict, Any, List, Optional
 import os
 import requests
-import tiktoken
+try:
+    from backend.utils.tokenizer import count_tokens, truncate_to_tokens
+except ImportError:
+    from utils.tokenizer import count_tokens, truncate_to_tokens
 
 # 支持中国国内模型（OpenAI 兼容模式）：deepseek、qwen(dashscope)
 PROVIDER_DEFAULTS = {
@@ -35,12 +38,12 @@ PROVIDER_DEFAULTS = {
     },
 }
 
-def chat_completion_openai_compatible(api_key: str, prompt: str, provider: str = "deepseek", base_url: Optional[str] = None, model: Optional[str] = None) -> str:
+def chat_completion_openai_compatible(api_key: str, prompt: str, provider: str = "deepseek", base_url: Optional[str] = None, model: Optional[str] = None, bypass_cache: bool = False) -> str:
     try:
         try:
-            from backend.llm.langchain_utils import get_llm
+            from backend.llm.langchain_utils import get_llm, invoke_llm
         except ImportError:
-            from llm.langchain_utils import get_llm
+            from llm.langchain_utils import get_llm, invoke_llm
         from langchain_core.messages import HumanMessage
         
         llm = get_llm(provider, api_key, base_url, model)
@@ -50,10 +53,10 @@ def chat_completion_openai_compatible(api_key: str, prompt: str, provider: str =
         # We can use invoke_chain or just invoke directly
         from langchain_core.messages import SystemMessage
         
-        response = llm.invoke([
+        response = invoke_llm(llm, [
             SystemMessage(content=system_prompt),
             HumanMessage(content=prompt)
-        ])
+        ], bypass_cache=bypass_cache)
         return response.content
     except Exception as e:
         return f"LLM Error: {str(e)}"
@@ -71,7 +74,22 @@ class MockMCPClient:
         return r.json()
 
 # 轻量占位：模拟 LangChain 外部模型调用
-def analyze_repo_with_llm(repo: Dict[str, Any], api_key: str | None = None, provider: Optional[str] = None, base_url: Optional[str] = None, model: Optional[str] = None, content: Optional[str] = None) -> Dict[str, Any]:
+def _configured_model(provider: Optional[str], base_url: Optional[str], model: Optional[str]):
+    """(api_key, provider, base_url, model) from the saved model config, keeping the arguments for fields it leaves empty."""
+    try:
+        try:
+            from backend.utils.config_service import config_service
+        except ImportError:
+            from utils.config_service import config_service
+        cfg = config_service.model_config()
+        if cfg.external_api_key:
+            return cfg.external_api_key, cfg.provider or provider, cfg.base_url or base_url, cfg.model or model
+    except Exception as e:
+        print(f"Failed to load model config: {e}")
+    return None, provider, base_url, model
+
+
+def analyze_repo_with_llm(repo: Dict[str, Any], api_key: str | None = None, provider: Optional[str] = None, base_url: Optional[str] = None, model: Optional[str] = None, content: Optional[str] = None, bypass_cache: bool = False) -> Dict[str, Any]:
     # 构造分析提示词
     name = repo.get('full_name')
     stars = repo.get('stargazers_count', 0)
@@ -81,12 +99,7 @@ def analyze_repo_with_llm(repo: Dict[str, Any], api_key: str | None = None, prov
     # 如果提供了详细内容（如 README），则加入分析
     content_summary = ""
     if content:
-        # Use tiktoken to count tokens
-        try:
-            enc = tiktoken.get_encoding("cl100k_base")
-            token_count = len(enc.encode(content))
-        except Exception:
-            token_count = len(content) // 4
+        token_count = count_tokens(content, model)
 
         if token_count > 18000: # Limit to 18k to be safe under 20k
              try:
@@ -98,30 +111,16 @@ def analyze_repo_with_llm(repo: Dict[str, Any], api_key: str | None = None, prov
                  # 这里逻辑稍微有点绕，因为 get_llm 需要 api_key，而 api_key 可能在下面才获取
                  # 为了简化，我们先尝试获取配置
                  if not api_key:
-                     # 尝试从 DB 获取 (重复代码，但为了安全)
-                     try:
-                        try:
-                            from utils.db import session_scope, MakeConfig
-                        except ImportError:
-                            from backend.utils.db import session_scope, MakeConfig
-                        if session_scope:
-                            with session_scope() as s:
-                                cfg = s.query(MakeConfig).first()
-                                if cfg and cfg.external_api_key:
-                                    api_key = cfg.external_api_key
-                                    provider = cfg.provider or provider
-                                    base_url = cfg.base_url or base_url
-                                    model = cfg.model or model
-                     except: pass
+                     api_key, provider, base_url, model = _configured_model(provider, base_url, model)
                  
                  if api_key:
                      llm = get_llm(provider or "deepseek", api_key, base_url, model)
-                     content_summary = summarize_large_content(llm, content, chunk_size=15000)
+                     content_summary = summarize_large_content(llm, content, chunk_size=15000, bypass_cache=bypass_cache)
                      content_summary = f"\n\n项目详细内容摘要：\n{content_summary}"
                  else:
-                     content_summary = f"\n\n项目详细内容（截断）：\n{content[:5000]}..."
+                     content_summary = f"\n\n项目详细内容（截断）：\n{truncate_to_tokens(content, 1500, model)}..."
              except Exception as e:
-                 content_summary = f"\n\n内容摘要失败: {str(e)}\n内容截断: {content[:2000]}"
+                 content_summary = f"\n\n内容摘要失败: {str(e)}\n内容截断: {truncate_to_tokens(content, 600, model)}"
         else:
             content_summary = f"\n\n项目详细内容：\n{content}"
 
@@ -142,22 +141,7 @@ def analyze_repo_with_llm(repo: Dict[str, Any], api_key: str | None = None, prov
     
     # 如果未提供 api_key，尝试从数据库加载配置
     if not api_key:
-        try:
-            try:
-                from utils.db import session_scope, MakeConfig
-            except ImportError:
-                from backend.utils.db import session_scope, MakeConfig
-                
-            if session_scope:
-                with session_scope() as s:
-                    config = s.query(MakeConfig).first()
-                    if config and config.external_api_key:
-                        api_key = config.external_api_key
-                        provider = config.provider or provider
-                        base_url = config.base_url or base_url
-                        model = config.model or model
-        except Exception as e:
-            print(f"Failed to load config from DB: {e}")
+        api_key, provider, base_url, model = _configured_model(provider, base_url, model)
 
     meta = {"api_key_forwarded": bool(api_key)}
     if api_key:
@@ -166,7 +150,7 @@ def analyze_repo_with_llm(repo: Dict[str, Any], api_key: str | None = None, prov
         base_url = base_url or os.getenv("MODEL_BASE_URL")
         model = model or os.getenv("MODEL_NAME")
         try:
-            summary = chat_completion_openai_compatible(api_key, prompt, provider=provider, base_url=base_url, model=model)
+            summary = chat_completion_openai_compatible(api_key, prompt, provider=provider, base_url=base_url, model=model, bypass_cache=bypass_cache)
             meta.update({"provider": provider, "base_url": base_url, "model": model})
         except Exception as e:
             summary = f"外部模型调用失败: {e}"
@@ -185,9 +169,9 @@ def try_wechat_mcp_publish(title: str, content: str) -> Dict[str, Any]:
     return {"enabled": True, "message": "WeChat MCP publish queued (mock)"}
 
 
-def analyze_github_repo(repo_full_name: str, api_key: str | None = None, provider: Optional[str] = None, base_url: Optional[str] = None, model: Optional[str] = None, content: Optional[str] = None) -> Dict[str, Any]:
+def analyze_github_repo(repo_full_name: str, api_key: str | None = None, provider: Optional[str] = None, base_url: Optional[str] = None, model: Optional[str] = None, content: Optional[str] = None, bypass_cache: bool = False) -> Dict[str, Any]:
     mcp = MockMCPClient()
     repo = mcp.fetch_github_repo(repo_full_name)
-    analysis = analyze_repo_with_llm(repo, api_key=api_key, provider=provider, base_url=base_url, model=model, content=content)
+    analysis = analyze_repo_with_llm(repo, api_key=api_key, provider=provider, base_url=base_url, model=model, content=content, bypass_cache=bypass_cache)
     wechat = try_wechat_mcp_publish(title=f"分析：{repo_full_name}", content=analysis.get("summary", ""))
     return {"repo": repo, "analysis": analysis, "wechat": wechat}
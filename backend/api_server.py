@@ -7,7 +7,7 @@ API 服务器
 
 import os
 import json
-from flask import Flask, jsonify, send_from_directory, request
+from flask import Flask, jsonify, send_from_directory, request, Response, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
 from typing import List, Dict, Optional
@@ -42,16 +42,16 @@ CORS(app)  # 允许跨域请求
 
 # 初始化数据库引擎（若未提供 MYSQL_* 则不启用 DB）
 try:
-    from .utils.db import init_engine, session_scope, PullConfig as DBPullConfig, PullRecord as DBPullRecord, MakeTask as DBMakeTask, PublishHistory as DBPublishHistory, MakeConfig as DBMakeConfig, PublishConfig as DBPublishConfig, PromptConfig as DBPromptConfig
+    from .utils.db import init_engine, session_scope, PullConfig as DBPullConfig, PullRecord as DBPullRecord, MakeTask as DBMakeTask, PublishHistory as DBPublishHistory, MakeConfig as DBMakeConfig, PublishConfig as DBPublishConfig, PromptConfig as DBPromptConfig, ReanalyzeJob as DBReanalyzeJob
     init_engine()
 except Exception:
     try:
-        from utils.db import init_engine, session_scope, PullConfig as DBPullConfig, PullRecord as DBPullRecord, MakeTask as DBMakeTask, PublishHistory as DBPublishHistory, MakeConfig as DBMakeConfig, PublishConfig as DBPublishConfig, PromptConfig as DBPromptConfig
+        from utils.db import init_engine, session_scope, PullConfig as DBPullConfig, PullRecord as DBPullRecord, MakeTask as DBMakeTask, PublishHistory as DBPublishHistory, MakeConfig as DBMakeConfig, PublishConfig as DBPublishConfig, PromptConfig as DBPromptConfig, ReanalyzeJob as DBReanalyzeJob
         init_engine()
     except Exception as e:
         print(f"DB Import/Init Failed (2nd attempt): {e}")
         session_scope = None
-        DBPullConfig = DBPullRecord = DBMakeTask = DBPublishHistory = DBPromptConfig = None
+        DBPullConfig = DBPullRecord = DBMakeTask = DBPublishHistory = DBPromptConfig = DBReanalyzeJob = None
 
 
 # Auto-migration for new columns
@@ -88,7 +88,24 @@ if session_scope:
                 except Exception:
                     conn.execute(text("ALTER TABLE pull_record ADD COLUMN detail LONGTEXT"))
                     print("Migrated: Added detail column")
+
+                # Check and add summary_key
+                try:
+                    conn.execute(text("SELECT summary_key FROM pull_record LIMIT 1"))
+                except Exception:
+                    conn.execute(text("ALTER TABLE pull_record ADD COLUMN summary_key VARCHAR(64)"))
+                    print("Migrated: Added summary_key column")
                 
+                # Index updated_at on config tables: the effective config is the latest row
+                for table in ('make_config', 'pull_config', 'publish_config'):
+                    try:
+                        conn.execute(text(f"CREATE INDEX ix_{table}_updated_at ON {table} (updated_at)"))
+                        print(f"Migrated: Added updated_at index on {table}")
+                    except Exception as e:
+                        # Ignore "Duplicate key name" (1061) / "already exists"
+                        if "1061" not in str(e) and "already exists" not in str(e):
+                            print(f"Create index on {table}.updated_at failed: {e}")
+
                 # Drop unique index on prompt_config (moved here for safer DDL)
                 try:
                     conn.execute(text("DROP INDEX scene ON prompt_config"))
@@ -269,6 +286,21 @@ if session_scope:
                         except Exception:
                             conn.execute(text("ALTER TABLE make_task ADD COLUMN thinking_content LONGTEXT"))
                             print("Migrated: Added thinking_content column to make_task")
+
+                        try:
+                            conn.execute(text("SELECT priority FROM make_task LIMIT 1"))
+                        except Exception:
+                            conn.execute(text("ALTER TABLE make_task ADD COLUMN priority INT"))
+                            conn.execute(text("ALTER TABLE make_task ADD COLUMN bypass_cache BOOLEAN DEFAULT 0"))
+                            print("Migrated: Added priority and bypass_cache columns to make_task")
+
+                        try:
+                            conn.execute(text("SELECT batch_id FROM make_task LIMIT 1"))
+                        except Exception:
+                            conn.execute(text("ALTER TABLE make_task ADD COLUMN prompt_id BIGINT"))
+                            conn.execute(text("ALTER TABLE make_task ADD COLUMN batch_id VARCHAR(64)"))
+                            conn.execute(text("CREATE INDEX ix_make_task_batch_id ON make_task (batch_id)"))
+                            print("Migrated: Added prompt_id and batch_id columns to make_task")
                         
                         # Check and add engine_version to make_config
                         try:
@@ -284,6 +316,13 @@ if session_scope:
                             conn.execute(text("ALTER TABLE make_config ADD COLUMN word_limit INT DEFAULT 8000"))
                             print("Migrated: Added word_limit column to make_config")
 
+                        # Check and add step_profiles to make_config
+                        try:
+                            conn.execute(text("SELECT step_profiles FROM make_config LIMIT 1"))
+                        except Exception:
+                            conn.execute(text("ALTER TABLE make_config ADD COLUMN step_profiles JSON"))
+                            print("Migrated: Added step_profiles column to make_config")
+
                         # Backfill repo_name if missing
                         try:
                             # Use explicit collation to avoid mix error
@@ -457,7 +496,8 @@ def audit_article():
                     from utils.file_generator import generate_files
                     output_dir = os.path.join(os.path.dirname(__file__), 'data', 'generated_docs')
                     title = task.repo_name or f"Article_{task.task_id}"
-                    generate_files(task.task_id, title, content, output_dir)
+                    with span('render', trace_id=task.task_id):
+                        generate_files(task.task_id, title, content, output_dir)
                 except Exception as e:
                     print(f"File generation failed: {e}")
                     # Log error but don't fail the approval?
@@ -468,21 +508,90 @@ def audit_article():
             elif action == 'reject':
                 task.status = 'pending' # 回入任务池
             elif action == 'revise':
+                if article_executor.position(task.task_id) is not None:
+                    # A run already queued/running would not see the new feedback
+                    return jsonify({'success': False, 'message': '任务正在生成中，请完成后再提交修改意见'}), 409
+                previous = (task.status, task.feedback, task.priority, task.bypass_cache)
                 task.status = 'queued'
                 task.feedback = opinion
-                # Trigger re-processing
-                import threading
-                t = threading.Thread(target=_process_article_task, args=(task.task_id, task.input_ref))
-                t.start()
+                task.priority = PRIORITY_INTERACTIVE
+                task.bypass_cache = True
             
             print(f"Audit task {task_id}: {action}, opinion: {opinion}")
             
             s.commit()
+            if action == 'revise':
+                # Re-process after commit so the worker sees the feedback; revisions jump ahead of bulk work
+                if not _enqueue_article_task(task.task_id, task.input_ref, True, PRIORITY_INTERACTIVE):
+                    # Lost a race with another submit: don't leave a 'queued' row nothing will process
+                    task.status, task.feedback, task.priority, task.bypass_cache = previous
+                    s.commit()
+                    return jsonify({'success': False, 'message': '任务正在生成中，请完成后再提交修改意见'}), 409
             return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/llm/limits', methods=['GET'])
+def llm_limits():
+    """Live per-(provider, model) concurrency limits, circuit state and error rates."""
+    # Same module instance as langchain_utils, which prefers the package import
+    try:
+        from .llm.concurrency import all_snapshots
+    except ImportError:
+        from llm.concurrency import all_snapshots
+    return jsonify({'success': True, 'data': all_snapshots()})
+
+
+@app.route('/api/metrics/llm', methods=['GET'])
+def llm_call_metrics():
+    """Token, latency and cache totals per (step, model), optionally for one task."""
+    try:
+        hours = float(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'hours must be a number'}), 400
+    task_id = request.args.get('task_id')
+    try:
+        groups = llm_metrics(hours=hours, task_id=task_id)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+    totals = {k: sum(g[k] for g in groups) for k in ('calls', 'errors', 'response_cache_hits', 'prompt_tokens', 'completion_tokens', 'reasoning_tokens', 'cached_tokens')}
+    return jsonify({'success': True, 'data': {'hours': hours, 'task_id': task_id, 'totals': totals, 'groups': groups}})
+
+
+@app.route('/api/metrics/trace/<trace_id>', methods=['GET'])
+def trace_detail(trace_id):
+    """
+    Waterfall of one trace: a make task id, or pull:<run>:<owner/repo>.
+    ``?format=otlp`` returns it as OTLP/JSON for Jaeger/Tempo instead.
+    """
+    try:
+        spans = get_spans(trace_id)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    if not spans:
+        return jsonify({'success': False, 'message': 'Trace not found'}), 404
+    if request.args.get('format') == 'otlp':
+        return jsonify(to_otlp(trace_id, spans))
+    return jsonify({'success': True, 'data': {'trace_id': trace_id, **waterfall(spans)}})
+
+
+@app.route('/api/metrics/steps', methods=['GET'])
+def step_metrics():
+    """p50/p95 duration per pipeline step (span name), optionally for traces starting with ``prefix``."""
+    try:
+        hours = float(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'hours must be a number'}), 400
+    prefix = request.args.get('prefix') or None
+    try:
+        steps = step_percentiles(hours=hours, trace_prefix=prefix)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    return jsonify({'success': True, 'data': {'hours': hours, 'prefix': prefix, 'steps': steps}})
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查"""
@@ -506,13 +615,15 @@ def analyze():
     provider = data.get('model_provider')
     base_url = data.get('model_base_url')
     model = data.get('model_name')
+    bypass_cache = bool(data.get('bypass_cache'))
     if not full_name:
         return jsonify({
             'success': False,
             'message': '缺少 repo_full_name'
         }), 400
     try:
-        result = analyze_github_repo(full_name, api_key=api_key, provider=provider, base_url=base_url, model=model)
+        with llm_call_context(record_id=full_name, step='analyze'):
+            result = analyze_github_repo(full_name, api_key=api_key, provider=provider, base_url=base_url, model=model, bypass_cache=bypass_cache)
         return jsonify({'success': True, 'data': result})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -567,9 +678,36 @@ def favicon():
 # ========= 辅助：简单配置与记录持久化 =========
 try:
     from .utils.store import CONFIG_DIR, LOGS_DIR, ARTICLES_DIR, RECORDS_FILE_PULL, RECORDS_FILE_PUBLISH, LINKS_FILE_PUBLISH, TASKS_FILE_MAKE, read_json as _read_json, write_json as _write_json
+    from .utils.task_stream import task_streams
+    from .llm.telemetry import llm_call_context, llm_metrics
+    from .utils.tokenizer import truncate_to_tokens
+    from .utils.prompt_registry import prompt_registry
+    from .utils.config_service import config_service, MODEL_CONFIG, PULL_CONFIG, PUBLISH_CONFIG
+    from .utils.task_queue import TaskExecutor, TASK_PRIORITIES, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+    from .utils.task_progress import TaskProgressWriter
+    from .utils.log_tail import read_log_from, iter_log_chunks
+    from .utils.single_flight import ResourceBusy, clone_flights, summary_flights, article_flights, generation_flights
+    from .utils.tracing import trace, span, record_span, get_spans, waterfall, step_percentiles, to_otlp
 except ImportError:
     # Fallback when running without package context
     from utils.store import CONFIG_DIR, LOGS_DIR, ARTICLES_DIR, RECORDS_FILE_PULL, RECORDS_FILE_PUBLISH, LINKS_FILE_PUBLISH, TASKS_FILE_MAKE, read_json as _read_json, write_json as _write_json
+    from utils.task_stream import task_streams
+    from llm.telemetry import llm_call_context, llm_metrics
+    from utils.tokenizer import truncate_to_tokens
+    from utils.prompt_registry import prompt_registry
+    from utils.config_service import config_service, MODEL_CONFIG, PULL_CONFIG, PUBLISH_CONFIG
+    from utils.task_queue import TaskExecutor, TASK_PRIORITIES, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+    from utils.task_progress import TaskProgressWriter
+    from utils.log_tail import read_log_from, iter_log_chunks
+    from utils.single_flight import ResourceBusy, clone_flights, summary_flights, article_flights, generation_flights
+    from utils.tracing import trace, span, record_span, get_spans, waterfall, step_percentiles, to_otlp
+
+# 启动时一次性加载全部提示词模板，之后由内存提供
+if session_scope and DBPromptConfig:
+    try:
+        prompt_registry.load()
+    except Exception as e:
+        print(f"Prompt registry load failed: {e}")
 
 
 # ========= 抓取（Pull/Fetch）API =========
@@ -623,57 +761,31 @@ def pull_config():
                         updated_at=datetime.now()
                     )
                     s.add(obj)
+                    config_service.invalidate(PULL_CONFIG, s)
             except Exception:
                 pass
+        config_service.invalidate(PULL_CONFIG)
         return jsonify({'success': True, 'data': saved})
     else:
-        # 优先从 DB 获取最新
-        if session_scope and DBPullConfig:
-            try:
-                from sqlalchemy import select, desc
-                with session_scope() as s:
-                    row = s.execute(select(DBPullConfig).order_by(desc(DBPullConfig.updated_at))).scalars().first()
-                    if row:
-                        data = {
-                            'sources': row.sources,
-                            'keywords': row.keywords,
-                            'keywords_list': row.keywords_list,
-                            'rule': row.rule,
-                            'frequency': row.frequency,
-                            'weekday': row.weekday,
-                            'timesPerWeek': row.times_per_week,
-                            'startTime': row.start_time.strftime('%H:%M') if row.start_time else None,
-                            'concurrency': row.concurrency,
-                            'perProjectDelay': row.per_project_delay,
-                            'batch': row.batch,
-                            'updated_at': row.updated_at.isoformat() if row.updated_at else None,
-                        }
-                        # Ensure keywords string is always available
-                        if (not data.get('keywords')) and isinstance(data.get('keywords_list'), list):
-                            data['keywords'] = ', '.join([str(s).strip() for s in data['keywords_list'] if str(s).strip()])
-                        return jsonify({'success': True, 'data': data})
-            except Exception:
-                pass
-        data = _read_json(cfg_path, {}) or {}
-        # Ensure keywords present when only keywords_list exists
-        if (not data.get('keywords')) and isinstance(data.get('keywords_list'), list):
-            data['keywords'] = ', '.join([str(s).strip() for s in data['keywords_list'] if str(s).strip()])
-        return jsonify({'success': True, 'data': data})
+        # 优先 DB 最新一条，其次 JSON（由 config_service 缓存）
+        return jsonify({'success': True, 'data': config_service.pull_config().to_dict()})
 
 
 import threading
 from pull.github_pull import search_github_repos, clone_repository, generate_summary, get_readme_content
 from utils.store import DATA_DIR
 
-def _call_llm_service(provider, base_url, api_key, model_name, messages, max_tokens=2000):
-    """Helper to call LLM service using LangChain."""
+def _call_llm_service(provider, base_url, api_key, model_name, messages, max_tokens=2000, bypass_cache=False, json_mode=False):
+    """Helper to call LLM service using LangChain. ``json_mode`` requests a JSON object response."""
     try:
-        from llm.langchain_utils import get_llm
+        from llm.langchain_utils import get_llm, invoke_llm
         from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
         
-        llm = get_llm(provider, api_key, base_url, model_name)
+        llm = get_llm(provider, api_key, base_url, model_name, temperature=REPO_SUMMARY_TEMPERATURE)
         # Bind max_tokens for this call
         llm = llm.bind(max_tokens=max_tokens)
+        if json_mode:
+            llm = llm.bind(response_format={'type': 'json_object'})
 
         lc_messages = []
         for m in messages:
@@ -684,43 +796,40 @@ def _call_llm_service(provider, base_url, api_key, model_name, messages, max_tok
             elif m['role'] == 'assistant':
                 lc_messages.append(AIMessage(content=m['content']))
         
-        response = llm.invoke(lc_messages)
+        response = invoke_llm(llm, lc_messages, bypass_cache=bypass_cache)
         return response.content
     except Exception as e:
         print(f"LLM Call Error (LangChain): {e}")
         return None
 
 
+async def _acall_llm_service(provider, base_url, api_key, model_name, messages, max_tokens=2000, bypass_cache=False, json_mode=False):
+    """Async variant of _call_llm_service for batch jobs. Errors propagate so the batch can report them per item."""
+    from llm.langchain_utils import get_llm, ainvoke_llm
+    from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+
+    llm = get_llm(provider, api_key, base_url, model_name, temperature=REPO_SUMMARY_TEMPERATURE).bind(max_tokens=max_tokens)
+    if json_mode:
+        llm = llm.bind(response_format={'type': 'json_object'})
+    role_map = {'system': SystemMessage, 'user': HumanMessage, 'assistant': AIMessage}
+    lc_messages = [role_map[m['role']](content=m['content']) for m in messages if m['role'] in role_map]
+
+    response = await ainvoke_llm(llm, lc_messages, bypass_cache=bypass_cache)
+    return response.content
+
+
 def get_prompt(scene, default_content):
     """Get prompt from DB (prefer default) or use default and save."""
-    if not session_scope or not DBPromptConfig:
-        return default_content
-        
+    return get_prompts_for({scene: default_content})[scene]
+
+
+def get_prompts_for(defaults):
+    """get_prompt for several scenes ({scene: default_content}), served from the in-memory registry."""
     try:
-        from sqlalchemy import select, desc
-        with session_scope() as s:
-            # Try to find default for this scene
-            row = s.execute(select(DBPromptConfig).filter_by(scene=scene, is_default=True)).scalars().first()
-            if row:
-                return row.content
-            
-            # Try any for this scene
-            row = s.execute(select(DBPromptConfig).filter_by(scene=scene)).scalars().first()
-            if row:
-                return row.content
-            
-            # Insert default
-            new_prompt = DBPromptConfig(
-                scene=scene, 
-                name="默认模板",
-                content=default_content,
-                is_default=True
-            )
-            s.add(new_prompt)
-            return default_content
+        return prompt_registry.get_many(defaults)
     except Exception as e:
         print(f"Get Prompt Error: {e}")
-        return default_content
+        return dict(defaults)
 
 
 @app.route('/api/prompts', methods=['GET'])
@@ -772,6 +881,7 @@ def save_prompt():
                     obj.name = name
                     obj.content = content
                     obj.updated_at = datetime.now()
+                    prompt_registry.invalidate(s)
             else:
                 # Create
                 # Check if it's the first one, make it default
@@ -788,6 +898,8 @@ def save_prompt():
                     updated_at=datetime.now()
                 )
                 s.add(obj)
+                if is_default:
+                    prompt_registry.invalidate(s)
             s.commit()
             return jsonify({'success': True})
     except Exception as e:
@@ -822,107 +934,349 @@ def set_default_prompt():
             
             # Set target
             target.is_default = True
+            prompt_registry.invalidate(s)
             s.commit()
             return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
-def _generate_ai_summary_detail(repo_dir):
-    """Generate summary and detail using configured LLM."""
-    from pull.github_pull import get_readme_content, generate_summary
-    content = get_readme_content(repo_dir)
-    if not content:
-        return "暂无介绍", "暂无 README 内容"
+def _get_summary_llm_config():
+    """Resolve provider/base_url/model/api_key for repo summaries (DB first, then JSON)."""
+    cfg = config_service.model_config().llm_config()
+    return {k: cfg[k] for k in ('provider', 'base_url', 'model_name', 'api_key')}
 
-    # Get Config
-    provider = 'openai'
-    base_url = ''
-    model_name = ''
-    api_key = ''
-    
-    # Try DB
-    if session_scope and DBMakeConfig:
-        try:
-            from sqlalchemy import select, desc
-            with session_scope() as s:
-                row = s.execute(select(DBMakeConfig).order_by(desc(DBMakeConfig.updated_at))).scalars().first()
-                if row:
-                    provider = row.provider
-                    base_url = row.base_url
-                    model_name = row.model
-                    api_key = row.external_api_key
-        except Exception:
-            pass
-            
-    # Try JSON
-    if not api_key:
-        cfg = _read_json(os.path.join(CONFIG_DIR, 'model_config.json'), {})
-        provider = cfg.get('provider', 'openai')
-        base_url = cfg.get('base_url', '')
-        model_name = cfg.get('model', '')
-        api_key = cfg.get('external_api_key', '')
 
-    # Ensure api_key is string
-    if isinstance(api_key, bytes):
-        api_key = api_key.decode('utf-8')
+# 按 token 而不是字符截断，中文 README 与英文 README 的预算一致
+README_MAX_TOKENS = int(os.getenv('README_MAX_TOKENS', '4000'))
+REPO_DETAIL_MAX_TOKENS = int(os.getenv('REPO_DETAIL_MAX_TOKENS', '6000'))
+# 生成简述时传入的 detail 预算
+SUMMARY_DETAIL_MAX_TOKENS = int(os.getenv('SUMMARY_DETAIL_MAX_TOKENS', '3000'))
 
-    if not api_key:
-        return generate_summary(repo_dir), content
+# single: 一次结构化调用同时生成 detail 与 summary；two_step: 先 detail 再 summary
+REPO_SUMMARY_MODE = os.getenv('REPO_SUMMARY_MODE', 'single')
+# 摘要按确定性调用处理（temperature 0），相同 README 的请求可直接命中 LLM 响应缓存
+REPO_SUMMARY_TEMPERATURE = float(os.getenv('REPO_SUMMARY_TEMPERATURE', '0'))
+# Bump when the code-side summary prompts change so cached results are regenerated
+REPO_SUMMARY_PROMPT_VERSION = 1
 
-    # 1. Generate Detail
-    default_detail_tmpl = "请阅读以下项目 README 内容，详细说明这个项目是干什么的，核心功能有哪些。请务必使用中文回答，并使用 Markdown 格式。如果 README 是英文的，请将其中的核心内容翻译成中文。回答必须逻辑严谨，语义通顺，符合事实。保持专业视角，不要过大夸张，要做到求实严谨。避免使用“极高”、“极大”、“完美”等夸张词汇，专注于技术事实。内容：\n\n{content}"
-    detail_tmpl = get_prompt('repo_detail', default_detail_tmpl)
+DEFAULT_REPO_DETAIL_PROMPT = "请阅读以下项目 README 内容，详细说明这个项目是干什么的，核心功能有哪些。请务必使用中文回答，并使用 Markdown 格式。如果 README 是英文的，请将其中的核心内容翻译成中文。回答必须逻辑严谨，语义通顺，符合事实。保持专业视角，不要过大夸张，要做到求实严谨。避免使用“极高”、“极大”、“完美”等夸张词汇，专注于技术事实。内容：\n\n{content}"
+DEFAULT_REPO_SUMMARY_PROMPT = "请根据以下项目详细介绍，将其汇总为50字以内的纯文本简述（中文）。确保回答完全是中文，且逻辑严谨，语义通顺，符合事实。保持专业视角，不要过大夸张，要做到求实严谨。避免使用“极高”、“极大”、“完美”等夸张词汇，专注于技术事实：\n\n{detail}"
+REPO_ANALYST_SYSTEM_PROMPT = "You are an expert software analyst. You must answer in Chinese. If the input content is in English or another language, translate the key information into Chinese. Ensure all large blocks of text are in Chinese. Your response must be logically rigorous, semantically smooth, and factually accurate. Maintain a professional perspective, do not exaggerate. Be realistic and rigorous. Avoid words like 'extremely high', 'huge', 'perfect', etc. unless strictly proven. Focus on technical facts."
+
+try:
+    from .utils.disk_cache import DiskCache
+except ImportError:
+    from utils.disk_cache import DiskCache
+
+# README hash + template version -> {'summary', 'detail'}
+_repo_summary_cache = DiskCache('repo_summary', ttl=int(os.getenv('REPO_SUMMARY_CACHE_TTL', str(90 * 24 * 3600))), max_bytes=256 * 1024 * 1024)
+
+
+def _get_summary_templates():
+    """Both summary templates, loaded in one DB round-trip."""
+    prompts = get_prompts_for({'repo_detail': DEFAULT_REPO_DETAIL_PROMPT, 'repo_summary': DEFAULT_REPO_SUMMARY_PROMPT})
+    return {'detail': prompts['repo_detail'], 'summary': prompts['repo_summary']}
+
+
+def _summary_cache_key(content, templates, cfg):
+    import hashlib
+    readme_hash = hashlib.sha256(content.encode('utf-8', errors='ignore')).hexdigest()
+    template_version = DiskCache.make_key(REPO_SUMMARY_PROMPT_VERSION, REPO_SUMMARY_MODE, templates['detail'], templates['summary'])
+    return DiskCache.make_key(readme_hash, template_version, cfg['provider'], cfg['base_url'], cfg['model_name'])
+
+
+def _build_detail_messages(content, templates=None):
+    detail_tmpl = (templates or _get_summary_templates())['detail']
     
     # Ensure content is string
     if content is None: content = ""
     
     # Limit content length to avoid token overflow, but keep template intact
     # We assume template has {content} placeholder
+    content = truncate_to_tokens(content, README_MAX_TOKENS)
     try:
-        detail_prompt = detail_tmpl.format(content=content[:10000])
+        detail_prompt = detail_tmpl.format(content=content)
     except Exception:
-        detail_prompt = f"请阅读以下项目 README 内容，详细说明这个项目是干什么的，核心功能有哪些。请务必使用中文回答，并使用 Markdown 格式。如果 README 是英文的，请将其中的核心内容翻译成中文。回答必须逻辑严谨，语义通顺，符合事实。保持专业视角，不要过大夸张，要做到求实严谨。避免使用“极高”、“极大”、“完美”等夸张词汇，专注于技术事实。内容：\n\n{content[:10000]}"
+        detail_prompt = DEFAULT_REPO_DETAIL_PROMPT.format(content=content)
 
     print(f"DEBUG: Generating detail with prompt: {detail_prompt[:200]}...")
-    print(f"DEBUG: Using provider={provider}, model={model_name}, base_url={base_url}, key={api_key[:4]}***{api_key[-4:] if len(api_key)>4 else ''}")
     
     # Add system prompt for Chinese enforcement
-    messages = [
-        {"role": "system", "content": "You are an expert software analyst. You must answer in Chinese. If the input content is in English or another language, translate the key information into Chinese. Ensure all large blocks of text are in Chinese. Your response must be logically rigorous, semantically smooth, and factually accurate. Maintain a professional perspective, do not exaggerate. Be realistic and rigorous. Avoid words like 'extremely high', 'huge', 'perfect', etc. unless strictly proven. Focus on technical facts."},
+    return [
+        {"role": "system", "content": REPO_ANALYST_SYSTEM_PROMPT},
         {"role": "user", "content": detail_prompt}
     ]
-    detail = _call_llm_service(provider, base_url, api_key, model_name, messages)
-    print(f"DEBUG: Received detail: {str(detail)[:200]}...")
-    
-    if not detail:
-        detail = content  # Fallback
 
-    # Ensure detail is string
-    if detail is None: detail = ""
 
-    # 2. Generate Summary
-    default_summary_tmpl = "请根据以下项目详细介绍，将其汇总为50字以内的纯文本简述（中文）。确保回答完全是中文，且逻辑严谨，语义通顺，符合事实。保持专业视角，不要过大夸张，要做到求实严谨。避免使用“极高”、“极大”、“完美”等夸张词汇，专注于技术事实：\n\n{detail}"
-    summary_tmpl = get_prompt('repo_summary', default_summary_tmpl)
+def _build_summary_messages(detail, templates=None):
+    summary_tmpl = (templates or _get_summary_templates())['summary']
+    detail = truncate_to_tokens(detail, SUMMARY_DETAIL_MAX_TOKENS)
     try:
-        summary_prompt = summary_tmpl.format(detail=detail[:5000])
+        summary_prompt = summary_tmpl.format(detail=detail)
     except Exception:
-        summary_prompt = f"请根据以下项目详细介绍，将其汇总为50字以内的纯文本简述（中文）。确保回答完全是中文，且逻辑严谨，语义通顺，符合事实。保持专业视角，不要过大夸张，要做到求实严谨。避免使用“极高”、“极大”、“完美”等夸张词汇，专注于技术事实：\n\n{detail[:5000]}"
+        summary_prompt = DEFAULT_REPO_SUMMARY_PROMPT.format(detail=detail)
 
     print(f"DEBUG: Generating summary with prompt: {summary_prompt[:200]}...")
-    messages_summary = [
+    return [
         {"role": "system", "content": "You are an expert software analyst. You must answer in Chinese. Your response must be logically rigorous, semantically smooth, and factually accurate. Maintain a professional perspective, do not exaggerate. Be realistic and rigorous. Avoid words like 'extremely high', 'huge', 'perfect', etc. unless strictly proven. Focus on technical facts."},
         {"role": "user", "content": summary_prompt}
     ]
-    summary = _call_llm_service(provider, base_url, api_key, model_name, messages_summary)
+
+
+def _build_summary_detail_messages(content, templates):
+    """One JSON-mode request producing both fields, reusing the configured templates."""
+    messages = _build_detail_messages(content, templates)
+    try:
+        summary_rule = templates['summary'].format(detail="上面 detail 字段的内容")
+    except Exception:
+        summary_rule = DEFAULT_REPO_SUMMARY_PROMPT.format(detail="上面 detail 字段的内容")
+    messages[0]['content'] += " Respond with a JSON object only."
+    messages[1]['content'] += (
+        "\n\n请以 JSON 对象返回结果，格式为 {\"detail\": \"<按上述要求撰写的 Markdown 详细介绍>\", \"summary\": \"<简述>\"}。"
+        f"\nsummary 字段的要求：{summary_rule}"
+    )
+    return messages
+
+
+def _parse_summary_detail(text):
+    """(summary, detail) from a JSON answer, or None if it is unusable."""
+    if not text:
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        import re
+        match = re.search(r'\{.*\}', text, re.DOTALL)
+        try:
+            data = json.loads(match.group(0)) if match else None
+        except ValueError:
+            data = None
+    if not isinstance(data, dict):
+        return None
+    summary, detail = data.get('summary'), data.get('detail')
+    if not isinstance(summary, str) or not isinstance(detail, str) or not summary.strip() or not detail.strip():
+        return None
+    return summary.strip(), detail.strip()
+
+
+def _generate_ai_summary_detail(repo_dir, bypass_cache=False, templates=None, record_id=None):
+    """
+    Generate summary and detail using configured LLM; its LLM calls are
+    attributed to the pull record ``record_id``.
+
+    Results are cached by README hash and template version, so unchanged
+    repos cost no LLM call. In 'single' mode both fields come from one
+    JSON-mode call; a malformed answer falls back to the two-step calls.
+    """
+    from pull.github_pull import get_readme_content, generate_summary
+    content = get_readme_content(repo_dir)
+    if not content:
+        return "暂无介绍", "暂无 README 内容"
+
+    cfg = _get_summary_llm_config()
+    provider, base_url, model_name, api_key = cfg['provider'], cfg['base_url'], cfg['model_name'], cfg['api_key']
+
+    if not api_key:
+        return generate_summary(repo_dir), content
+
+    templates = templates or _get_summary_templates()
+    cache_key = _summary_cache_key(content, templates, cfg)
+    if not bypass_cache:
+        cached = _repo_summary_cache.get(cache_key)
+        if cached:
+            return cached['summary'], cached['detail']
+
+    print(f"DEBUG: Using provider={provider}, model={model_name}, base_url={base_url}, key={api_key[:4]}***{api_key[-4:] if len(api_key)>4 else ''}")
+    if REPO_SUMMARY_MODE == 'single':
+        with llm_call_context(record_id=record_id, step='repo_summary_detail'):
+            answer = _call_llm_service(provider, base_url, api_key, model_name, _build_summary_detail_messages(content, templates), max_tokens=3000, bypass_cache=bypass_cache, json_mode=True)
+        parsed = _parse_summary_detail(answer)
+        if parsed:
+            _repo_summary_cache.set(cache_key, {'summary': parsed[0], 'detail': parsed[1]})
+            return parsed
+        print(f"DEBUG: Structured summary unusable, falling back to two calls: {str(answer)[:200]}...")
+
+    # 1. Generate Detail
+    messages = _build_detail_messages(content, templates)
+    with llm_call_context(record_id=record_id, step='repo_detail'):
+        detail = _call_llm_service(provider, base_url, api_key, model_name, messages, bypass_cache=bypass_cache)
+    print(f"DEBUG: Received detail: {str(detail)[:200]}...")
+    generated = bool(detail)
+    
+    if not detail:
+        detail = content  # Fallback
+
+    # Ensure detail is string
+    if detail is None: detail = ""
+
+    # 2. Generate Summary
+    messages_summary = _build_summary_messages(detail, templates)
+    with llm_call_context(record_id=record_id, step='repo_summary'):
+        summary = _call_llm_service(provider, base_url, api_key, model_name, messages_summary, bypass_cache=bypass_cache)
     print(f"DEBUG: Received summary: {str(summary)[:200]}...")
     
+    if summary and generated:
+        _repo_summary_cache.set(cache_key, {'summary': summary, 'detail': detail})
     if not summary:
         summary = generate_summary(repo_dir) # Fallback
 
     return summary, detail
 
 
+async def _agenerate_ai_summary_detail(repo_dir, cfg, bypass_cache=False, templates=None, record_id=None):
+    """
+    Async counterpart of _generate_ai_summary_detail with a shared config and templates.
+    Concurrent LLM calls are limited per provider by the shared controller (llm.concurrency).
+    """
+    import asyncio
+    from pull.github_pull import get_readme_content, generate_summary
+    content = await asyncio.to_thread(get_readme_content, repo_dir)
+    if not content:
+        return "暂无介绍", "暂无 README 内容"
+
+    if not cfg['api_key']:
+        return generate_summary(repo_dir), content
+
+    if templates is None:
+        templates = await asyncio.to_thread(_get_summary_templates)
+    cache_key = _summary_cache_key(content, templates, cfg)
+    if not bypass_cache:
+        cached = await asyncio.to_thread(_repo_summary_cache.get, cache_key)
+        if cached:
+            return cached['summary'], cached['detail']
+
+    if REPO_SUMMARY_MODE == 'single':
+        messages = await asyncio.to_thread(_build_summary_detail_messages, content, templates)
+        with llm_call_context(record_id=record_id, step='repo_summary_detail'):
+            answer = await _acall_llm_service(cfg['provider'], cfg['base_url'], cfg['api_key'], cfg['model_name'], messages, max_tokens=3000, bypass_cache=bypass_cache, json_mode=True)
+        parsed = _parse_summary_detail(answer)
+        if parsed:
+            await asyncio.to_thread(_repo_summary_cache.set, cache_key, {'summary': parsed[0], 'detail': parsed[1]})
+            return parsed
+        logger.warning(f"Structured summary unusable for {repo_dir}, falling back to two calls")
+
+    messages = await asyncio.to_thread(_build_detail_messages, content, templates)
+    with llm_call_context(record_id=record_id, step='repo_detail'):
+        detail = await _acall_llm_service(cfg['provider'], cfg['base_url'], cfg['api_key'], cfg['model_name'], messages, bypass_cache=bypass_cache)
+    generated = bool(detail)
+    if not detail:
+        detail = content  # Fallback
+
+    messages_summary = await asyncio.to_thread(_build_summary_messages, detail, templates)
+    with llm_call_context(record_id=record_id, step='repo_summary'):
+        summary = await _acall_llm_service(cfg['provider'], cfg['base_url'], cfg['api_key'], cfg['model_name'], messages_summary, bypass_cache=bypass_cache)
+    if summary and generated:
+        await asyncio.to_thread(_repo_summary_cache.set, cache_key, {'summary': summary, 'detail': detail})
+    if not summary:
+        summary = generate_summary(repo_dir) # Fallback
+
+    return summary, detail
+
+
+def generate_summaries_batch(repo_dirs, concurrency=None, progress_callback=None, bypass_cache=False, trace_ids=None, record_ids=None):
+    """
+    Generate summary/detail for many repos concurrently.
+
+    ``repo_dirs`` is a list, or any iterable yielding dirs as they become ready
+    (e.g. as clones finish); each repo starts as soon as it is yielded. LLM calls
+    are limited per provider by the shared controller (llm.concurrency);
+    ``concurrency`` optionally caps how many repos of this batch run at once.
+
+    Returns one dict per repo dir (in the order they were yielded): {'repo_dir', 'summary', 'detail', 'error'}.
+    A failing repo only sets its own 'error'. progress_callback(result, done, total)
+    is called (in a worker thread) as each repo finishes; ``total`` is None when
+    ``repo_dirs`` has no length. ``trace_ids`` maps a repo dir to the trace its
+    'summarize' span is recorded under, ``record_ids`` to the pull record its
+    LLM calls are attributed to.
+    """
+    import asyncio
+
+    total = len(repo_dirs) if hasattr(repo_dirs, '__len__') else None
+    if total == 0:
+        return []
+    cfg = _get_summary_llm_config()
+    templates = _get_summary_templates()
+
+    async def run():
+        limit = asyncio.Semaphore(concurrency) if concurrency else None
+        done = 0
+
+        async def summarize(repo_dir):
+            # Joins a summary of the same repo already running (e.g. a repull)
+            with span('summarize', trace_id=(trace_ids or {}).get(repo_dir)):
+                return await summary_flights.ado(
+                    _summary_flight_key(repo_dir, bypass_cache),
+                    lambda: _agenerate_ai_summary_detail(repo_dir, cfg, bypass_cache, templates, (record_ids or {}).get(repo_dir)))
+
+        async def one(repo_dir):
+            nonlocal done
+            result = {'repo_dir': repo_dir, 'summary': None, 'detail': None, 'error': None}
+            try:
+                if limit is None:
+                    result['summary'], result['detail'] = await summarize(repo_dir)
+                else:
+                    async with limit:
+                        result['summary'], result['detail'] = await summarize(repo_dir)
+            except Exception as e:
+                logger.error(f"Batch summary failed for {repo_dir}: {e}")
+                result['error'] = str(e)
+            done += 1
+            if progress_callback:
+                try:
+                    await asyncio.to_thread(progress_callback, result, done, total)
+                except Exception as e:
+                    logger.error(f"Batch summary progress callback failed: {e}")
+            return result
+
+        if total is not None:
+            return await asyncio.gather(*(one(d) for d in repo_dirs))
+        # Start each repo as the source yields it; waiting for the next one must not block the loop
+        source = iter(repo_dirs)
+        tasks = []
+        while True:
+            repo_dir = await asyncio.to_thread(next, source, None)
+            if repo_dir is None:
+                break
+            tasks.append(asyncio.create_task(one(repo_dir)))
+        return await asyncio.gather(*tasks)
+
+    logger.info(f"Generating summaries for {total if total is not None else 'streamed'} repos with provider={cfg['provider']}, concurrency={concurrency or 'provider limit'}")
+    from llm.langchain_utils import run_async
+    return run_async(run())
+
+
+def _clone_and_count(url, path, trace_id=None):
+    """
+    Clone or update ``url`` into ``path`` and count its tokens; returns (success, token_count).
+    Both steps are recorded as 'clone' and 'index' spans of ``trace_id``.
+
+    Concurrent calls for the same directory, in this or another worker
+    process, never run git at the same time: in-process callers share the
+    running clone, other processes wait for its advisory lock.
+    """
+    def run():
+        with span('clone', trace_id=trace_id) as attrs:
+            success = clone_repository(url, path)
+            attrs['success'] = bool(success)
+        token_count = 0
+        if success:
+            try:
+                with span('index', trace_id=trace_id) as attrs:
+                    token_count = count_tokens_in_dir(path)
+                    attrs['tokens'] = token_count
+            except Exception as e:
+                logger.error(f"Token count failed: {e}")
+        return success, token_count
+
+    return clone_flights.do(os.path.abspath(path), run, distributed=True,
+                            on_join=lambda: logger.info(f"Clone of {path} already running, waiting for it"))
+
+
+def _summary_flight_key(repo_dir, bypass_cache):
+    return f"{os.path.abspath(repo_dir)}:{int(bool(bypass_cache))}"
+
+
 def _background_clone(items, concurrency=1, delay=0):
     """Background task to clone repos and update status."""
     logger.info(f"Starting background clone for {len(items)} items with concurrency={concurrency}, delay={delay}")
@@ -950,43 +1304,7 @@ def _background_clone(items, concurrency=1, delay=0):
             logger.error(f"JSON update failed: {e}")
             pass
 
-    def process_item(item):
-        url = item.get('url')
-        path = item.get('path')
-        if not url or not path:
-            return
-        
-        if delay > 0:
-            time.sleep(delay)
-        
-        logger.info(f"Cloning {url} to {path}")
-        # Execute Clone
-        success = clone_repository(url, path)
-        status = 'cloned' if success else 'failed'
-        logger.info(f"Clone result for {url}: {status}")
-        
-        # Calculate Tokens
-        token_count = 0
-        if success:
-            try:
-                token_count = count_tokens_in_dir(path)
-                logger.info(f"Token count for {url}: {token_count}")
-            except Exception as e:
-                logger.error(f"Token count failed: {e}")
-                pass
-        
-        # Generate Summary & Detail if cloned
-        summary = None
-        detail = None
-        if success:
-            try:
-                logger.info(f"Generating summary for {url}")
-                summary, detail = _generate_ai_summary_detail(path)
-                logger.info(f"Summary generated for {url}")
-            except Exception as e:
-                logger.error(f"Summary Gen Error: {e}")
-                pass
-        
+    def update_record(url, status, summary=None, detail=None, token_count=0):
         # Update DB
         if session_scope and DBPullRecord:
             try:
@@ -1010,13 +1328,73 @@ def _background_clone(items, concurrency=1, delay=0):
         # Update JSON
         update_json_status(url, status, summary, detail, token_count)
 
-    if concurrency > 1:
-        from concurrent.futures import ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=concurrency) as executor:
-            executor.map(process_item, items)
-    else:
-        for item in items:
-            process_item(item)
+    def clone_item(item):
+        url = item.get('url')
+        path = item.get('path')
+        if not url or not path:
+            return None
+        
+        if delay > 0:
+            import time
+            time.sleep(delay)
+        
+        logger.info(f"Cloning {url} to {path}")
+        # Execute Clone and calculate tokens
+        success, token_count = _clone_and_count(url, path, item.get('trace_id'))
+        status = 'cloned' if success else 'failed'
+        logger.info(f"Clone result for {url}: {status}, tokens: {token_count}")
+        if not success:
+            update_record(url, status)
+            return
+        cloned[path] = {'url': url, 'token_count': token_count}
+        # Summarize this repo now instead of waiting for the other clones
+        ready.put(path)
+
+    # 1. Clone (and count tokens) in the background, feeding each cloned repo to the summary batch
+    import queue
+    ready = queue.Queue()
+    cloned = {}
+
+    def clone_all():
+        try:
+            if concurrency > 1:
+                from concurrent.futures import ThreadPoolExecutor
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    list(executor.map(clone_item, items))
+            else:
+                for item in items:
+                    clone_item(item)
+        except Exception as e:
+            logger.error(f"Clone failed: {e}")
+        finally:
+            ready.put(None)
+
+    cloner = threading.Thread(target=clone_all, daemon=True)
+    cloner.start()
+
+    # 2. Generate Summary & Detail for each repo as soon as its clone finishes
+    summarized = set()
+
+    def on_summary_done(result, done, total):
+        path = result['repo_dir']
+        c = cloned[path]
+        if result['error']:
+            logger.error(f"Summary Gen Error for {c['url']}: {result['error']}")
+        else:
+            logger.info(f"Summary generated for {c['url']} ({done}/{len(items)})")
+        update_record(c['url'], 'cloned', result['summary'], result['detail'], c['token_count'])
+        summarized.add(path)
+
+    try:
+        generate_summaries_batch(iter(ready.get, None), progress_callback=on_summary_done,
+                                 trace_ids={item['path']: item['trace_id'] for item in items if item.get('path') and item.get('trace_id')},
+                                 record_ids={item['path']: item['record_id'] for item in items if item.get('path') and item.get('record_id')})
+    except Exception as e:
+        logger.error(f"Summary batch failed: {e}")
+    cloner.join()
+    for path, c in cloned.items():
+        if path not in summarized:
+            update_record(c['url'], 'cloned', token_count=c['token_count'])
             
     logger.info("Background clone finished")
 
@@ -1042,25 +1420,7 @@ def pull_run():
 def pull_run_by_config():
     """Use latest saved pull config to run an immediate pull."""
     # 读取配置（优先 DB）
-    cfg = None
-    if session_scope and DBPullConfig:
-        try:
-            from sqlalchemy import select, desc
-            with session_scope() as s:
-                row = s.execute(select(DBPullConfig).order_by(desc(DBPullConfig.updated_at))).scalars().first()
-                if row:
-                    cfg = {
-                        'keywords': row.keywords,
-                        'keywords_list': row.keywords_list,
-                        'rule': row.rule,
-                        'batch': row.batch,
-                        'concurrency': row.concurrency,
-                        'perProjectDelay': row.per_project_delay,
-                    }
-        except Exception:
-            pass
-    if cfg is None:
-        cfg = _read_json(os.path.join(CONFIG_DIR, 'pull_config.json'), {}) or {}
+    cfg = config_service.pull_config().to_dict()
     payload = request.get_json(silent=True) or {}
     simulate = bool(payload.get('simulate')) or (os.getenv('FLASK_ENV') == 'test')
     
@@ -1113,6 +1473,8 @@ def _execute_pull_logic(keywords, limit, sort, simulate, task_id, concurrency=1,
     seen_urls = set()
     now = datetime.now()
     repos_dir = os.path.join(DATA_DIR, 'repos')
+    # Each repo's clone/index/summarize spans form the trace pull:<run>:<owner/repo>
+    pull_trace = task_id or now.strftime('%Y%m%d_%H%M%S')
 
     # 1. Search
     if simulate:
@@ -1125,7 +1487,8 @@ def _execute_pull_logic(keywords, limit, sort, simulate, task_id, concurrency=1,
             'stars': 100,
             'forks': 50,
             'path': dest,
-            'status': 'pending'
+            'status': 'pending',
+            'trace_id': f"pull:{pull_trace}:{owner}/{repo}"
         }]
     else:
         # Load existing URLs from DB to prevent duplicates
@@ -1196,7 +1559,8 @@ def _execute_pull_logic(keywords, limit, sort, simulate, task_id, concurrency=1,
                 'stars': stars,
                 'forks': forks,
                 'path': dest,
-                'status': 'pending'
+                'status': 'pending',
+                'trace_id': f"pull:{pull_trace}:{full_name}"
             })
 
     # 2. Save Pending
@@ -1220,7 +1584,7 @@ def _execute_pull_logic(keywords, limit, sort, simulate, task_id, concurrency=1,
         if session_scope and DBPullRecord:
             try:
                 with session_scope() as s:
-                    s.add(DBPullRecord(
+                    rec = DBPullRecord(
                         task_id=task_id,
                         repo_full_name=r['name'],
                         url=r['url'],
@@ -1230,7 +1594,11 @@ def _execute_pull_logic(keywords, limit, sort, simulate, task_id, concurrency=1,
                         save_path=r['path'],
                         result_status='pending',
                         rule=sort
-                    ))
+                    )
+                    s.add(rec)
+                    s.flush()
+                    # Summary LLM calls of this repo are attributed to the record
+                    r['record_id'] = rec.id
             except Exception as e:
                 logger.error(f"DB save failed: {e}")
                 pass
@@ -1407,6 +1775,7 @@ def pull_repull():
     record_id = payload.get('id')
     url = payload.get('url')
     path = payload.get('path')
+    bypass_cache = bool(payload.get('bypass_cache'))
 
     # Try to resolve from DB when id is provided
     if record_id and session_scope and DBPullRecord:
@@ -1427,22 +1796,22 @@ def pull_repull():
     if not abs_path.startswith(os.path.abspath(DATA_DIR)):
         return jsonify({'success': False, 'message': 'Invalid path'}), 403
 
+    trace_id = f"pull:repull_{datetime.now().strftime('%Y%m%d_%H%M%S')}:{record_id or url}"
+
     def _repull_job(repo_url, repo_path, rec_id):
         try:
             logger.info(f"Re-pulling repo {repo_url} into {repo_path}")
-            success = clone_repository(repo_url, repo_path)
+            success, token_count = _clone_and_count(repo_url, repo_path, trace_id)
             status = 'cloned' if success else 'failed'
 
-            token_count = 0
             summary = None
             detail = None
             if success:
                 try:
-                    token_count = count_tokens_in_dir(repo_path)
-                except Exception as e:
-                    logger.error(f"Token count failed: {e}")
-                try:
-                    summary, detail = _generate_ai_summary_detail(repo_path)
+                    with span('summarize', trace_id=trace_id):
+                        summary, detail = summary_flights.do(
+                            _summary_flight_key(repo_path, bypass_cache),
+                            lambda: _generate_ai_summary_detail(repo_path, bypass_cache=bypass_cache, record_id=rec_id))
                 except Exception as e:
                     logger.error(f"Summary gen failed: {e}")
 
@@ -1487,7 +1856,7 @@ def pull_repull():
 
     t = threading.Thread(target=_repull_job, args=(url, abs_path, record_id))
     t.start()
-    return jsonify({'success': True, 'data': {'status': 'started'}})
+    return jsonify({'success': True, 'data': {'status': 'started', 'trace_id': trace_id}})
 
 
 @app.route('/api/repo/readme', methods=['GET'])
@@ -1514,31 +1883,7 @@ def config_model():
     config_file = os.path.join(CONFIG_DIR, 'model_config.json')
     
     # Get current config first
-    current_config = {}
-    if session_scope and DBMakeConfig:
-        try:
-            from sqlalchemy import select, desc
-            with session_scope() as s:
-                row = s.execute(select(DBMakeConfig).order_by(desc(DBMakeConfig.updated_at))).scalars().first()
-                if row:
-                    # Helper to decode bytes if necessary
-                    def decode_if_bytes(v):
-                        return v.decode('utf-8') if isinstance(v, bytes) else v
-
-                    current_config = {
-                        'provider': decode_if_bytes(row.provider),
-                        'base_url': decode_if_bytes(row.base_url),
-                        'model': decode_if_bytes(row.model),
-                        'external_api_key': decode_if_bytes(row.external_api_key),
-                        'engine_version': decode_if_bytes(row.engine_version) or 'v1',
-                        'word_limit': row.word_limit or 8000,
-                        'updated_at': row.updated_at.isoformat() if row.updated_at else None
-                    }
-        except Exception:
-            pass
-            
-    if not current_config:
-        current_config = _read_json(config_file, {})
+    current_config = config_service.model_config().to_dict()
 
     if request.method == 'POST':
         new_data = request.get_json(silent=True) or {}
@@ -1563,10 +1908,13 @@ def config_model():
                         external_api_key=merged_config.get('external_api_key'),
                         engine_version=merged_config.get('engine_version', 'v1'),
                         word_limit=merged_config.get('word_limit', 8000),
+                        step_profiles=merged_config.get('step_profiles') or None,
                         updated_at=datetime.now()
                     ))
+                    config_service.invalidate(MODEL_CONFIG, s)
             except Exception:
                 pass
+        config_service.invalidate(MODEL_CONFIG)
                 
         return jsonify({'success': True})
     else:
@@ -1586,12 +1934,17 @@ def test_model_config():
         return jsonify({'success': False, 'message': '缺少必要配置（Provider 或 API Key）'}), 400
 
     try:
-        from llm.langchain_utils import get_llm
+        try:
+            from .llm.langchain_utils import get_llm
+            from .llm.concurrency import call_with_limits
+        except ImportError:
+            from llm.langchain_utils import get_llm
+            from llm.concurrency import call_with_limits
         from langchain_core.messages import HumanMessage
         
         llm = get_llm(provider, api_key, base_url, model_name)
-        # Simple test
-        response = llm.invoke([HumanMessage(content="你好！")])
+        # Simple test; goes through the provider limiter and breaker, without retries so failures show at once
+        response = call_with_limits(llm, lambda: llm.invoke([HumanMessage(content="你好！")]), retries=0)
         
         content = response.content
         if not content:
@@ -1603,47 +1956,88 @@ def test_model_config():
         return jsonify({'success': False, 'message': f'测试失败: {str(e)}'}), 500
 
 
-def _process_article_task(task_id, input_ref):
+def _process_article_task(task_id, input_ref, bypass_cache=False, enqueued_at=None):
+    """Run an article task unless another worker process is already running it."""
+    import time
+    if enqueued_at:
+        record_span('queue', enqueued_at, time.time(), trace_id=task_id)
+
+    def run():
+        # Every step span of the run (context, generation, LLM queueing) nests under 'task'
+        with trace(task_id), span('task', input_ref=input_ref):
+            _run_article_task(task_id, input_ref, bypass_cache)
+
+    try:
+        article_flights.do(task_id, run, distributed=True, wait=False)
+    except ResourceBusy:
+        logger.info(f"Article task {task_id} is already running in another worker, skipped")
+
+
+# Tasks waiting on another task's generation (generation key -> {task_id: progress writer});
+# the owner forwards its log lines and stream events to them
+_generation_followers = {}
+_generation_followers_lock = threading.Lock()
+
+
+def _follow_generation(generation_key, task_id, progress):
+    with _generation_followers_lock:
+        _generation_followers.setdefault(generation_key, {})[task_id] = progress
+
+
+def _unfollow_generation(generation_key, task_id):
+    with _generation_followers_lock:
+        followers = _generation_followers.get(generation_key, {})
+        followers.pop(task_id, None)
+        if not followers:
+            _generation_followers.pop(generation_key, None)
+
+
+def _forward_generation(generation_key, event, data):
+    with _generation_followers_lock:
+        followers = list(_generation_followers.get(generation_key, {}).items())
+    for follower_id, follower_progress in followers:
+        if event == 'log':
+            follower_progress.log(data)
+        else:
+            task_streams.publish(follower_id, event, data)
+
+
+def _run_article_task(task_id, input_ref, bypass_cache=False):
     """Background task to generate article."""
     import time
     
-    # Update task status helper
-    def update_task_status(status, log_msg=None, content=None, detailed_content=None, thinking_content=None, repo_name=None):
-        if session_scope and DBMakeTask:
-            try:
-                with session_scope() as s:
-                    # Find by task_id (string)
-                    t = s.execute(select(DBMakeTask).filter_by(task_id=task_id)).scalars().first()
-                    if t:
-                        t.status = status
-                        t.log_file = f'make_{task_id}.log'
-                        if content:
-                            t.content = content
-                        if detailed_content:
-                            t.detailed_content = detailed_content
-                        if thinking_content:
-                            t.thinking_content = thinking_content
-                        if repo_name:
-                            t.repo_name = repo_name
-                        if status == 'processing' and not t.started_at:
-                            t.started_at = datetime.now()
-                        if status in ['finished', 'failed', 'generated']:
-                            t.finished_at = datetime.now()
-            except Exception as e:
-                print(f"Task update failed: {e}")
-        
-        # Log to file
-        with open(os.path.join(LOGS_DIR, f'make_{task_id}.log'), 'a', encoding='utf-8') as f:
-            if log_msg:
-                f.write(f"{datetime.now().isoformat()} {log_msg}\n")
-            f.write(f"{datetime.now().isoformat()} Status changed to {status}\n")
+    def persist_status(status, fields):
+        if not (session_scope and DBMakeTask):
+            return
+        from sqlalchemy import select
+        with session_scope() as s:
+            # Find by task_id (string)
+            t = s.execute(select(DBMakeTask).filter_by(task_id=task_id)).scalars().first()
+            if t:
+                t.status = status
+                t.log_file = f'make_{task_id}.log'
+                for name, value in fields.items():
+                    setattr(t, name, value)
+                if status == 'processing' and not t.started_at:
+                    t.started_at = datetime.now()
+                if status in ['finished', 'failed', 'generated']:
+                    t.finished_at = datetime.now()
+
+    # Buffered log file + live stream; the DB is only written on status/field changes
+    progress = TaskProgressWriter(task_id, os.path.join(LOGS_DIR, f'make_{task_id}.log'), persist_status, task_streams)
+
+    def update_task_status(status, log_msg=None, **fields):
+        progress.update(status, log_msg, **fields)
 
     update_task_status('processing', "Started processing task")
     
     try:
-        # Check for revision feedback
+        # Check for revision feedback, template and batch siblings
         feedback = None
         existing_content = None
+        prompt_tmpl = None
+        batch_templates = []
+        shared_context_key = None
         if session_scope and DBMakeTask:
             try:
                 from sqlalchemy import select
@@ -1652,6 +2046,17 @@ def _process_article_task(task_id, input_ref):
                     if t:
                         feedback = t.feedback
                         existing_content = t.content
+                        if t.prompt_id and DBPromptConfig:
+                            prompt_row = s.get(DBPromptConfig, t.prompt_id)
+                            prompt_tmpl = prompt_row.content if prompt_row else None
+                        if t.batch_id and DBPromptConfig:
+                            # Same repo with other templates in this batch: build the repo context once for all of them
+                            sibling_ids = s.execute(select(DBMakeTask.prompt_id).filter_by(batch_id=t.batch_id, input_ref=t.input_ref)).scalars().all()
+                            sibling_ids = sorted({pid for pid in sibling_ids if pid})
+                            if len(sibling_ids) > 1:
+                                rows = s.execute(select(DBPromptConfig).filter(DBPromptConfig.id.in_(sibling_ids)).order_by(DBPromptConfig.id)).scalars().all()
+                                batch_templates = [r.content for r in rows]
+                                shared_context_key = f"{t.batch_id}:{t.input_ref}"
             except Exception:
                 pass
 
@@ -1695,7 +2100,7 @@ def _process_article_task(task_id, input_ref):
 {existing_content}
 
 项目详情：
-{repo_detail[:10000]}
+{truncate_to_tokens(repo_detail, REPO_DETAIL_MAX_TOKENS)}
 
 反馈意见：
 {feedback}
@@ -1704,48 +2109,18 @@ def _process_article_task(task_id, input_ref):
         else:
             update_task_status('processing', "Step 2/4: Loading prompt template...")
             default_prompt = "请为项目 {name} 写一篇公众号文章。"
-            prompt_tmpl = get_prompt('article_generation', default_prompt)
+            prompt_tmpl = prompt_tmpl or get_prompt('article_generation', default_prompt)
             update_task_status('processing', f"Loaded prompt template (Length: {len(prompt_tmpl)} chars)")
-            final_prompt = f"{prompt_tmpl}\n\n项目名称：{repo_name}\n\n项目详情：\n{repo_detail[:15000]}"
+            final_prompt = f"{prompt_tmpl}\n\n项目名称：{repo_name}\n\n项目详情：\n{truncate_to_tokens(repo_detail, REPO_DETAIL_MAX_TOKENS)}"
         
         # 3. Call LLM
         update_task_status('processing', f"Step 3/4: Calling LLM to generate article for {repo_name}...")
         
         # Get Config
-        provider = 'openai'
-        base_url = ''
-        model_name = ''
-        api_key = ''
-        engine_version = 'v1'
-        word_limit = 8000
-        
-        if session_scope and DBMakeConfig:
-            try:
-                from sqlalchemy import select, desc
-                with session_scope() as s:
-                    row = s.execute(select(DBMakeConfig).order_by(desc(DBMakeConfig.updated_at))).scalars().first()
-                    if row:
-                        provider = row.provider
-                        base_url = row.base_url
-                        model_name = row.model
-                        api_key = row.external_api_key
-                        engine_version = row.engine_version or 'v1'
-                        word_limit = row.word_limit or 8000
-            except Exception:
-                pass
-        
-        if not api_key:
-             # Fallback to JSON
-             cfg = _read_json(os.path.join(CONFIG_DIR, 'model_config.json'), {})
-             provider = cfg.get('provider', 'openai')
-             base_url = cfg.get('base_url', '')
-             model_name = cfg.get('model', '')
-             api_key = cfg.get('external_api_key', '')
-             engine_version = cfg.get('engine_version', 'v1')
-             word_limit = cfg.get('word_limit', 8000)
-
-        if isinstance(api_key, bytes):
-            api_key = api_key.decode('utf-8')
+        model_settings = config_service.model_config()
+        provider = model_settings.provider
+        model_name = model_settings.model
+        api_key = model_settings.external_api_key
 
         if not api_key:
             update_task_status('failed', "No API Key configured. Please configure the model in settings.")
@@ -1755,18 +2130,16 @@ def _process_article_task(task_id, input_ref):
 
         # Use new article generator
         try:
-            from article_gen.generator import generate_article_content
+            from .article_gen.generator import generate_article_content
+            from .article_gen.context import RepoContext, build_repo_context, shared_contexts
+            from .article_gen.checkpoints import CHECKPOINT_CONTEXT, TaskCheckpoints, inputs_hash
         except ImportError:
             from article_gen.generator import generate_article_content
+            from article_gen.context import RepoContext, build_repo_context, shared_contexts
+            from article_gen.checkpoints import CHECKPOINT_CONTEXT, TaskCheckpoints, inputs_hash
 
-        llm_config = {
-            'provider': provider,
-            'api_key': api_key,
-            'base_url': base_url,
-            'model_name': model_name,
-            'engine_version': engine_version,
-            'word_limit': word_limit
-        }
+        llm_config = model_settings.llm_config()
+        llm_config['bypass_cache'] = bypass_cache
 
         # Determine repo path
         repo_path = None
@@ -1795,16 +2168,66 @@ def _process_article_task(task_id, input_ref):
             update_task_status('failed', f"Repository path not found for {repo_name}")
             return
 
+        # Set while this task owns the generation, so tasks joining it see the same output
+        forward_key = None
+
         def log_wrapper(msg):
-            update_task_status('processing', msg)
-
-        article_result = generate_article_content(
-            repo_path=repo_path,
-            repo_name=repo_name,
-            user_prompt=final_prompt,
-            llm_config=llm_config,
-            log_callback=log_wrapper
-        )
+            progress.log(msg)
+            if forward_key:
+                _forward_generation(forward_key, 'log', msg)
+
+        def stream_wrapper(event, data):
+            task_streams.publish(task_id, event, data)
+            if forward_key:
+                _forward_generation(forward_key, event, data)
+
+        # Retries and revisions resume from the steps this task already finished
+        checkpoints = TaskCheckpoints(task_id)
+
+        def generate():
+            nonlocal forward_key
+            forward_key = generation_key
+            with llm_call_context(task_id=task_id):
+                repo_context = None
+                if feedback and existing_content:
+                    # The revision rewrites the article, the files behind it stay the same
+                    saved_context = checkpoints.latest(CHECKPOINT_CONTEXT)
+                    if saved_context:
+                        repo_context = RepoContext.from_dict(saved_context)
+                        log_wrapper(f"Reusing repository context of the original generation ({repo_context.context_tokens} tokens)")
+                elif shared_context_key:
+                    # File selection covers every template of the group
+                    goals = "\n\n".join(f"文章 {i + 1}：{tmpl}" for i, tmpl in enumerate(batch_templates))
+                    shared_goal = f"{goals}\n\n项目名称：{repo_name}\n\n项目详情：\n{truncate_to_tokens(repo_detail, REPO_DETAIL_MAX_TOKENS)}"
+                    repo_context = shared_contexts.get(
+                        shared_context_key,
+                        lambda: build_repo_context(repo_path, repo_name, shared_goal, llm_config, log_wrapper, checkpoints),
+                        log=log_wrapper,
+                    )
+                    checkpoints.save(CHECKPOINT_CONTEXT, inputs_hash(shared_context_key), repo_context.to_dict())
+                return generate_article_content(
+                    repo_path=repo_path,
+                    repo_name=repo_name,
+                    user_prompt=final_prompt,
+                    llm_config=llm_config,
+                    log_callback=log_wrapper,
+                    stream_callback=stream_wrapper,
+                    repo_context=repo_context,
+                    checkpoints=checkpoints
+                )
+
+        # Identical concurrent requests (same repo, prompt and model settings) share one generation
+        generation_key = inputs_hash(repo_path, final_prompt, {k: v for k, v in llm_config.items() if k != 'api_key'})
+        def join_generation():
+            owner_task_id = generation_flights.owner_of(generation_key) or 'another task'
+            log_wrapper(f"An identical generation is already running in task {owner_task_id}, waiting for its result")
+            _follow_generation(generation_key, task_id, progress)
+
+        try:
+            article_result = generation_flights.do(generation_key, generate, on_join=join_generation, owner=task_id)
+        finally:
+            forward_key = None
+            _unfollow_generation(generation_key, task_id)
         
         article_content = ""
         detailed_content = None
@@ -1837,6 +2260,8 @@ def _process_article_task(task_id, input_ref):
         
     except Exception as e:
         update_task_status('failed', f"Unexpected error: {e}")
+    finally:
+        progress.flush()
 
 
 @app.route('/api/article/create_task', methods=['POST'])
@@ -1845,9 +2270,13 @@ def create_article_task():
     data = request.get_json(silent=True) or {}
     pull_record_id = data.get('pull_record_id')
     repo_name = data.get('repo_name')
+    bypass_cache = bool(data.get('bypass_cache'))
+    priority = TASK_PRIORITIES.get(data.get('priority') or 'normal')
     
     if not pull_record_id and not repo_name:
         return jsonify({'success': False, 'message': 'Missing pull_record_id or repo_name'}), 400
+    if priority is None:
+        return jsonify({'success': False, 'message': f"priority must be one of {', '.join(TASK_PRIORITIES)}"}), 400
         
     task_id = f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{pull_record_id or 'manual'}"
     
@@ -1869,6 +2298,8 @@ def create_article_task():
                     input_ref=str(pull_record_id) if pull_record_id else repo_name,
                     repo_name=repo_name,
                     status='queued',
+                    priority=priority,
+                    bypass_cache=bypass_cache,
                     created_at=datetime.now()
                 ))
         except Exception as e:
@@ -1887,13 +2318,146 @@ def create_article_task():
     tasks.insert(0, task)
     _write_json(TASKS_FILE_MAKE, tasks)
     
-    # Start processing in background
-    t = threading.Thread(target=_process_article_task, args=(task_id, str(pull_record_id) if pull_record_id else repo_name))
-    t.start()
+    # Queue for the bounded worker pool
+    _enqueue_article_task(task_id, task['input_ref'], bypass_cache, priority)
+    task['queuePosition'] = article_executor.position(task_id)
     
     return jsonify({'success': True, 'data': task})
 
 
+@app.route('/api/article/create_batch', methods=['POST'])
+def create_article_batch():
+    """
+    Create article tasks for many pull records in one transaction.
+
+    Payload: pull_record_ids, prompt_id or prompt_ids (article templates; one
+    task per record and template), bypass_cache, priority (default 'bulk').
+    Tasks of the same repo share one repository context build.
+    """
+    if not session_scope or not DBMakeTask or not DBPullRecord:
+        return jsonify({'success': False, 'message': 'Database not available'}), 500
+
+    data = request.get_json(silent=True) or {}
+    try:
+        record_ids = list(dict.fromkeys(int(r) for r in (data.get('pull_record_ids') or [])))
+        prompt_ids = data.get('prompt_ids') or ([data['prompt_id']] if data.get('prompt_id') else [])
+        prompt_ids = list(dict.fromkeys(int(p) for p in prompt_ids))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'pull_record_ids and prompt_ids must be integers'}), 400
+    bypass_cache = bool(data.get('bypass_cache'))
+    priority = TASK_PRIORITIES.get(data.get('priority') or 'bulk')
+    if not record_ids:
+        return jsonify({'success': False, 'message': 'Missing pull_record_ids'}), 400
+    if priority is None:
+        return jsonify({'success': False, 'message': f"priority must be one of {', '.join(TASK_PRIORITIES)}"}), 400
+
+    import uuid
+    now = datetime.now()
+    batch_id = f"batch_{now.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    tasks = []
+    try:
+        from sqlalchemy import select
+        with session_scope() as s:
+            records = {r.id: r for r in s.execute(select(DBPullRecord).filter(DBPullRecord.id.in_(record_ids))).scalars().all()}
+            missing = [rid for rid in record_ids if rid not in records]
+            if missing:
+                return jsonify({'success': False, 'message': f'Pull records not found: {missing}'}), 404
+            if prompt_ids:
+                found = set(s.execute(select(DBPromptConfig.id).filter(DBPromptConfig.id.in_(prompt_ids))).scalars().all()) if DBPromptConfig else set()
+                missing = [pid for pid in prompt_ids if pid not in found]
+                if missing:
+                    return jsonify({'success': False, 'message': f'Prompts not found: {missing}'}), 404
+
+            for rid in record_ids:
+                for pid in (prompt_ids or [None]):
+                    task_id = f"task_{now.strftime('%Y%m%d_%H%M%S')}_{rid}" + (f"_p{pid}" if pid else '') + f"_{batch_id[-6:]}"
+                    s.add(DBMakeTask(
+                        task_id=task_id,
+                        input_ref=str(rid),
+                        repo_name=records[rid].repo_full_name,
+                        status='queued',
+                        priority=priority,
+                        bypass_cache=bypass_cache,
+                        prompt_id=pid,
+                        batch_id=batch_id,
+                        created_at=now
+                    ))
+                    tasks.append({'id': task_id, 'input_ref': str(rid), 'repo_name': records[rid].repo_full_name, 'prompt_id': pid, 'status': 'queued', 'createdAt': now.isoformat()})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+    # Scheduled after the commit so workers find their rows
+    for task in tasks:
+        _enqueue_article_task(task['id'], task['input_ref'], bypass_cache, priority)
+    return jsonify({'success': True, 'data': {'batch_id': batch_id, 'tasks': tasks}})
+
+
+@app.route('/api/article/batch/<batch_id>', methods=['GET'])
+def article_batch_status(batch_id):
+    """Per-task status of a batch plus counts by status."""
+    if not session_scope or not DBMakeTask:
+        return jsonify({'success': False, 'message': 'Database not available'}), 500
+    try:
+        from sqlalchemy import select
+        with session_scope() as s:
+            rows = s.execute(select(DBMakeTask).filter_by(batch_id=batch_id).order_by(DBMakeTask.id)).scalars().all()
+            if not rows:
+                return jsonify({'success': False, 'message': 'Batch not found'}), 404
+            tasks = [{'id': r.task_id, 'input_ref': r.input_ref, 'repo_name': r.repo_name, 'prompt_id': r.prompt_id, 'status': r.status} for r in rows]
+        counts = {}
+        for t in tasks:
+            counts[t['status']] = counts.get(t['status'], 0) + 1
+        return jsonify({'success': True, 'data': {'batch_id': batch_id, 'total': len(tasks), 'counts': counts, 'tasks': tasks}})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ========= 文章任务执行器（有界并发 + 优先级） =========
+ARTICLE_TASK_WORKERS = int(os.getenv('ARTICLE_TASK_WORKERS', '2'))
+article_executor = TaskExecutor(ARTICLE_TASK_WORKERS, name='article')
+
+
+def _enqueue_article_task(task_id, input_ref, bypass_cache=False, priority=PRIORITY_NORMAL):
+    import time
+    return article_executor.submit(task_id, _process_article_task, task_id, input_ref, bypass_cache, time.time(), priority=priority)
+
+
+def resume_article_tasks():
+    """Requeue tasks left queued or processing by a shutdown, in lane then creation order."""
+    if not session_scope or not DBMakeTask:
+        return
+    try:
+        from sqlalchemy import select
+        with session_scope() as s:
+            if s is None:
+                return
+            rows = s.execute(select(DBMakeTask).filter(DBMakeTask.status.in_(['queued', 'processing'])).order_by(DBMakeTask.created_at)).scalars().all()
+            tasks = []
+            for t in rows:
+                if not t.task_id or not t.input_ref:
+                    continue
+                t.status = 'queued'
+                tasks.append((t.priority if t.priority is not None else PRIORITY_NORMAL, t.task_id, t.input_ref, bool(t.bypass_cache)))
+        for priority, task_id, input_ref, bypass_cache in sorted(tasks, key=lambda x: x[0]):
+            with open(os.path.join(LOGS_DIR, f'make_{task_id}.log'), 'a', encoding='utf-8') as f:
+                f.write(f"{datetime.now().isoformat()} Requeued after server restart\n")
+            _enqueue_article_task(task_id, input_ref, bypass_cache, priority)
+        if tasks:
+            logger.info(f"Requeued {len(tasks)} interrupted article tasks")
+    except Exception as e:
+        logger.error(f"Requeueing article tasks failed: {e}")
+
+
+@app.route('/api/make/queue', methods=['GET'])
+def make_queue():
+    """Article executor queue depth per lane, running tasks and wait times."""
+    data = article_executor.stats()
+    task_id = request.args.get('task_id')
+    if task_id:
+        data['position'] = article_executor.position(task_id)
+    return jsonify({'success': True, 'data': data})
+
+
 @app.route('/api/make/tasks', methods=['GET'])
 def make_tasks():
     # 优先 DB
@@ -1952,15 +2516,122 @@ def make_enqueue():
     return jsonify({'success': True, 'data': task})
 
 
+@app.route('/api/make/retry/<task_id>', methods=['POST'])
+def make_retry(task_id):
+    """Requeue a failed article task; steps it already finished are restored from checkpoints."""
+    if not session_scope or not DBMakeTask:
+        return jsonify({'success': False, 'message': 'Database not available'}), 500
+    try:
+        from sqlalchemy import select
+        with session_scope() as s:
+            t = s.execute(select(DBMakeTask).filter_by(task_id=task_id)).scalars().first()
+            if not t:
+                return jsonify({'success': False, 'message': 'Task not found'}), 404
+            if t.status != 'failed':
+                return jsonify({'success': False, 'message': f'Only failed tasks can be retried (status: {t.status})'}), 409
+            t.status = 'queued'
+            t.finished_at = None
+            input_ref, bypass_cache = t.input_ref, bool(t.bypass_cache)
+            priority = t.priority if t.priority is not None else PRIORITY_NORMAL
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+    with open(os.path.join(LOGS_DIR, f'make_{task_id}.log'), 'a', encoding='utf-8') as f:
+        f.write(f"{datetime.now().isoformat()} Retry requested\n")
+    _enqueue_article_task(task_id, input_ref, bypass_cache, priority)
+    return jsonify({'success': True, 'data': {'id': task_id, 'status': 'queued', 'queuePosition': article_executor.position(task_id)}})
+
+
 @app.route('/api/make/logs/<task_id>', methods=['GET'])
 def make_logs(task_id):
+    """
+    Task log. With ``?offset=<bytes>`` only the lines written after that
+    offset are returned; pass the returned ``offset`` on the next poll.
+    """
     path = os.path.join(LOGS_DIR, f'make_{task_id}.log')
-    if os.path.exists(path):
-        with open(path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    else:
-        content = '[placeholder] 暂无日志\n'
-    return jsonify({'success': True, 'data': {'task_id': task_id, 'log': content}})
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                raw = f.read()
+            content = raw.decode('utf-8', errors='replace')
+            next_offset = len(raw)
+        else:
+            content = '[placeholder] 暂无日志\n'
+            next_offset = 0
+        return jsonify({'success': True, 'data': {'task_id': task_id, 'log': content, 'offset': next_offset}})
+
+    content, next_offset, reset = read_log_from(path, offset)
+    return jsonify({'success': True, 'data': {'task_id': task_id, 'log': content, 'offset': next_offset, 'reset': reset}})
+
+
+def _make_task_finished_checker(task_id, every=5):
+    """Callable telling whether the task reached a final status, asking the DB at most every ``every`` seconds."""
+    import time
+    state = {'checked_at': 0.0, 'finished': False}
+
+    def finished():
+        if state['finished'] or time.monotonic() - state['checked_at'] < every:
+            return state['finished']
+        state['checked_at'] = time.monotonic()
+        status = None
+        if session_scope and DBMakeTask:
+            try:
+                from sqlalchemy import select
+                with session_scope() as s:
+                    if s is not None:
+                        status = s.execute(select(DBMakeTask.status).filter_by(task_id=task_id)).scalar()
+            except Exception:
+                pass
+        else:
+            status = next((t.get('status') for t in _read_json(TASKS_FILE_MAKE, []) if t.get('id') == task_id), None)
+        state['finished'] = status in ('finished', 'failed', 'generated', 'approved', 'pending')
+        return state['finished']
+    return finished
+
+
+@app.route('/api/make/logs/<task_id>/stream', methods=['GET'])
+def make_logs_stream(task_id):
+    """SSE tail of the task log from ``?offset=`` (or Last-Event-ID): ``log`` events carry new lines and the next offset."""
+    path = os.path.join(LOGS_DIR, f'make_{task_id}.log')
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        offset = request.headers.get('Last-Event-ID', type=int) or 0
+    finished = _make_task_finished_checker(task_id)
+
+    def generate():
+        for item in iter_log_chunks(path, offset, finished):
+            if item is None:
+                yield ": keepalive\n\n"
+                continue
+            text, next_offset, reset = item
+            data = {'log': text, 'offset': next_offset, 'reset': reset}
+            yield f"id: {next_offset}\nevent: log\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/make/stream/<task_id>', methods=['GET'])
+def make_stream(task_id):
+    """SSE stream of live generation output (phase/content/reasoning/log/end events)."""
+    def generate():
+        for item in task_streams.iter_events(task_id):
+            if item is None:
+                yield ": keepalive\n\n"
+                continue
+            event, data = item
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 
 @app.route('/api/files/<path:filename>')
@@ -2048,31 +2719,14 @@ def publish_config():
                         publish_time=pt,
                         updated_at=datetime.now()
                     ))
+                    config_service.invalidate(PUBLISH_CONFIG, s)
             except Exception:
                 pass
+        config_service.invalidate(PUBLISH_CONFIG)
         return jsonify({'success': True, 'data': saved})
     else:
-        # 优先 DB
-        if session_scope and 'DBPublishConfig' in globals() and DBPublishConfig:
-            try:
-                from sqlalchemy import select, desc
-                with session_scope() as s:
-                    row = s.execute(select(DBPublishConfig).order_by(desc(DBPublishConfig.updated_at))).scalars().first()
-                    if row:
-                        # Helper to decode bytes if necessary
-                        def decode_if_bytes(v):
-                            return v.decode('utf-8') if isinstance(v, bytes) else v
-
-                        return jsonify({'success': True, 'data': {
-                            'platforms': row.platforms,
-                            'account': decode_if_bytes(row.account),
-                            'apiKey': decode_if_bytes(row.api_key),
-                            'publishTime': row.publish_time.strftime('%H:%M') if row.publish_time else None,
-                            'updated_at': row.updated_at.isoformat() if row.updated_at else None,
-                        }})
-            except Exception:
-                pass
-        return jsonify({'success': True, 'data': _read_json(cfg_path, {})})
+        # 优先 DB 最新一条，其次 JSON（由 config_service 缓存）
+        return jsonify({'success': True, 'data': config_service.publish_config().to_dict()})
 
 
 @app.route('/api/publish/test', methods=['POST'])
@@ -2167,76 +2821,323 @@ def deduplicate_records():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+# ========= 批量重新分析（后台任务，按批提交并可断点续跑） =========
+REANALYZE_FILTERS = ('all', 'stale', 'failed', 'missing')
+REANALYZE_BATCH_SIZE = int(os.getenv('REANALYZE_BATCH_SIZE', '20'))
+_reanalyze_lock = threading.Lock()
+_reanalyze_threads = {}  # job_id -> Thread
+
+
+def _resolve_repo_path(save_path):
+    """save_path as stored, or the same directory under backend/data if the stored path moved."""
+    if not save_path:
+        return None
+    if os.path.exists(save_path):
+        return save_path
+    # Try relative to data dir
+    possible_path = os.path.join(os.path.dirname(__file__), 'data', os.path.basename(save_path))
+    return possible_path if os.path.exists(possible_path) else None
+
+
+def _sync_pull_records_from_json():
+    """Insert pull records that only exist in the JSON store into the DB."""
+    json_records = _read_json(RECORDS_FILE_PULL, [])
+    with session_scope() as session:
+        db_paths = {r.save_path for r in session.query(DBPullRecord.save_path).all() if r.save_path}
+        for jr in json_records:
+            path = jr.get('path')
+            if path and path not in db_paths:
+                session.add(DBPullRecord(
+                    repo_full_name=jr.get('name'),
+                    url=jr.get('url'),
+                    pull_time=datetime.fromisoformat(jr.get('pullTime')) if jr.get('pullTime') else datetime.now(),
+                    stars=jr.get('stars', 0),
+                    forks=jr.get('forks', 0),
+                    save_path=path,
+                    result_status=jr.get('status', 'cloned'),
+                    rule=jr.get('rule', 'manual'),
+                    summary=jr.get('summary')[:60000] if jr.get('summary') else None,
+                    detail=jr.get('detail')[:60000] if jr.get('detail') else None
+                ))
+                db_paths.add(path)
+
+
+def _current_summary_key(repo_dir, templates, cfg):
+    """Cache key the summary of repo_dir would be generated under now, or None without README/API key."""
+    from pull.github_pull import get_readme_content
+    if not cfg['api_key']:
+        return None
+    content = get_readme_content(repo_dir)
+    return _summary_cache_key(content, templates, cfg) if content else None
+
+
+def _select_reanalyze_targets(filter_name, templates, cfg):
+    """Ids of pull records matching filter_name, in id order."""
+    from sqlalchemy import select, desc
+    with session_scope() as s:
+        rows = s.execute(select(DBPullRecord.id, DBPullRecord.save_path, DBPullRecord.summary, DBPullRecord.detail, DBPullRecord.summary_key).order_by(DBPullRecord.id)).all()
+        failed_ids = set()
+        if filter_name == 'failed':
+            last = s.execute(select(DBReanalyzeJob).filter(DBReanalyzeJob.status.in_(['finished', 'failed'])).order_by(desc(DBReanalyzeJob.id))).scalars().first()
+            failed_ids = set(last.failed_ids or []) if last else set()
+
+    targets = []
+    for record_id, save_path, summary, detail, summary_key in rows:
+        repo_path = _resolve_repo_path(save_path)
+        if not repo_path:
+            continue
+        if filter_name == 'missing' and summary and detail and summary != "暂无介绍":
+            continue
+        if filter_name == 'failed' and record_id not in failed_ids:
+            continue
+        if filter_name == 'stale':
+            current = _current_summary_key(repo_path, templates, cfg)
+            if current is None or current == summary_key:
+                continue
+        targets.append(record_id)
+    return targets
+
+
+def _reanalyze_job_status(job):
+    total = len(job.target_ids or [])
+    data = {
+        'job_id': job.job_id,
+        'status': job.status,
+        'filter': job.filter,
+        'options': job.options or {},
+        'total': total,
+        'processed': job.cursor or 0,
+        'succeeded': job.succeeded or 0,
+        'failed': len(job.failed_ids or []),
+        'percent': round((job.cursor or 0) * 100.0 / total, 1) if total else (100.0 if job.status == 'finished' else 0.0),
+        'throughput_per_min': None,
+        'eta_seconds': None,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.status == 'running' and job.resumed_at:
+        elapsed = (datetime.now() - job.resumed_at).total_seconds()
+        done_this_run = (job.cursor or 0) - (job.resumed_cursor or 0)
+        if elapsed > 0 and done_this_run > 0:
+            rate = done_this_run / elapsed
+            data['throughput_per_min'] = round(rate * 60, 2)
+            data['eta_seconds'] = int((total - (job.cursor or 0)) / rate)
+    return data
+
+
+def _run_reanalyze_job(job_id):
+    """Process a reanalyze job from its checkpoint; each batch commits its records together with the new cursor."""
+    from sqlalchemy import select
+    try:
+        with session_scope() as s:
+            job = s.execute(select(DBReanalyzeJob).filter_by(job_id=job_id)).scalars().first()
+            if not job or job.status == 'finished':
+                return
+            options = dict(job.options or {})
+            filter_name = job.filter
+            target_ids = job.target_ids
+            job.status = 'running'
+            job.error = None
+            job.started_at = job.started_at or datetime.now()
+            job.resumed_at = datetime.now()
+            job.resumed_cursor = job.cursor or 0
+            job.updated_at = datetime.now()
+
+        cfg = _get_summary_llm_config()
+        templates = _get_summary_templates()
+        if target_ids is None:
+            _sync_pull_records_from_json()
+            target_ids = _select_reanalyze_targets(filter_name, templates, cfg)
+            with session_scope() as s:
+                job = s.execute(select(DBReanalyzeJob).filter_by(job_id=job_id)).scalars().first()
+                job.target_ids = target_ids
+                job.failed_ids = []
+                job.updated_at = datetime.now()
+        logger.info(f"Reanalyze job {job_id}: {len(target_ids)} records, filter={filter_name}")
+
+        batch_size = max(1, int(options.get('batch_size') or REANALYZE_BATCH_SIZE))
+        while True:
+            with session_scope() as s:
+                job = s.execute(select(DBReanalyzeJob).filter_by(job_id=job_id)).scalars().first()
+                cursor = job.cursor or 0
+                records = []
+                batch_ids = target_ids[cursor:cursor + batch_size]
+                if batch_ids:
+                    rows = s.execute(select(DBPullRecord).filter(DBPullRecord.id.in_(batch_ids))).scalars().all()
+                    records = [(r.id, _resolve_repo_path(r.save_path), r.token_count) for r in rows]
+            if not batch_ids:
+                break
+
+            records = [r for r in records if r[1]]
+            paths = [path for _, path, _ in records]
+
+            def prepare(record):
+                _, path, token_count = record
+                if not token_count or options.get('recount_tokens'):
+                    try:
+                        token_count = count_tokens_in_dir(path)
+                    except Exception:
+                        pass
+                return token_count, _current_summary_key(path, templates, cfg)
+
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(8, max(1, len(records)))) as executor:
+                prepared = list(executor.map(prepare, records))
+            results = generate_summaries_batch(paths, concurrency=options.get('concurrency'), bypass_cache=bool(options.get('bypass_cache')),
+                                               trace_ids={path: f"reanalyze:{job_id}:{record_id}" for record_id, path, _ in records},
+                                               record_ids={path: record_id for record_id, path, _ in records})
+
+            with session_scope() as s:
+                by_id = {r.id: r for r in s.execute(select(DBPullRecord).filter(DBPullRecord.id.in_([r[0] for r in records]))).scalars().all()} if records else {}
+                job = s.execute(select(DBReanalyzeJob).filter_by(job_id=job_id)).scalars().first()
+                failed_ids = list(job.failed_ids or [])
+                succeeded = 0
+                for (record_id, _, _), (token_count, summary_key), result in zip(records, prepared, results):
+                    record = by_id.get(record_id)
+                    if record is None:
+                        continue
+                    record.token_count = token_count
+                    if result['error']:
+                        failed_ids.append(record_id)
+                        continue
+                    summary, detail = result['summary'], result['detail']
+                    record.summary = summary[:60000] if summary else summary
+                    record.detail = detail[:60000] if detail else detail
+                    record.summary_key = summary_key
+                    succeeded += 1
+                # Checkpoint in the same transaction as the records it covers
+                job.cursor = cursor + len(batch_ids)
+                job.succeeded = (job.succeeded or 0) + succeeded
+                job.failed_ids = failed_ids
+                job.updated_at = datetime.now()
+            logger.info(f"Reanalyze job {job_id}: {cursor + len(batch_ids)}/{len(target_ids)} done")
+
+        with session_scope() as s:
+            job = s.execute(select(DBReanalyzeJob).filter_by(job_id=job_id)).scalars().first()
+            job.status = 'finished'
+            job.finished_at = datetime.now()
+            job.updated_at = datetime.now()
+        logger.info(f"Reanalyze job {job_id} finished")
+    except Exception as e:
+        logger.error(f"Reanalyze job {job_id} failed: {e}")
+        try:
+            with session_scope() as s:
+                job = s.execute(select(DBReanalyzeJob).filter_by(job_id=job_id)).scalars().first()
+                if job:
+                    job.status = 'failed'
+                    job.error = str(e)
+                    job.updated_at = datetime.now()
+        except Exception as e2:
+            logger.error(f"Reanalyze job {job_id} status update failed: {e2}")
+    finally:
+        with _reanalyze_lock:
+            _reanalyze_threads.pop(job_id, None)
+
+
+def _start_reanalyze_thread(job_id):
+    with _reanalyze_lock:
+        thread = _reanalyze_threads.get(job_id)
+        if thread and thread.is_alive():
+            return
+        thread = threading.Thread(target=_run_reanalyze_job, args=(job_id,), name=f'reanalyze-{job_id}', daemon=True)
+        _reanalyze_threads[job_id] = thread
+        thread.start()
+
+
+def resume_reanalyze_jobs():
+    """Restart jobs interrupted by a shutdown from their last committed batch."""
+    if not session_scope or not DBReanalyzeJob:
+        return
+    try:
+        from sqlalchemy import select
+        with session_scope() as s:
+            if s is None:
+                return
+            job_ids = [j.job_id for j in s.execute(select(DBReanalyzeJob).filter(DBReanalyzeJob.status.in_(['pending', 'running']))).scalars().all()]
+        for job_id in job_ids:
+            logger.info(f"Resuming reanalyze job {job_id}")
+            _start_reanalyze_thread(job_id)
+    except Exception as e:
+        logger.error(f"Resuming reanalyze jobs failed: {e}")
+
+
 @app.route('/api/pull/reanalyze_all', methods=['POST'])
 def reanalyze_all():
-    """Re-analyze all existing records using AI."""
-    if not session_scope:
+    """
+    Start (or resume) a background re-analysis of pull records.
+
+    Payload: filter ('all' | 'stale' | 'failed' | 'missing'), bypass_cache,
+    batch_size, concurrency, recount_tokens; or job_id to resume a failed job.
+    Only one job runs at a time; progress via /api/pull/reanalyze_all/status.
+    """
+    if not session_scope or not DBReanalyzeJob:
         return jsonify({'code': 500, 'message': 'Database not initialized'})
     
-    count = 0
-    updated_names = []
+    payload = request.get_json(silent=True) or {}
+    filter_name = payload.get('filter') or 'all'
+    if filter_name not in REANALYZE_FILTERS:
+        return jsonify({'code': 400, 'message': f"filter must be one of {', '.join(REANALYZE_FILTERS)}"}), 400
+
     try:
-        with session_scope() as session:
-            # 1. Sync from JSON to DB
-            json_records = _read_json(RECORDS_FILE_PULL, [])
-            db_paths = {r.save_path for r in session.query(DBPullRecord.save_path).all() if r.save_path}
-            
-            for jr in json_records:
-                path = jr.get('path')
-                if path and path not in db_paths:
-                    # Insert into DB
-                    new_rec = DBPullRecord(
-                        repo_full_name=jr.get('name'),
-                        url=jr.get('url'),
-                        pull_time=datetime.fromisoformat(jr.get('pullTime')) if jr.get('pullTime') else datetime.now(),
-                        stars=jr.get('stars', 0),
-                        forks=jr.get('forks', 0),
-                        save_path=path,
-                        result_status=jr.get('status', 'cloned'),
-                        rule=jr.get('rule', 'manual'),
-                        summary=jr.get('summary')[:60000] if jr.get('summary') else None,
-                        detail=jr.get('detail')[:60000] if jr.get('detail') else None
-                    )
-                    session.add(new_rec)
-                    db_paths.add(path)
-            session.commit()
-
-            # 2. Re-analyze all DB records
-            records = session.query(DBPullRecord).all()
-            for record in records:
-                # Determine path
-                repo_path = record.save_path
-                if not repo_path:
-                    continue
-                    
-                if not os.path.exists(repo_path):
-                    # Try relative to data dir
-                    data_dir = os.path.join(os.path.dirname(__file__), 'data')
-                    possible_path = os.path.join(data_dir, os.path.basename(repo_path))
-                    if os.path.exists(possible_path):
-                        repo_path = possible_path
-                    else:
-                        continue
-                
-                # Calculate Tokens
-                try:
-                    token_count = count_tokens_in_dir(repo_path)
-                    record.token_count = token_count
-                except Exception:
-                    pass
-
-                # Generate
-                summary, detail = _generate_ai_summary_detail(repo_path)
-                record.summary = summary[:60000] if summary else summary
-                record.detail = detail[:60000] if detail else detail
-                updated_names.append(record.repo_full_name or record.url)
-                count += 1
-                
-        return jsonify({
-            'code': 200, 
-            'message': f'Successfully re-analyzed {count} projects',
-            'data': updated_names
-        })
+        import uuid
+        from sqlalchemy import select, desc
+        with session_scope() as s:
+            active = s.execute(select(DBReanalyzeJob).filter(DBReanalyzeJob.status.in_(['pending', 'running'])).order_by(desc(DBReanalyzeJob.id))).scalars().first()
+            if active:
+                job = active
+                message = 'A reanalyze job is already running'
+            elif payload.get('job_id'):
+                job = s.execute(select(DBReanalyzeJob).filter_by(job_id=payload['job_id'])).scalars().first()
+                if not job:
+                    return jsonify({'code': 404, 'message': 'Job not found'}), 404
+                if job.status != 'finished':
+                    job.status = 'pending'
+                message = 'Reanalyze job resumed'
+            else:
+                job = DBReanalyzeJob(
+                    job_id=uuid.uuid4().hex[:16],
+                    status='pending',
+                    filter=filter_name,
+                    options={
+                        'bypass_cache': bool(payload.get('bypass_cache')),
+                        'batch_size': int(payload.get('batch_size') or REANALYZE_BATCH_SIZE),
+                        'concurrency': int(payload['concurrency']) if payload.get('concurrency') else None,
+                        'recount_tokens': bool(payload.get('recount_tokens')),
+                    },
+                    cursor=0,
+                    succeeded=0,
+                    created_at=datetime.now(),
+                    updated_at=datetime.now(),
+                )
+                s.add(job)
+                s.flush()
+                message = 'Reanalyze job started'
+            data = _reanalyze_job_status(job)
+
+        if data['status'] in ('pending', 'running'):
+            _start_reanalyze_thread(data['job_id'])
+        return jsonify({'code': 200, 'message': message, 'data': data})
+    except Exception as e:
+        return jsonify({'code': 500, 'message': str(e)})
+
+
+@app.route('/api/pull/reanalyze_all/status', methods=['GET'])
+def reanalyze_all_status():
+    """Progress, throughput and ETA of a reanalyze job (the latest one by default)."""
+    if not session_scope or not DBReanalyzeJob:
+        return jsonify({'code': 500, 'message': 'Database not initialized'})
+    try:
+        from sqlalchemy import select, desc
+        with session_scope() as s:
+            query = select(DBReanalyzeJob)
+            job_id = request.args.get('job_id')
+            query = query.filter_by(job_id=job_id) if job_id else query.order_by(desc(DBReanalyzeJob.id))
+            job = s.execute(query).scalars().first()
+            if not job:
+                return jsonify({'code': 404, 'message': 'Job not found'}), 404
+            return jsonify({'code': 200, 'data': _reanalyze_job_status(job)})
     except Exception as e:
         return jsonify({'code': 500, 'message': str(e)})
 
@@ -2246,5 +3147,10 @@ if __name__ == '__main__':
     host = os.getenv('FLASK_HOST', '0.0.0.0')
     port = int(os.getenv('FLASK_PORT', 5001))
     debug = os.getenv('FLASK_ENV') == 'development'
+
+    # With the debug reloader only the child process serves requests
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_reanalyze_jobs()
+        resume_article_tasks()
     
     app.run(host=host, port=port, debug=debug)
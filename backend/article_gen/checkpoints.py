@@ -0,0 +1,66 @@
+import os
+from typing import Any, Dict, Optional
+try:
+    from backend.utils.disk_cache import DiskCache
+    from backend.article_gen.profiles import get_step_profile
+except ImportError:
+    from utils.disk_cache import DiskCache
+    from article_gen.profiles import get_step_profile
+
+# Pipeline outputs saved per task
+CHECKPOINT_FILES = 'files'        # files chosen by selection + refinement, in read order
+CHECKPOINT_CONTEXT = 'context'    # file tree and packed file contents (RepoContext)
+CHECKPOINT_DETAILED = 'detailed'  # step 4 detailed documentation (v1)
+CHECKPOINT_OUTLINE = 'outline'    # article outline (v3)
+CHECKPOINT_SECTIONS = 'sections'  # finished sections by index (v3)
+CHECKPOINT_DRAFT = 'draft'        # finished article before it is saved
+
+# 任务检查点保留时长（秒），需覆盖失败重试和审核修改的时间窗口
+TASK_CHECKPOINT_TTL = int(os.getenv('TASK_CHECKPOINT_TTL', str(7 * 24 * 3600)))
+
+_store = DiskCache('task_checkpoints', ttl=TASK_CHECKPOINT_TTL)
+
+
+def inputs_hash(*parts: Any) -> str:
+    """Stable hash of everything a step's output depends on."""
+    return DiskCache.make_key(*parts)
+
+
+def step_fingerprint(llm_config: Dict, step: str) -> Dict:
+    """Model settings that change a step's output (the API key does not)."""
+    return {k: v for k, v in get_step_profile(llm_config, step).items() if k != 'api_key'}
+
+
+class TaskCheckpoints:
+    """
+    Outputs of the article pipeline steps of one task, so a retry or a
+    revision resumes after the last step whose inputs are unchanged.
+
+    Each step keeps its latest output together with the hash of its
+    inputs; ``load`` only returns it when the hash still matches.
+    """
+
+    def __init__(self, task_id: str, store: Optional[DiskCache] = None):
+        self.task_id = task_id
+        self.store = store or _store
+
+    def _key(self, step: str) -> str:
+        return DiskCache.make_key('checkpoint', self.task_id, step)
+
+    def load(self, step: str, inputs: str):
+        entry = self.store.get(self._key(step))
+        if entry and entry.get('inputs') == inputs:
+            return entry.get('value')
+        return None
+
+    def latest(self, step: str):
+        """Last saved output of ``step`` whatever its inputs were."""
+        entry = self.store.get(self._key(step))
+        return entry.get('value') if entry else None
+
+    def save(self, step: str, inputs: str, value: Any):
+        self.store.set(self._key(step), {'inputs': inputs, 'value': value})
+
+    def clear(self):
+        for step in (CHECKPOINT_FILES, CHECKPOINT_CONTEXT, CHECKPOINT_DETAILED, CHECKPOINT_OUTLINE, CHECKPOINT_SECTIONS, CHECKPOINT_DRAFT):
+            self.store.delete(self._key(step))
@@ -0,0 +1,281 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
+try:
+    from backend.article_gen.profiles import get_step_llm, get_step_profile, STEP_SELECT, STEP_DRAFT
+    from backend.utils.tokenizer import count_tokens
+    from backend.utils.tracing import span
+    from backend.llm.telemetry import llm_call_context
+    from backend.article_gen.prompting import build_repo_messages, format_file_block
+    from backend.article_gen.file_selection import FILES_FORMAT_INSTRUCTION, IGNORED_DIRS, RepoIndex, select_files
+    from backend.article_gen.checkpoints import CHECKPOINT_CONTEXT, CHECKPOINT_FILES, TaskCheckpoints, inputs_hash, step_fingerprint
+except ImportError:
+    from article_gen.profiles import get_step_llm, get_step_profile, STEP_SELECT, STEP_DRAFT
+    from utils.tokenizer import count_tokens
+    from utils.tracing import span
+    from llm.telemetry import llm_call_context
+    from article_gen.prompting import build_repo_messages, format_file_block
+    from article_gen.file_selection import FILES_FORMAT_INSTRUCTION, IGNORED_DIRS, RepoIndex, select_files
+    from article_gen.checkpoints import CHECKPOINT_CONTEXT, CHECKPOINT_FILES, TaskCheckpoints, inputs_hash, step_fingerprint
+
+# Token budget for packed file contents, leaving room for the tree, instructions and output
+MAX_CONTEXT_TOKENS = 20000
+# 批量任务共享的上下文保留时长（秒）
+SHARED_CONTEXT_TTL = int(os.getenv('SHARED_CONTEXT_TTL', '3600'))
+
+
+@dataclass
+class RepoContext:
+    """File tree plus the packed contents of the files chosen for a goal."""
+    file_tree: str
+    context: str = ""
+    context_tokens: int = 0
+    read_files: Set[str] = field(default_factory=set)
+
+    def to_dict(self) -> Dict:
+        return {'file_tree': self.file_tree, 'context': self.context, 'context_tokens': self.context_tokens,
+                'read_files': sorted(self.read_files)}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'RepoContext':
+        return cls(file_tree=data.get('file_tree', ''), context=data.get('context', ''),
+                   context_tokens=data.get('context_tokens', 0), read_files=set(data.get('read_files') or []))
+
+
+def get_file_tree(repo_path: str) -> str:
+    """Generate a visual file tree of the repository."""
+    tree_str = ""
+    repo_path = os.path.abspath(repo_path)
+
+    for root, dirs, files in os.walk(repo_path):
+        # Skip hidden dirs and common ignore dirs
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d not in IGNORED_DIRS)
+        # Sorted so the tree (part of the cached prompt prefix) is byte-identical between runs
+        files = sorted(files)
+
+        level = root.replace(repo_path, '').count(os.sep)
+        indent = ' ' * 4 * (level)
+        tree_str += '{}{}/\n'.format(indent, os.path.basename(root))
+        subindent = ' ' * 4 * (level + 1)
+        for f in files:
+            if not f.startswith('.') and not f.endswith(('.pyc', '.png', '.jpg', '.jpeg', '.gif', '.ico', '.svg', '.woff', '.ttf')):
+                tree_str += '{}{}\n'.format(subindent, f)
+
+        # Limit tree size to avoid context overflow just for tree
+        if len(tree_str) > 20000:
+            tree_str += "\n...(tree truncated)...\n"
+            break
+
+    return tree_str
+
+
+def read_file_content(repo_path: str, file_path: str) -> str:
+    """Read content of a file, ensuring it's within the repo."""
+    # Handle potential leading slash or relative path issues
+    file_path = file_path.lstrip('/')
+    full_path = os.path.join(repo_path, file_path)
+
+    # Security check
+    if not os.path.abspath(full_path).startswith(os.path.abspath(repo_path)):
+        return ""
+
+    if not os.path.exists(full_path):
+        # Try to find by name if path is inexact (simple heuristic)
+        for root, _, files in os.walk(repo_path):
+            if os.path.basename(file_path) in files:
+                full_path = os.path.join(root, os.path.basename(file_path))
+                break
+        else:
+            return ""
+
+    try:
+        with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+    except Exception:
+        return ""
+
+
+def _files_signature(repo_path: str, files: List[str]) -> List:
+    """(path, size, mtime) of the selected files, so a re-pulled repo repacks them."""
+    signature = []
+    for f in files:
+        try:
+            st = os.stat(os.path.join(repo_path, f.lstrip('/')))
+            signature.append((f, st.st_size, st.st_mtime_ns))
+        except OSError:
+            signature.append((f, None, None))
+    return signature
+
+
+def build_repo_context(repo_path: str, repo_name: str, goal: str, llm_config: Dict, log: Callable[[str], None],
+                       checkpoints: Optional[TaskCheckpoints] = None) -> RepoContext:
+    """
+    Steps 1-3 of the pipeline: file tree, file selection for ``goal`` and up
+    to three refinement rounds, packing file contents up to MAX_CONTEXT_TOKENS.
+
+    With ``checkpoints``, a file selection made for the same goal, tree and
+    models is reused without any LLM call, and so is the packed context while
+    the selected files are unchanged on disk.
+    """
+    select_llm = get_step_llm(llm_config, STEP_SELECT)
+    bypass_cache = llm_config.get('bypass_cache', False)
+    # Budget with the tokenizer of the model that reads the whole context
+    draft_model = get_step_profile(llm_config, STEP_DRAFT)['model']
+
+    # Step 1: Get File Tree
+    log("Step 1: Generating file tree...")
+    with span('index') as attrs:
+        file_tree = get_file_tree(repo_path)
+        repo_index = RepoIndex(repo_path)
+        attrs['files'] = len(repo_index.paths)
+    log(f"File Tree Content (First 2000 chars):\n{file_tree[:2000]}..." if len(file_tree) > 2000 else f"File Tree Content:\n{file_tree}")
+
+    selection_inputs = inputs_hash(repo_name, goal, file_tree, step_fingerprint(llm_config, STEP_SELECT), draft_model, MAX_CONTEXT_TOKENS)
+    saved_files = checkpoints.load(CHECKPOINT_FILES, selection_inputs) if checkpoints else None
+    if saved_files is not None:
+        context_inputs = inputs_hash(selection_inputs, _files_signature(repo_path, saved_files))
+        saved_context = checkpoints.load(CHECKPOINT_CONTEXT, context_inputs)
+        if saved_context is not None:
+            log(f"Steps 2-3: Resuming from checkpoint ({len(saved_files)} files, {saved_context['context_tokens']} tokens)")
+            return RepoContext.from_dict(saved_context)
+        log(f"Steps 2-3: Reusing checkpointed file selection ({len(saved_files)} files), repacking contents")
+
+    # Every repository step shares one prompt prefix (system prompt, file tree,
+    # packed file contents) and differs only in the trailing instructions, so
+    # the provider's prefix cache covers everything read so far.
+    ctx = RepoContext(file_tree=file_tree)
+    read_order = []
+
+    def add_files(files, limit_msg):
+        with span('pack') as attrs:
+            added = _pack(files, limit_msg)
+            attrs.update(files=len(ctx.read_files), tokens=ctx.context_tokens)
+        return added
+
+    def _pack(files, limit_msg):
+        added = False
+        for f in files:
+            if f in ctx.read_files:
+                continue
+            content = read_file_content(repo_path, f)
+            if not content:
+                continue
+            # Check token limit
+            block = format_file_block(f, content)
+            block_tokens = count_tokens(block, draft_model)
+            if ctx.context_tokens + block_tokens > MAX_CONTEXT_TOKENS:
+                log(f"{limit_msg}, skipping {f}")
+                break
+            ctx.context += block
+            ctx.context_tokens += block_tokens
+            ctx.read_files.add(f)
+            read_order.append(f)
+            added = True
+        return added
+
+    def save(files):
+        if checkpoints:
+            checkpoints.save(CHECKPOINT_FILES, selection_inputs, files)
+            checkpoints.save(CHECKPOINT_CONTEXT, inputs_hash(selection_inputs, _files_signature(repo_path, files)), ctx.to_dict())
+
+    if saved_files is not None:
+        add_files(saved_files, "Context limit reached")
+        save(saved_files)
+        return ctx
+
+    # Step 2: Ask for files to read
+    log("Step 2: Analyzing file tree to select files...")
+    prompt_1 = f"""Goal: {goal}
+
+Based on the file tree and the goal, which files should I read to understand the project?
+Select up to 10 most important files.
+{FILES_FORMAT_INSTRUCTION}
+"""
+
+    messages = build_repo_messages(repo_name, file_tree, ctx.context, prompt_1)
+
+    with llm_call_context(step=STEP_SELECT), span('select', round=0):
+        files_to_read = select_files(select_llm, messages, repo_index, require_files=True, bypass_cache=bypass_cache, log=log)
+
+    log(f"LLM requested initial files: {files_to_read}")
+
+    # Step 3: Loop
+    # Initial read
+    add_files(files_to_read, "Context limit reached")
+
+    # Iteration
+    for i in range(3):
+        log(f"Step 3.{i+1}: Refining context (Current size: {ctx.context_tokens} tokens)...")
+
+        prompt_loop = f"""Files read so far: {sorted(ctx.read_files)}
+
+Goal: {goal}
+
+Do you need more files to fully achieve the goal?
+If yes, list the NEW files to read. If no, return an empty "files" array.
+{FILES_FORMAT_INSTRUCTION}
+"""
+        messages = build_repo_messages(repo_name, file_tree, ctx.context, prompt_loop)
+
+        with llm_call_context(step=STEP_SELECT), span('select', round=i + 1):
+            new_files = select_files(select_llm, messages, repo_index, bypass_cache=bypass_cache, log=log)
+        log(f"Round {i+1} - LLM requested additional files: {new_files}")
+
+        if not new_files:
+            log("No more files needed.")
+            break
+
+        if not add_files(new_files, "Context limit reached during refinement"):
+            log("No new files added.")
+            break
+
+    save(read_order)
+    return ctx
+
+
+class SharedContexts:
+    """
+    Single-flight store of context builds shared by several tasks (e.g. one
+    repo rendered with several templates in a batch). The first caller for a
+    key builds; concurrent callers wait for that build instead of repeating
+    it. Failed builds are not kept, so a later caller retries.
+    """
+
+    def __init__(self, ttl: int = SHARED_CONTEXT_TTL):
+        self.ttl = ttl
+        self._entries: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, build: Callable[[], RepoContext], log: Optional[Callable[[str], None]] = None) -> RepoContext:
+        with self._lock:
+            now = time.time()
+            for k in [k for k, e in self._entries.items() if e['done'].is_set() and now - e['at'] > self.ttl]:
+                del self._entries[k]
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = {'done': threading.Event(), 'value': None, 'at': now}
+
+        if not owner:
+            if log:
+                log(f"Reusing shared repository context ({key})")
+            entry['done'].wait()
+            if entry['value'] is not None:
+                return entry['value']
+            # The owner failed: build our own copy
+            return build()
+
+        try:
+            entry['value'] = build()
+            return entry['value']
+        finally:
+            entry['at'] = time.time()
+            if entry['value'] is None:
+                with self._lock:
+                    self._entries.pop(key, None)
+            entry['done'].set()
+
+
+shared_contexts = SharedContexts()
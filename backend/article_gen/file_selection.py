@@ -0,0 +1,126 @@
+import json
+import os
+import re
+from typing import Callable, List, Optional, Tuple
+try:
+    from backend.llm.langchain_utils import invoke_llm, forget_response
+    from backend.article_gen.prompting import describe_prompt_cache
+except ImportError:
+    from llm.langchain_utils import invoke_llm, forget_response
+    from article_gen.prompting import describe_prompt_cache
+from langchain_core.messages import AIMessage, HumanMessage
+
+IGNORED_DIRS = {'node_modules', 'venv', '__pycache__', 'dist', 'build'}
+
+# Appended to every file-selection instruction. JSON mode (response_format
+# json_object) is supported by OpenAI, DeepSeek and DashScope; it requires
+# the word "JSON" in the prompt and guarantees a parseable object.
+FILES_FORMAT_INSTRUCTION = 'Respond with a JSON object only, using exactly this schema: {"files": ["<path relative to the project root>", ...]}. Example: {"files": ["src/main.py", "README.md"]}'
+
+
+class RepoIndex:
+    """Relative paths of the files in a repository, used to validate model-selected paths."""
+
+    def __init__(self, repo_path: str):
+        self.root = os.path.abspath(repo_path)
+        self.root_name = os.path.basename(self.root)
+        self.paths = set()
+        self._by_name = {}
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in IGNORED_DIRS]
+            for name in files:
+                rel = os.path.relpath(os.path.join(root, name), self.root).replace(os.sep, '/')
+                self.paths.add(rel)
+                self._by_name.setdefault(name, []).append(rel)
+
+    def resolve(self, path) -> Optional[str]:
+        """Canonical relative path for ``path`` as written by the model, or None if it is not in the repo."""
+        if not isinstance(path, str):
+            return None
+        path = path.strip().replace('\\', '/')
+        while path.startswith('./'):
+            path = path[2:]
+        path = path.lstrip('/')
+        if path in self.paths:
+            return path
+        # The tree starts with the repo directory, so models sometimes include it
+        if path.startswith(self.root_name + '/') and path[len(self.root_name) + 1:] in self.paths:
+            return path[len(self.root_name) + 1:]
+        # A bare or mis-nested file name is accepted only if it is unambiguous
+        matches = self._by_name.get(path.rsplit('/', 1)[-1], [])
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+
+def parse_file_list(text: str) -> Tuple[Optional[List], Optional[str]]:
+    """``(files, None)`` for a valid ``{"files": [...]}`` answer, otherwise ``(None, reason)``."""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        # Providers without JSON mode may wrap the object in prose or a code fence
+        match = re.search(r'\{.*\}', text or '', re.DOTALL)
+        try:
+            data = json.loads(match.group(0)) if match else None
+        except ValueError:
+            data = None
+        if data is None:
+            return None, "the answer was not valid JSON"
+    if isinstance(data, list):
+        # Bare list answers are unambiguous enough to accept
+        data = {'files': data}
+    if not isinstance(data, dict) or not isinstance(data.get('files'), list):
+        return None, 'the JSON object must have a "files" array'
+    if not all(isinstance(f, str) for f in data['files']):
+        return None, '"files" must contain only path strings'
+    return data['files'], None
+
+
+def select_files(llm, messages: List, index: RepoIndex, require_files: bool = False, max_files: int = 10, bypass_cache: bool = False, log: Optional[Callable[[str], None]] = None) -> List[str]:
+    """
+    Ask ``llm`` for files to read in JSON mode and return validated repo paths.
+
+    Unknown paths are dropped. If the answer cannot be parsed, or none of the
+    returned paths exist (or the list is empty while ``require_files``), one
+    corrective retry is made that shows the model its answer and the problem.
+    Rejected answers are removed from the response cache.
+    """
+    log = log or (lambda msg: None)
+    json_llm = llm.bind(response_format={'type': 'json_object'})
+
+    attempt_messages = list(messages)
+    selected = []
+    for attempt in range(2):
+        response = invoke_llm(json_llm, attempt_messages, bypass_cache=bypass_cache)
+        log(f"File selection {describe_prompt_cache(response)}")
+        files, problem = parse_file_list(response.content)
+
+        invalid = []
+        if files is not None:
+            selected = []
+            for f in files:
+                resolved = index.resolve(f)
+                if resolved is None:
+                    invalid.append(f)
+                elif resolved not in selected:
+                    selected.append(resolved)
+            if invalid:
+                log(f"Ignoring paths not in the repository: {invalid}")
+            if not selected and invalid:
+                problem = f"none of these paths exist in the file tree: {invalid}"
+            elif not selected and require_files:
+                problem = "at least one file must be selected"
+
+        if not problem:
+            break
+        # A rejected answer must not be replayed from the response cache on the next run
+        forget_response(json_llm, attempt_messages)
+        if attempt == 1:
+            break
+        log(f"File selection answer rejected ({problem}), asking once more")
+        attempt_messages = list(messages) + [
+            AIMessage(content=response.content or ''),
+            HumanMessage(content=f"Your answer is invalid: {problem}. Use only paths that appear in the file tree above. {FILES_FORMAT_INSTRUCTION}"),
+        ]
+
+    return selected[:max_files]
@@ -2,17 +2,21 @@ from typing import Dict
 try:
     from backend.article_gen import generator_v1
     from backend.article_gen import generator_v2
+    from backend.article_gen import generator_v3
 except ImportError:
     from article_gen import generator_v1
     from article_gen import generator_v2
+    from article_gen import generator_v3
 
-def generate_article_content(repo_path: str, repo_name: str, user_prompt: str, llm_config: Dict, log_callback=None) -> str:
+def generate_article_content(repo_path: str, repo_name: str, user_prompt: str, llm_config: Dict, log_callback=None, stream_callback=None, repo_context=None, checkpoints=None) -> str:
     engine_version = llm_config.get('engine_version', 'v1')
     
     if log_callback:
         log_callback(f"Using Article Generation Engine: {engine_version.upper()}")
 
-    if engine_version == 'v2':
-        return generator_v2.generate_article_content(repo_path, repo_name, user_prompt, llm_config, log_callback)
+    if engine_version == 'v3':
+        return generator_v3.generate_article_content(repo_path, repo_name, user_prompt, llm_config, log_callback, stream_callback, repo_context, checkpoints)
+    elif engine_version == 'v2':
+        return generator_v2.generate_article_content(repo_path, repo_name, user_prompt, llm_config, log_callback, stream_callback, repo_context, checkpoints)
     else:
-        return generator_v1.generate_article_content(repo_path, repo_name, user_prompt, llm_config, log_callback)
+        return generator_v1.generate_article_content(repo_path, repo_name, user_prompt, llm_config, log_callback, stream_callback, repo_context, checkpoints)
@@ -0,0 +1,334 @@
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+try:
+    from backend.llm.langchain_utils import invoke_llm, forget_response, stream_llm_complete
+    from backend.utils.text_utils import sanitize_mermaid_content
+    from backend.article_gen.profiles import get_step_llm, STEP_DRAFT, STEP_REFINE
+    from backend.llm.telemetry import llm_call_context, bind_context
+    from backend.utils.tracing import span
+    from backend.article_gen.prompting import build_repo_messages, describe_prompt_cache, split_file_blocks
+    from backend.article_gen.context import RepoContext, build_repo_context
+    from backend.article_gen.checkpoints import CHECKPOINT_DRAFT, CHECKPOINT_OUTLINE, CHECKPOINT_SECTIONS, TaskCheckpoints, inputs_hash, step_fingerprint
+    from backend.article_gen import generator_v1
+except ImportError:
+    from llm.langchain_utils import invoke_llm, forget_response, stream_llm_complete
+    from utils.text_utils import sanitize_mermaid_content
+    from article_gen.profiles import get_step_llm, STEP_DRAFT, STEP_REFINE
+    from llm.telemetry import llm_call_context, bind_context
+    from utils.tracing import span
+    from article_gen.prompting import build_repo_messages, describe_prompt_cache, split_file_blocks
+    from article_gen.context import RepoContext, build_repo_context
+    from article_gen.checkpoints import CHECKPOINT_DRAFT, CHECKPOINT_OUTLINE, CHECKPOINT_SECTIONS, TaskCheckpoints, inputs_hash, step_fingerprint
+    from article_gen import generator_v1
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+# 分节并发生成时同时进行的 LLM 调用数（同时受模型限流器约束）
+SECTION_CONCURRENCY = int(os.getenv('ARTICLE_SECTION_CONCURRENCY', '4'))
+MIN_SECTIONS = 3
+MAX_SECTIONS = 8
+# Characters of each section shown to the harmonizing call
+SECTION_EXCERPT_CHARS = 300
+
+OUTLINE_FORMAT_INSTRUCTION = 'Respond with a JSON object only, using exactly this schema: {"title": "<article title>", "sections": [{"title": "<section title>", "points": ["<key point>", ...], "files": ["<path from the files read>", ...]}]}'
+HARMONIZE_FORMAT_INSTRUCTION = 'Respond with a JSON object only, using exactly this schema: {"intro": "<opening paragraphs in Markdown>", "conclusion": "<closing paragraphs in Markdown>"}'
+
+EDITOR_SYSTEM_PROMPT = "You are a professional technical editor. Answer in Chinese. Your response must be logically rigorous, semantically smooth, and factually accurate. Maintain a professional perspective, do not exaggerate. Be realistic and rigorous. Avoid words like 'extremely high', 'huge', 'perfect', etc. unless strictly proven. Focus on technical facts."
+
+
+def _parse_json_object(text: str) -> Optional[Dict]:
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        # Providers without JSON mode may wrap the object in prose or a code fence
+        match = re.search(r'\{.*\}', text or '', re.DOTALL)
+        try:
+            data = json.loads(match.group(0)) if match else None
+        except ValueError:
+            data = None
+    return data if isinstance(data, dict) else None
+
+
+def parse_outline(text: str, read_files) -> Tuple[Optional[Dict], Optional[str]]:
+    """``(outline, None)`` for a usable outline answer, otherwise ``(None, reason)``. Unknown files are dropped."""
+    data = _parse_json_object(text)
+    if data is None:
+        return None, "the answer was not a valid JSON object"
+    sections = data.get('sections')
+    if not isinstance(sections, list) or not all(isinstance(sec, dict) and isinstance(sec.get('title'), str) and sec['title'].strip() for sec in sections):
+        return None, 'the JSON object must have a "sections" array of objects with a "title"'
+    if not MIN_SECTIONS <= len(sections) <= MAX_SECTIONS:
+        return None, f"the outline must have between {MIN_SECTIONS} and {MAX_SECTIONS} sections, not {len(sections)}"
+
+    by_name = {}
+    for f in read_files:
+        by_name.setdefault(f.rsplit('/', 1)[-1], []).append(f)
+
+    def resolve(path):
+        if not isinstance(path, str):
+            return None
+        path = path.strip()
+        while path.startswith('./'):
+            path = path[2:]
+        if path in read_files:
+            return path
+        matches = by_name.get(path.rsplit('/', 1)[-1], [])
+        return matches[0] if len(matches) == 1 else None
+
+    outline = {'title': str(data.get('title') or '').strip(), 'sections': []}
+    for sec in sections:
+        files = [resolve(f) for f in (sec.get('files') or [])]
+        outline['sections'].append({
+            'title': sec['title'].strip(),
+            'points': [str(p) for p in (sec.get('points') or []) if str(p).strip()],
+            'files': list(dict.fromkeys(f for f in files if f)),
+        })
+    return outline, None
+
+
+def outline_to_markdown(outline: Dict) -> str:
+    lines = [f"# {outline['title']}" if outline['title'] else "# 大纲", ""]
+    for i, sec in enumerate(outline['sections']):
+        lines.append(f"## {i + 1}. {sec['title']}")
+        lines.extend(f"- {p}" for p in sec['points'])
+        if sec['files']:
+            lines.append(f"- 参考文件：{', '.join(sec['files'])}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def normalize_section(title: str, text: str) -> str:
+    """
+    Fit a generated section under its ``##`` heading: drop a repeated
+    section title and demote ``#``/``##`` headings outside code fences.
+    """
+    lines = (text or '').strip().split('\n')
+    if lines and lines[0].startswith('#') and title.strip() in lines[0]:
+        lines = lines[1:]
+    in_fence = False
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith('```'):
+            in_fence = not in_fence
+        elif not in_fence and re.match(r'^#{1,2} ', line):
+            lines[i] = '###' + line[line.index(' '):]
+    return '\n'.join(lines).strip()
+
+
+def stitch_article(outline: Dict, sections: List[str], intro: str = '', conclusion: str = '') -> str:
+    parts = [f"# {outline['title']}"] if outline['title'] else []
+    if intro:
+        parts.append(intro.strip())
+    for sec, text in zip(outline['sections'], sections):
+        parts.append(f"## {sec['title']}\n\n{normalize_section(sec['title'], text)}")
+    if conclusion:
+        parts.append(f"## 总结\n\n{conclusion.strip()}")
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_article_content(repo_path: str, repo_name: str, user_prompt: str, llm_config: Dict, log_callback=None, stream_callback=None, repo_context: Optional[RepoContext] = None, checkpoints: Optional[TaskCheckpoints] = None) -> str:
+    """
+    Generate article content outline-first (V3 Engine).
+
+    One short call plans the sections, the sections are written concurrently
+    (at most ARTICLE_SECTION_CONCURRENCY at a time), each from the files the
+    outline assigned to it, and a last short call writes the opening and
+    closing around the stitched sections. No single call has to produce the
+    whole article, so long articles neither hit the output limit nor run
+    strictly one token after another.
+
+    Args:
+        repo_path: Path to the repository
+        repo_name: Name of the repository
+        user_prompt: The goal/prompt for the article
+        llm_config: Configuration for LLM (provider, api_key, etc.)
+        log_callback: Function to log progress (msg)
+        stream_callback: Function receiving live output (event, data), event is 'phase', 'content' or 'reasoning'
+        repo_context: Already built file tree and file contents (shared between tasks); built here if None
+        checkpoints: Per-task step outputs; steps whose inputs are unchanged are not run again
+
+    Returns:
+        Generated article content (Markdown)
+    """
+    def log(msg):
+        if log_callback:
+            log_callback(msg)
+        print(f"[ArticleGenV3] {msg}")
+
+    def emit(event, data):
+        if stream_callback:
+            stream_callback(event, data)
+
+    draft_llm = get_step_llm(llm_config, STEP_DRAFT)
+    refine_llm = get_step_llm(llm_config, STEP_REFINE)
+    bypass_cache = llm_config.get('bypass_cache', False)
+    word_limit = llm_config.get('word_limit', 8000)
+
+    # Steps 1-3: file tree and packed file contents
+    if repo_context is None:
+        repo_context = build_repo_context(repo_path, repo_name, user_prompt, llm_config, log, checkpoints)
+    file_tree, context = repo_context.file_tree, repo_context.context
+    read_files = sorted(repo_context.read_files)
+
+    # Step 4: Outline
+    emit('phase', 'outline')
+    outline_inputs = inputs_hash(user_prompt, file_tree, context, word_limit, step_fingerprint(llm_config, STEP_DRAFT))
+    outline = checkpoints.load(CHECKPOINT_OUTLINE, outline_inputs) if checkpoints else None
+    if outline is not None:
+        log(f"Step 4: Resuming from checkpoint (outline with {len(outline['sections'])} sections)")
+    else:
+        with span('generate', engine='v3', part='outline'):
+            outline = _generate_outline(draft_llm, repo_name, user_prompt, file_tree, context, read_files, word_limit, bypass_cache, log)
+        if outline is None:
+            log("No usable outline, falling back to the V1 pipeline")
+            return generator_v1.generate_article_content(repo_path, repo_name, user_prompt, llm_config, log_callback, stream_callback, repo_context, checkpoints)
+        if checkpoints:
+            checkpoints.save(CHECKPOINT_OUTLINE, outline_inputs, outline)
+    log("Outline:\n" + outline_to_markdown(outline))
+
+    # Step 5: Sections, concurrently; each finished one is checkpointed so a retry only redoes the missing ones
+    sections_inputs = inputs_hash(outline_inputs, outline)
+    done = (checkpoints.load(CHECKPOINT_SECTIONS, sections_inputs) if checkpoints else None) or {}
+    blocks = split_file_blocks(context)
+    section_chars = max(500, word_limit // len(outline['sections']))
+    done_lock = threading.Lock()
+
+    def write_section(i):
+        if str(i) in done:
+            return done[str(i)]
+        sec = outline['sections'][i]
+        section_context = ''.join(blocks[f] for f in sec['files'] if f in blocks) or context
+        instructions = _section_prompt(user_prompt, outline, i, section_chars)
+        messages = build_repo_messages(repo_name, file_tree, section_context, instructions)
+        with llm_call_context(step=STEP_DRAFT), span('generate', engine='v3', part='section', section=i + 1):
+            response = stream_llm_complete(draft_llm, messages, bypass_cache=bypass_cache, log=lambda msg: log(f"Section {i + 1}: {msg}"))
+        text = sanitize_mermaid_content(response.content)
+        log(f"Section {i + 1}/{len(outline['sections'])} '{sec['title']}' done ({len(text)} chars, {len(section_context)} context chars, {describe_prompt_cache(response)})")
+        emit('phase', f"section {i + 1}/{len(outline['sections'])}")
+        with done_lock:
+            done[str(i)] = text
+            if checkpoints:
+                checkpoints.save(CHECKPOINT_SECTIONS, sections_inputs, dict(done))
+        return text
+
+    pending = len(outline['sections']) - len(done)
+    log(f"Step 5: Writing {pending} of {len(outline['sections'])} sections, up to {SECTION_CONCURRENCY} at a time...")
+    emit('phase', 'sections')
+    with ThreadPoolExecutor(max_workers=max(1, min(SECTION_CONCURRENCY, len(outline['sections'])))) as executor:
+        sections = list(executor.map(bind_context(write_section), range(len(outline['sections']))))
+
+    # Step 6: Stitch and harmonize
+    final_inputs = inputs_hash(sections_inputs, sections, step_fingerprint(llm_config, STEP_REFINE))
+    saved = checkpoints.load(CHECKPOINT_DRAFT, final_inputs) if checkpoints else None
+    if saved is not None:
+        log("Step 6: Resuming from checkpoint (stitched article)")
+        emit('phase', 'final_content')
+        emit('content', saved['final_content'])
+        return saved
+
+    log("Step 6: Stitching sections and writing the opening and closing...")
+    emit('phase', 'final_content')
+    with span('refine', engine='v3'):
+        intro, conclusion = _harmonize(refine_llm, user_prompt, outline, sections, bypass_cache, log)
+    final_content = stitch_article(outline, sections, intro, conclusion)
+    emit('content', final_content)
+    log(f"Article assembled ({len(final_content)} chars).")
+
+    result = {
+        "final_content": final_content,
+        "detailed_content": outline_to_markdown(outline),
+        "thinking_content": ""
+    }
+    if checkpoints:
+        checkpoints.save(CHECKPOINT_DRAFT, final_inputs, result)
+    return result
+
+
+def _generate_outline(llm, repo_name, user_prompt, file_tree, context, read_files, word_limit, bypass_cache, log) -> Optional[Dict]:
+    """Outline in JSON mode, with one corrective retry; rejected answers are not left in the response cache."""
+    log("Step 4: Planning the article outline...")
+    instructions = f"""You are now acting as a professional technical writer.
+
+Goal: {user_prompt}
+
+Plan a technical article of about {word_limit} Chinese characters based on the context and goal.
+Split it into {MIN_SECTIONS} to {MAX_SECTIONS} sections that do not overlap. Do not plan a separate introduction or conclusion section; they are written afterwards.
+For each section give its title (in Chinese), the key points it must cover, and the files it draws on.
+Files read: {read_files}
+{OUTLINE_FORMAT_INSTRUCTION}
+"""
+    messages = build_repo_messages(repo_name, file_tree, context, instructions)
+    json_llm = llm.bind(response_format={'type': 'json_object'})
+    for attempt in range(2):
+        with llm_call_context(step=STEP_DRAFT):
+            response = invoke_llm(json_llm, messages, bypass_cache=bypass_cache)
+        log(f"Outline {describe_prompt_cache(response)}")
+        outline, problem = parse_outline(response.content, read_files)
+        if outline is not None:
+            return outline
+        forget_response(json_llm, messages)
+        log(f"Outline answer rejected ({problem})")
+        messages = messages + [
+            AIMessage(content=response.content or ''),
+            HumanMessage(content=f"Your answer is invalid: {problem}. {OUTLINE_FORMAT_INSTRUCTION}"),
+        ]
+    return None
+
+
+def _section_prompt(user_prompt: str, outline: Dict, index: int, section_chars: int) -> str:
+    sec = outline['sections'][index]
+    plan = "\n".join(f"{i + 1}. {s['title']}" for i, s in enumerate(outline['sections']))
+    points = "\n".join(f"- {p}" for p in sec['points']) or "- (see the section title)"
+    return f"""You are now acting as a professional technical writer.
+
+Goal of the whole article: {user_prompt}
+
+Article plan:
+{plan}
+
+Write only section {index + 1}: {sec['title']}
+Key points:
+{points}
+
+Constraints:
+1. About {section_chars} Chinese characters.
+2. Cover only this section; the other sections are written separately, so do not repeat their content and do not write an introduction or conclusion for the article.
+3. Start directly with the content, without the section title. Use ### for sub-headings.
+4. Keep the most important technical details and code examples from the context.
+5. Use Markdown format. Answer in Chinese.
+6. Ensure the content is logically rigorous, semantically smooth, and factually accurate.
+"""
+
+
+def _harmonize(llm, user_prompt: str, outline: Dict, sections: List[str], bypass_cache: bool, log) -> Tuple[str, str]:
+    """Opening and closing written from section excerpts, so the output stays short."""
+    excerpts = "\n\n".join(
+        f"## {sec['title']}\n{text[:SECTION_EXCERPT_CHARS]}...\n...{text[-SECTION_EXCERPT_CHARS:]}"
+        for sec, text in zip(outline['sections'], sections)
+    )
+    prompt = f"""Goal: {user_prompt}
+
+The article "{outline['title']}" consists of these sections (excerpts):
+
+{excerpts}
+
+Write an opening (1-2 paragraphs) that introduces the project and leads into the sections, and a conclusion (1-2 paragraphs) that ties them together. Answer in Chinese.
+{HARMONIZE_FORMAT_INSTRUCTION}
+"""
+    messages = [SystemMessage(content=EDITOR_SYSTEM_PROMPT), HumanMessage(content=prompt)]
+    json_llm = llm.bind(response_format={'type': 'json_object'})
+    try:
+        with llm_call_context(step=STEP_REFINE):
+            response = invoke_llm(json_llm, messages, bypass_cache=bypass_cache)
+    except Exception as e:
+        log(f"Opening/closing generation failed, stitching sections only: {e}")
+        return '', ''
+    data = _parse_json_object(response.content) or {}
+    intro, conclusion = data.get('intro'), data.get('conclusion')
+    if not isinstance(intro, str) or not isinstance(conclusion, str):
+        forget_response(json_llm, messages)
+        log("Opening/closing answer was not usable, stitching sections only")
+        return '', ''
+    return sanitize_mermaid_content(intro), sanitize_mermaid_content(conclusion)
@@ -0,0 +1,70 @@
+from typing import Dict
+try:
+    from backend.llm.langchain_utils import get_llm, DEFAULT_MODELS
+except ImportError:
+    from llm.langchain_utils import get_llm, DEFAULT_MODELS
+
+# Pipeline steps that can be routed to their own model
+STEP_SELECT = 'select'   # file selection: tiny JSON answers
+STEP_DRAFT = 'draft'     # detailed documentation / direct article
+STEP_REFINE = 'refine'   # condense the draft into the final article
+
+# Defaults applied when MakeConfig.step_profiles does not override a field.
+# provider falls back to the main model config; model/base_url/api_key only
+# do so when the step uses the main provider.
+DEFAULT_STEP_PROFILES = {
+    STEP_SELECT: {'max_tokens': 512, 'temperature': 0, 'reasoning': False},
+    STEP_DRAFT: {'max_tokens': 32000, 'temperature': 0.7},
+    STEP_REFINE: {'max_tokens': 32000, 'temperature': 0.7},
+}
+
+# Non-reasoning sibling used when a step disables reasoning on a reasoning-only model
+NON_REASONING_MODELS = {
+    'deepseek-reasoner': 'deepseek-chat',
+}
+
+
+def get_step_profile(llm_config: Dict, step: str) -> Dict:
+    """
+    Merge defaults, the configured profile for ``step`` and the main model config.
+
+    A step routed to another provider never inherits the main API key or
+    base URL (the key would be sent to the wrong endpoint): it must set its
+    own ``api_key``, and uses that provider's default base URL and model
+    unless the profile names them. Raises ValueError when the key is missing.
+    """
+    profile = dict(DEFAULT_STEP_PROFILES.get(step, {}))
+    profile.update({k: v for k, v in ((llm_config.get('step_profiles') or {}).get(step) or {}).items() if v not in (None, '')})
+    main_provider = llm_config.get('provider', 'openai')
+    profile.setdefault('provider', main_provider)
+    if profile['provider'] == main_provider:
+        profile.setdefault('api_key', llm_config.get('api_key'))
+        profile.setdefault('base_url', llm_config.get('base_url'))
+        profile.setdefault('model', llm_config.get('model_name'))
+    elif not profile.get('api_key'):
+        raise ValueError(f"Step profile '{step}' uses provider '{profile['provider']}' but has no api_key "
+                         f"(only steps on the main provider '{main_provider}' inherit its key)")
+    profile.setdefault('api_key', None)
+    profile.setdefault('base_url', None)
+    profile.setdefault('model', DEFAULT_MODELS.get(profile['provider']))
+    profile.setdefault('reasoning', None)
+    return profile
+
+
+def get_step_llm(llm_config: Dict, step: str):
+    """LLM client for one pipeline step, honoring its model, max_tokens, temperature and reasoning toggle."""
+    profile = get_step_profile(llm_config, step)
+    provider = profile['provider']
+    model = profile['model']
+    reasoning = profile['reasoning']
+
+    if reasoning is False and model in NON_REASONING_MODELS:
+        model = NON_REASONING_MODELS[model]
+
+    llm = get_llm(provider, profile['api_key'], profile['base_url'], model,
+                  max_tokens=int(profile['max_tokens']), temperature=float(profile['temperature']))
+
+    if reasoning is not None and provider == 'qwen':
+        # DashScope hybrid-thinking models (qwen3 etc.)
+        llm = llm.bind(extra_body={'enable_thinking': bool(reasoning)})
+    return llm
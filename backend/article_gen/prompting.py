@@ -0,0 +1,54 @@
+import re
+from typing import Dict, List
+try:
+    from backend.llm.telemetry import extract_usage
+except ImportError:
+    from llm.telemetry import extract_usage
+from langchain_core.messages import SystemMessage, HumanMessage
+
+# Shared by every repository-context step so the provider can reuse its KV
+# prefix cache (DeepSeek/Qwen cache on exact byte prefixes). Step-specific
+# roles and instructions go into the suffix instead.
+REPO_SYSTEM_PROMPT = "You are an expert software architect and technical writer. You analyze codebases to write articles. Answer in Chinese. Your response must be logically rigorous, semantically smooth, and factually accurate. Maintain a professional perspective, do not exaggerate. Be realistic and rigorous. Avoid words like 'extremely high', 'huge', 'perfect', etc. unless strictly proven. Focus on technical facts."
+
+SUFFIX_SEPARATOR = "\n\n=== Task ===\n"
+
+
+def format_file_block(path: str, content: str) -> str:
+    return f"\n\n--- File: {path} ---\n{content}"
+
+
+_FILE_BLOCK_HEADER = re.compile(r'\n\n--- File: (.+?) ---\n')
+
+
+def split_file_blocks(context: str) -> Dict[str, str]:
+    """Packed context back into ``{path: file block}``, in packing order."""
+    parts = _FILE_BLOCK_HEADER.split(context)
+    return {parts[i]: format_file_block(parts[i], parts[i + 1]) for i in range(1, len(parts) - 1, 2)}
+
+
+def build_repo_prefix(repo_name: str, file_tree: str, context: str) -> str:
+    """
+    Stable part of the prompt: project, file tree and the packed file
+    contents. ``context`` only ever grows by appending file blocks, so every
+    later step starts with the exact text of the earlier ones.
+    """
+    return f"Project: {repo_name}\nFile Tree:\n{file_tree}\nRepository Context:{context}"
+
+
+def build_repo_messages(repo_name: str, file_tree: str, context: str, instructions: str) -> List:
+    """Messages for one pipeline step: shared prefix followed by the step-specific ``instructions``."""
+    return [
+        SystemMessage(content=REPO_SYSTEM_PROMPT),
+        HumanMessage(content=build_repo_prefix(repo_name, file_tree, context) + SUFFIX_SEPARATOR + instructions),
+    ]
+
+
+def describe_prompt_cache(response) -> str:
+    """One-line summary of the provider's prefix-cache hits for a response."""
+    usage: Dict[str, int] = extract_usage(response)
+    prompt = usage['prompt_tokens']
+    if not prompt:
+        return "prompt cache: no usage reported"
+    cached = usage['cached_tokens']
+    return f"prompt cache: {cached}/{prompt} tokens hit ({cached * 100 // prompt}%)"
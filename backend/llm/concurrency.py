@@ -0,0 +1,302 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    from backend.utils.tracing import record_span
+except ImportError:
+    from utils.tracing import record_span
+
+# 初始/最小/最大并发
+LLM_LIMIT_INITIAL = float(os.getenv('LLM_LIMIT_INITIAL', '4'))
+LLM_LIMIT_MIN = float(os.getenv('LLM_LIMIT_MIN', '1'))
+LLM_LIMIT_MAX = float(os.getenv('LLM_LIMIT_MAX', '32'))
+# 延迟超过基线的该倍数时视为过载，主动降低并发
+LLM_LATENCY_TOLERANCE = float(os.getenv('LLM_LATENCY_TOLERANCE', '3'))
+# 熔断：连续失败次数阈值与冷却时间（秒）
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', '5'))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))
+LLM_BREAKER_MAX_COOLDOWN = float(os.getenv('LLM_BREAKER_MAX_COOLDOWN', '300'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+# 等待并发槽位的最长时间（秒）
+LLM_ACQUIRE_TIMEOUT = float(os.getenv('LLM_ACQUIRE_TIMEOUT', '600'))
+# Waits for a slot shorter than this are not recorded as 'llm_queue' spans
+LLM_QUEUE_SPAN_MIN = 0.05
+
+OUTCOME_OK = 'ok'
+OUTCOME_RATE_LIMITED = 'rate_limited'
+OUTCOME_SERVER_ERROR = 'server_error'
+OUTCOME_TIMEOUT = 'timeout'
+OUTCOME_CLIENT_ERROR = 'client_error'
+
+RETRYABLE_OUTCOMES = {OUTCOME_RATE_LIMITED, OUTCOME_SERVER_ERROR, OUTCOME_TIMEOUT}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while its circuit breaker is open."""
+
+
+def classify_error(error: Exception) -> str:
+    """Map an SDK/HTTP exception to an outcome without importing the SDKs."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status == 429:
+        return OUTCOME_RATE_LIMITED
+    if isinstance(status, int) and status >= 500:
+        return OUTCOME_SERVER_ERROR
+    name = type(error).__name__
+    if 'Timeout' in name or isinstance(error, TimeoutError):
+        return OUTCOME_TIMEOUT
+    if 'Connection' in name or isinstance(error, ConnectionError):
+        return OUTCOME_SERVER_ERROR
+    return OUTCOME_CLIENT_ERROR
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds requested by a ``Retry-After``/``retry-after-ms`` header, if any,
+    capped at LLM_BREAKER_MAX_COOLDOWN so one response cannot park a worker
+    (and its executor slot) for an hour.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get('retry-after-ms')
+        if ms:
+            seconds = float(ms) / 1000
+        else:
+            value = headers.get('retry-after')
+            if not value:
+                return None
+            try:
+                seconds = float(value)
+            except ValueError:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+    except Exception:
+        return None
+    return min(max(0.0, seconds), LLM_BREAKER_MAX_COOLDOWN)
+
+
+class ProviderController:
+    """
+    Adaptive concurrency limit and circuit breaker for one (provider, model).
+
+    AIMD: each success adds ``1/limit`` (about +1 per window of requests),
+    a 429/5xx/timeout halves the limit, and latency far above the observed
+    baseline trims it by 10%. ``Retry-After`` pauses new requests until it
+    elapses.
+    After ``LLM_BREAKER_THRESHOLD`` consecutive failures the circuit opens
+    and callers fail fast; after the cooldown one probe request is let
+    through (half-open) and its result closes or re-opens the circuit.
+    """
+
+    def __init__(self, key: Tuple[str, str], initial: float = LLM_LIMIT_INITIAL, min_limit: float = LLM_LIMIT_MIN, max_limit: float = LLM_LIMIT_MAX):
+        self.key = key
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.cond = threading.Condition()
+
+        self.latency_baseline = None  # 成功请求延迟的慢速 EWMA
+        self.latency_ewma = None
+        self.paused_until = 0.0
+
+        self.circuit = 'closed'  # closed | open | half_open
+        self.opened_at = 0.0
+        self.cooldown = LLM_BREAKER_COOLDOWN
+        self.consecutive_failures = 0
+
+        self.stats = {'requests': 0, 'ok': 0, 'rate_limited': 0, 'server_error': 0, 'timeout': 0, 'client_error': 0, 'rejected': 0}
+
+    # ---- admission ----
+    def _check_circuit(self, now: float):
+        if self.circuit == 'open':
+            if now - self.opened_at < self.cooldown:
+                self.stats['rejected'] += 1
+                raise CircuitOpenError(f"LLM provider {self.key[0]}/{self.key[1]} circuit open, retry in {self.cooldown - (now - self.opened_at):.0f}s")
+            self.circuit = 'half_open'
+
+    def _can_start(self, now: float) -> bool:
+        if now < self.paused_until:
+            return False
+        if self.circuit == 'half_open':
+            # Only the probe request may run
+            return self.in_flight == 0
+        return self.in_flight < max(1, int(self.limit))
+
+    def try_acquire(self) -> bool:
+        with self.cond:
+            now = time.time()
+            self._check_circuit(now)
+            if self._can_start(now):
+                self.in_flight += 1
+                self.stats['requests'] += 1
+                return True
+            return False
+
+    def _record_wait(self, started: float):
+        if time.time() - started >= LLM_QUEUE_SPAN_MIN:
+            record_span('llm_queue', started, time.time(), provider=self.key[0], model=self.key[1])
+
+    def acquire(self, timeout: float = LLM_ACQUIRE_TIMEOUT):
+        started = time.time()
+        deadline = started + timeout
+        with self.cond:
+            while True:
+                now = time.time()
+                self._check_circuit(now)
+                if self._can_start(now):
+                    self.in_flight += 1
+                    self.stats['requests'] += 1
+                    self._record_wait(started)
+                    return
+                if now >= deadline:
+                    raise TimeoutError(f"Timed out waiting for an LLM slot for {self.key[0]}/{self.key[1]}")
+                wait = min(deadline - now, max(0.05, self.paused_until - now) if self.paused_until > now else 1.0)
+                self.cond.wait(timeout=wait)
+
+    async def aacquire(self, timeout: float = LLM_ACQUIRE_TIMEOUT):
+        started = time.time()
+        deadline = started + timeout
+        delay = 0.05
+        while not self.try_acquire():
+            if time.time() >= deadline:
+                raise TimeoutError(f"Timed out waiting for an LLM slot for {self.key[0]}/{self.key[1]}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
+        self._record_wait(started)
+
+    # ---- feedback ----
+    def release(self, latency: float, outcome: str, retry_after: Optional[float] = None):
+        with self.cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.stats[outcome] = self.stats.get(outcome, 0) + 1
+            now = time.time()
+
+            if outcome == OUTCOME_OK:
+                self.consecutive_failures = 0
+                if self.circuit == 'half_open':
+                    self.circuit = 'closed'
+                    self.cooldown = LLM_BREAKER_COOLDOWN
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+                self.latency_baseline = latency if self.latency_baseline is None else 0.95 * self.latency_baseline + 0.05 * min(latency, self.latency_baseline * 2)
+                if self.latency_ewma > self.latency_baseline * LLM_LATENCY_TOLERANCE:
+                    self.limit = max(self.min_limit, self.limit * 0.9)
+                else:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+            elif outcome in RETRYABLE_OUTCOMES:
+                self.consecutive_failures += 1
+                self.limit = max(self.min_limit, self.limit / 2)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, now + retry_after)
+                if self.circuit == 'half_open':
+                    self._open(now, escalate=True)
+                elif self.consecutive_failures >= LLM_BREAKER_THRESHOLD:
+                    self._open(now)
+            # Client errors (400/401/...) say nothing about provider health
+
+            self.cond.notify_all()
+
+    def _open(self, now: float, escalate: bool = False):
+        if escalate:
+            self.cooldown = min(LLM_BREAKER_MAX_COOLDOWN, self.cooldown * 2)
+        self.circuit = 'open'
+        self.opened_at = now
+
+    def snapshot(self) -> Dict:
+        with self.cond:
+            finished = sum(self.stats[k] for k in ('ok', 'rate_limited', 'server_error', 'timeout', 'client_error'))
+            errors = finished - self.stats['ok'] - self.stats['client_error']
+            return {
+                'provider': self.key[0],
+                'model': self.key[1],
+                'limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'circuit': self.circuit,
+                'paused_for': max(0.0, round(self.paused_until - time.time(), 1)),
+                'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                'latency_baseline': round(self.latency_baseline, 3) if self.latency_baseline is not None else None,
+                'error_rate': round(errors / finished, 4) if finished else 0.0,
+                'stats': dict(self.stats),
+            }
+
+
+_controllers: Dict[Tuple[str, str], ProviderController] = {}
+_controllers_lock = threading.Lock()
+
+
+def controller_key(llm) -> Tuple[str, str]:
+    """(provider host, model) for a ChatOpenAI or a ``.bind()``-ed wrapper of one."""
+    model = getattr(llm, 'bound', llm)
+    base_url = getattr(model, 'openai_api_base', None) or 'https://api.openai.com/v1'
+    host = urlparse(str(base_url)).netloc or str(base_url)
+    return host, str(getattr(model, 'model_name', None) or 'default')
+
+
+def get_controller(key: Tuple[str, str]) -> ProviderController:
+    with _controllers_lock:
+        controller = _controllers.get(key)
+        if controller is None:
+            controller = ProviderController(key)
+            _controllers[key] = controller
+        return controller
+
+
+def all_snapshots():
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    return [c.snapshot() for c in controllers]
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float]) -> float:
+    if retry_after:
+        return min(retry_after, LLM_BREAKER_MAX_COOLDOWN)
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+def call_with_limits(llm, fn: Callable, retries: int = LLM_MAX_RETRIES):
+    """Run ``fn()`` under the controller for ``llm``, retrying 429/5xx/timeouts."""
+    controller = get_controller(controller_key(llm))
+    for attempt in range(retries + 1):
+        controller.acquire()
+        start = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            outcome = classify_error(e)
+            retry_after = get_retry_after(e)
+            controller.release(time.monotonic() - start, outcome, retry_after)
+            if outcome not in RETRYABLE_OUTCOMES or attempt == retries:
+                raise
+            time.sleep(backoff_delay(attempt, retry_after))
+            continue
+        controller.release(time.monotonic() - start, OUTCOME_OK)
+        return result
+
+
+async def acall_with_limits(llm, fn: Callable, retries: int = LLM_MAX_RETRIES):
+    """Async counterpart of ``call_with_limits``; ``fn`` returns an awaitable."""
+    controller = get_controller(controller_key(llm))
+    for attempt in range(retries + 1):
+        await controller.aacquire()
+        start = time.monotonic()
+        try:
+            result = await fn()
+        except Exception as e:
+            outcome = classify_error(e)
+            retry_after = get_retry_after(e)
+            controller.release(time.monotonic() - start, outcome, retry_after)
+            if outcome not in RETRYABLE_OUTCOMES or attempt == retries:
+                raise
+            await asyncio.sleep(backoff_delay(attempt, retry_after))
+            continue
+        controller.release(time.monotonic() - start, OUTCOME_OK)
+        return result
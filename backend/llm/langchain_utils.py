@@ -1,38 +1,422 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+import httpx
 from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-# from langchain.chains.summarize import load_summarize_chain
-# from langchain_text_splitters import TokenTextSplitter
-# from langchain.docstore.document import Document
-from typing import Optional
+from langchain_core.runnables import RunnableBinding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import List, Optional
+
+try:
+    from backend.utils.disk_cache import DiskCache
+    from backend.llm.concurrency import (
+        LLM_MAX_RETRIES, OUTCOME_OK, RETRYABLE_OUTCOMES, CircuitOpenError, acall_with_limits, backoff_delay,
+        call_with_limits, classify_error, controller_key, get_controller, get_retry_after,
+    )
+    from backend.llm.telemetry import OUTCOME_CIRCUIT_OPEN, bind_context, record_llm_call
+    from backend.utils.tokenizer import count_tokens
+except ImportError:
+    from utils.disk_cache import DiskCache
+    from llm.concurrency import (
+        LLM_MAX_RETRIES, OUTCOME_OK, RETRYABLE_OUTCOMES, CircuitOpenError, acall_with_limits, backoff_delay,
+        call_with_limits, classify_error, controller_key, get_controller, get_retry_after,
+    )
+    from llm.telemetry import OUTCOME_CIRCUIT_OPEN, bind_context, record_llm_call
+    from utils.tokenizer import count_tokens
+
+DEFAULT_MODELS = {
+    'openai': "gpt-3.5-turbo",
+    'deepseek': "deepseek-chat",
+    'qwen': "qwen-plus",
+}
+
+DEFAULT_BASE_URLS = {
+    'deepseek': "https://api.deepseek.com",
+    'qwen': "https://dashscope.aliyuncs.com/compatible-mode/v1",
+    # OpenAI default is fine
+}
+
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '600'))
+# 空闲超过该秒数的客户端会被淘汰
+LLM_CLIENT_IDLE_TTL = int(os.getenv('LLM_CLIENT_IDLE_TTL', '1800'))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', '64'))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', '32'))
+
+# 响应缓存：相同模型、参数与消息直接复用上次结果
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+# 默认只缓存确定性调用（temperature 为 0，如摘要、文件筛选）；设为 1 时采样生成（草稿、精修）也走缓存
+LLM_CACHE_SAMPLED = os.getenv('LLM_CACHE_SAMPLED', '0') == '1'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+# 流式输出时两次数据块之间的最长等待（秒），超时视为服务商卡住
+LLM_STREAM_STALL_TIMEOUT = float(os.getenv('LLM_STREAM_STALL_TIMEOUT', '120'))
+# 输出因 max_tokens 被截断时最多追加的续写次数
+LLM_MAX_CONTINUATIONS = int(os.getenv('LLM_MAX_CONTINUATIONS', '3'))
+
+# Map-Reduce 摘要
+SUMMARY_MAP_CONCURRENCY = int(os.getenv('SUMMARY_MAP_CONCURRENCY', '8'))
+SUMMARY_MAX_REDUCE_LEVELS = 5
+SUMMARY_SYSTEM_PROMPT = "You are an expert software analyst. You must answer in Chinese. Your response must be logically rigorous, semantically smooth, and factually accurate. Focus on technical facts."
+SUMMARY_MAP_PROMPT = "请用中文概括以下文档片段的要点，保留项目功能、架构设计、关键接口与使用方式等技术细节，不要添加原文没有的信息：\n\n{text}"
+SUMMARY_REDUCE_PROMPT = "以下是同一份文档不同部分的摘要，请将其合并为一份连贯、不重复的中文摘要，保留关键技术细节：\n\n{text}"
+
+_response_cache = DiskCache('llm_responses', ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES)
+
+# 进程级客户端注册表：key -> [ChatOpenAI, last_used]
+_clients = {}
+_clients_lock = threading.Lock()
+_http_client = None
+_http_async_client = None
+_async_loop = None
+_async_loop_lock = threading.Lock()
+
+
+def _key_fingerprint(api_key) -> str:
+    """Short, non-reversible fingerprint so raw keys never sit in the registry key."""
+    if isinstance(api_key, bytes):
+        api_key = api_key.decode('utf-8')
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+
+
+def _get_http_clients():
+    """Shared keep-alive HTTP pools, reused by every ChatOpenAI instance."""
+    global _http_client, _http_async_client
+    if _http_client is None:
+        limits = httpx.Limits(max_connections=LLM_HTTP_MAX_CONNECTIONS, max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE)
+        _http_client = httpx.Client(limits=limits, timeout=LLM_TIMEOUT)
+        _http_async_client = httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT)
+    return _http_client, _http_async_client
+
+
+def run_async(coro):
+    """
+    Run ``coro`` on the process-wide LLM event loop and wait for the result.
+
+    The shared async HTTP pool is bound to the loop it was first used on, so
+    all async LLM work goes through one long-lived background loop instead of
+    a fresh ``asyncio.run`` per batch.
+    """
+    global _async_loop
+    with _async_loop_lock:
+        if _async_loop is None:
+            _async_loop = asyncio.new_event_loop()
+            threading.Thread(target=_async_loop.run_forever, name='llm-async-loop', daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _async_loop).result()
+
 
-def get_llm(provider: str, api_key: str, base_url: str = None, model_name: str = None, max_tokens: int = 4000):
+def _evict_idle_clients(now: float):
+    expired = [k for k, (_, last_used) in _clients.items() if now - last_used > LLM_CLIENT_IDLE_TTL]
+    for k in expired:
+        del _clients[k]
+
+
+def clear_llm_clients():
+    """Drop all cached clients (e.g. after the model config changes)."""
+    with _clients_lock:
+        _clients.clear()
+
+
+def get_llm(provider: str, api_key: str, base_url: str = None, model_name: str = None, max_tokens: int = 4000, temperature: float = 0.7):
     """
     Factory to create a LangChain Chat Model based on configuration.
+
+    Clients are cached per (provider, base_url, model, key fingerprint, params)
+    and share one keep-alive HTTP pool. Use ``llm.bind(max_tokens=...)`` for
+    per-call overrides instead of requesting a new client.
     """
     if not model_name:
-        if provider == 'openai': model_name = "gpt-3.5-turbo"
-        elif provider == 'deepseek': model_name = "deepseek-chat"
-        elif provider == 'qwen': model_name = "qwen-plus"
-        else: model_name = "gpt-3.5-turbo"
+        model_name = DEFAULT_MODELS.get(provider, "gpt-3.5-turbo")
 
     # Map provider to base_url if not provided
     if not base_url:
-        if provider == 'deepseek':
-            base_url = "https://api.deepseek.com"
-        elif provider == 'qwen':
-            base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
-        # OpenAI default is fine
-
-    return ChatOpenAI(
-        model=model_name,
-        api_key=api_key,
-        base_url=base_url,
-        temperature=0.7,
-        max_tokens=max_tokens,
-        timeout=600,
-        max_retries=3,
+        base_url = DEFAULT_BASE_URLS.get(provider)
+
+    key = (provider, base_url, model_name, _key_fingerprint(api_key), max_tokens, temperature)
+    now = time.monotonic()
+    with _clients_lock:
+        _evict_idle_clients(now)
+        entry = _clients.get(key)
+        if entry:
+            entry[1] = now
+            return entry[0]
+
+        http_client, http_async_client = _get_http_clients()
+        llm = ChatOpenAI(
+            model=model_name,
+            api_key=api_key,
+            base_url=base_url,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=LLM_TIMEOUT,
+            # Retries are owned by llm.concurrency so all callers share one backoff/limit
+            max_retries=0,
+            # Ask for the final usage chunk when streaming so telemetry sees token counts
+            stream_usage=True,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        )
+        _clients[key] = [llm, now]
+        return llm
+
+def _llm_cache_key(llm, messages) -> str:
+    """Hash of model, generation parameters and messages."""
+    bound_kwargs = {}
+    model = llm
+    if isinstance(llm, RunnableBinding):
+        bound_kwargs = dict(llm.kwargs)
+        model = llm.bound
+    params = {
+        'model': getattr(model, 'model_name', None),
+        'base_url': getattr(model, 'openai_api_base', None),
+        'temperature': getattr(model, 'temperature', None),
+        'max_tokens': getattr(model, 'max_tokens', None),
+    }
+    params.update(bound_kwargs)
+    return DiskCache.make_key(params, [(m.type, m.content) for m in messages])
+
+
+def _response_cache_key(llm, messages) -> Optional[str]:
+    """Cache key for this request, or None when it must not be served from the cache.
+
+    Sampled calls (temperature > 0) are skipped unless LLM_CACHE_SAMPLED is
+    set: asking again is expected to give a different answer.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    model = llm.bound if isinstance(llm, RunnableBinding) else llm
+    temperature = llm.kwargs.get('temperature') if isinstance(llm, RunnableBinding) else None
+    if temperature is None:
+        temperature = getattr(model, 'temperature', None)
+    if not LLM_CACHE_SAMPLED and temperature:
+        return None
+    return _llm_cache_key(llm, messages)
+
+
+def _cache_response(key, response):
+    _response_cache.set(key, {
+        'content': response.content,
+        'additional_kwargs': response.additional_kwargs,
+        'response_metadata': response.response_metadata,
+    })
+
+
+def forget_response(llm, messages):
+    """Drop the cached answer to this request (e.g. one that failed validation) so a rerun asks the model again."""
+    key = _response_cache_key(llm, messages)
+    if key:
+        _response_cache.delete(key)
+
+
+def _error_outcome(error: Exception) -> str:
+    return OUTCOME_CIRCUIT_OPEN if isinstance(error, CircuitOpenError) else classify_error(error)
+
+
+def _record_call(llm, outcome: str, start: Optional[float], response=None, **kwargs):
+    host, model = controller_key(llm)
+    latency = time.monotonic() - start if start is not None else 0.0
+    record_llm_call(host, model, outcome, latency, response=response, **kwargs)
+
+
+def invoke_llm(llm, messages, bypass_cache: bool = False):
+    """
+    Invoke ``llm`` with ``messages``, serving identical requests from the
+    response cache. ``bypass_cache`` forces a fresh call (the new answer
+    still replaces the cached one).
+    """
+    key = _response_cache_key(llm, messages)
+    if key and not bypass_cache:
+        cached = _response_cache.get(key)
+        if cached is not None:
+            _record_call(llm, OUTCOME_OK, None, response_cached=True)
+            return AIMessage(**cached)
+
+    start = time.monotonic()
+    try:
+        response = call_with_limits(llm, lambda: llm.invoke(messages))
+    except Exception as e:
+        _record_call(llm, _error_outcome(e), start)
+        raise
+    _record_call(llm, OUTCOME_OK, start, response)
+
+    if key and isinstance(response, AIMessage) and response.content:
+        _cache_response(key, response)
+    return response
+
+
+async def ainvoke_llm(llm, messages, bypass_cache: bool = False):
+    """Async variant of ``invoke_llm`` sharing the same response cache."""
+    key = _response_cache_key(llm, messages)
+    if key and not bypass_cache:
+        cached = _response_cache.get(key)
+        if cached is not None:
+            _record_call(llm, OUTCOME_OK, None, response_cached=True)
+            return AIMessage(**cached)
+
+    start = time.monotonic()
+    try:
+        response = await acall_with_limits(llm, lambda: llm.ainvoke(messages))
+    except Exception as e:
+        _record_call(llm, _error_outcome(e), start)
+        raise
+    _record_call(llm, OUTCOME_OK, start, response)
+
+    if key and isinstance(response, AIMessage) and response.content:
+        _cache_response(key, response)
+    return response
+
+
+def stream_llm(llm, messages, on_token=None, on_reasoning=None, bypass_cache: bool = False, stall_timeout: Optional[float] = LLM_STREAM_STALL_TIMEOUT):
+    """
+    Stream ``llm`` output, calling ``on_token``/``on_reasoning`` with each
+    content/reasoning delta, and return the aggregated ``AIMessage``.
+
+    ``stall_timeout`` is applied as the HTTP read timeout, so a provider that
+    stops sending chunks fails fast instead of holding the worker for
+    ``LLM_TIMEOUT``. Cache hits are replayed as a single delta.
+    """
+    key = _response_cache_key(llm, messages)
+    if key and not bypass_cache:
+        cached = _response_cache.get(key)
+        if cached is not None:
+            _record_call(llm, OUTCOME_OK, None, response_cached=True, streamed=True)
+            response = AIMessage(**cached)
+            reasoning = response.additional_kwargs.get('reasoning_content')
+            if reasoning and on_reasoning:
+                on_reasoning(reasoning)
+            if response.content and on_token:
+                on_token(response.content)
+            return response
+
+    runnable = llm.bind(timeout=stall_timeout) if stall_timeout else llm
+    controller = get_controller(controller_key(llm))
+    call_start = time.monotonic()
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            controller.acquire()
+        except Exception as e:
+            _record_call(llm, _error_outcome(e), call_start, streamed=True)
+            raise
+        start = time.monotonic()
+        first_chunk_at = None
+        emitted = False
+        aggregated = None
+        try:
+            for chunk in runnable.stream(messages):
+                if first_chunk_at is None:
+                    first_chunk_at = time.monotonic()
+                aggregated = chunk if aggregated is None else aggregated + chunk
+                reasoning = chunk.additional_kwargs.get('reasoning_content')
+                if reasoning and on_reasoning:
+                    emitted = True
+                    on_reasoning(reasoning)
+                if chunk.content and on_token:
+                    emitted = True
+                    on_token(chunk.content)
+        except Exception as e:
+            outcome = classify_error(e)
+            retry_after = get_retry_after(e)
+            controller.release(time.monotonic() - start, outcome, retry_after)
+            # Once output reached the consumer a retry would duplicate it
+            if emitted or outcome not in RETRYABLE_OUTCOMES or attempt == LLM_MAX_RETRIES:
+                _record_call(llm, outcome, call_start, aggregated, streamed=True)
+                raise
+            time.sleep(backoff_delay(attempt, retry_after))
+            continue
+        # Time to first token is the latency signal; full stream length depends on output size
+        controller.release((first_chunk_at or time.monotonic()) - start, OUTCOME_OK)
+        break
+
+    ttft = first_chunk_at - call_start if first_chunk_at is not None else None
+    _record_call(llm, OUTCOME_OK, call_start, aggregated, ttft=ttft, streamed=True)
+    if aggregated is None:
+        return AIMessage(content="")
+    response = AIMessage(
+        content=aggregated.content,
+        additional_kwargs=aggregated.additional_kwargs,
+        response_metadata=aggregated.response_metadata,
+        usage_metadata=aggregated.usage_metadata,
     )
+    if key and response.content:
+        _cache_response(key, response)
+    return response
+
+
+CONTINUE_PROMPT = "Your previous answer was cut off by the output limit. Continue exactly where it stopped: do not repeat any text, do not add a preamble or summary, keep the same language and formatting."
+# Longest repeated seam removed when a continuation restarts inside the previous text
+CONTINUATION_MAX_OVERLAP = 200
+CONTINUATION_MIN_OVERLAP = 8
+
+
+def is_truncated(response) -> bool:
+    """True if the provider stopped at the output token limit."""
+    meta = getattr(response, 'response_metadata', None) or {}
+    return (meta.get('finish_reason') or meta.get('stop_reason')) in ('length', 'max_tokens')
+
+
+def _join_continuation(text: str, continuation: str) -> str:
+    """Append ``continuation``, dropping a head that repeats the end of ``text``."""
+    for size in range(min(CONTINUATION_MAX_OVERLAP, len(text), len(continuation)), CONTINUATION_MIN_OVERLAP - 1, -1):
+        if text.endswith(continuation[:size]):
+            return text + continuation[size:]
+    return text + continuation
+
+
+def _add_usage(a: Optional[dict], b: Optional[dict]) -> Optional[dict]:
+    if not a or not b:
+        return a or b
+    total = dict(a)
+    for k, v in b.items():
+        if isinstance(v, dict):
+            total[k] = {dk: (total.get(k) or {}).get(dk, 0) + dv for dk, dv in v.items()}
+        elif isinstance(v, (int, float)):
+            total[k] = total.get(k, 0) + v
+    return total
+
+
+def stream_llm_complete(llm, messages, on_token=None, on_reasoning=None, bypass_cache: bool = False,
+                        max_continuations: int = LLM_MAX_CONTINUATIONS, log=None):
+    """
+    ``stream_llm`` that does not return a truncated answer.
+
+    While the provider reports ``finish_reason == "length"``, the answer so far
+    is sent back as an assistant turn after the unchanged ``messages`` (so the
+    prefix cache still applies) and the model is asked to continue, up to
+    ``max_continuations`` times. Continuations are streamed to ``on_token``
+    and appended; ``response_metadata['continuations']`` is their count,
+    ``usage_metadata`` covers all calls and ``additional_kwargs`` (reasoning)
+    come from the first one.
+    """
+    response = first = stream_llm(llm, messages, on_token, on_reasoning, bypass_cache)
+    content = response.content or ''
+    usage = response.usage_metadata
+    continuations = 0
+    while is_truncated(response) and continuations < max_continuations:
+        continuations += 1
+        if log:
+            log(f"Output hit the token limit after {len(content)} chars, continuing ({continuations}/{max_continuations})")
+        followup = list(messages) + [AIMessage(content=content), HumanMessage(content=CONTINUE_PROMPT)]
+        response = stream_llm(llm, followup, on_token, on_reasoning, bypass_cache)
+        content = _join_continuation(content, response.content or '')
+        usage = _add_usage(usage, response.usage_metadata)
+    if is_truncated(response) and log:
+        log(f"Output still truncated after {continuations} continuations")
+    if not continuations:
+        return response
+    return AIMessage(
+        content=content,
+        # Reasoning happens before the first answer
+        additional_kwargs=first.additional_kwargs,
+        response_metadata={**response.response_metadata, 'continuations': continuations},
+        usage_metadata=usage,
+    )
+
 
 def invoke_chain(llm, system_prompt: str, user_prompt_template: str, input_variables: dict) -> str:
     """
@@ -45,20 +429,69 @@ def invoke_chain(llm, system_prompt: str, user_prompt_template: str, input_varia
     
     chain = prompt | llm | StrOutputParser()
     
-    return chain.invoke(input_variables)
-
-# def summarize_large_content(llm, content: str, chunk_size: int = 15000, chunk_overlap: int = 500) -> str:
-#     """
-#     Summarize large content using Map-Reduce strategy with TokenTextSplitter.
-#     Suitable for large documents that exceed the context window.
-#     """
-#     text_splitter = TokenTextSplitter(
-#         chunk_size=chunk_size,
-#         chunk_overlap=chunk_overlap
-#     )
-#     docs = text_splitter.create_documents([content])
-#     
-#     # Use map_reduce chain
-#     # Note: This requires multiple LLM calls
-#     chain = load_summarize_chain(llm, chain_type="map_reduce")
-#     return chain.invoke(docs)["output_text"]
+    return call_with_limits(llm, lambda: chain.invoke(input_variables))
+
+def split_text_by_tokens(content: str, chunk_size: int = 15000, chunk_overlap: int = 500, model: Optional[str] = None) -> List[str]:
+    """Split ``content`` into chunks of at most ``chunk_size`` tokens, preferring headings and paragraphs as boundaries."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=lambda text: count_tokens(text, model),
+        separators=["\n## ", "\n### ", "\n\n", "\n", "。", ". ", " ", ""],
+    )
+    return splitter.split_text(content)
+
+
+def _summarize_text(llm, prompt: str, text: str, bypass_cache: bool) -> str:
+    response = invoke_llm(llm, [
+        SystemMessage(content=SUMMARY_SYSTEM_PROMPT),
+        HumanMessage(content=prompt.format(text=text)),
+    ], bypass_cache=bypass_cache)
+    return response.content
+
+
+def summarize_large_content(llm, content: str, chunk_size: int = 15000, chunk_overlap: int = 500, max_workers: Optional[int] = None, bypass_cache: bool = False) -> str:
+    """
+    Summarize large content using a Map-Reduce strategy.
+
+    The content is split by tokens at natural boundaries, chunks are
+    summarized concurrently (bounded by ``max_workers``), and the partial
+    summaries are reduced hierarchically until one summary fits in a single
+    ``chunk_size`` window. Every map/reduce call goes through the
+    content-addressed response cache, so unchanged chunks are never
+    summarized twice.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    model = controller_key(llm)[1]
+    chunks = split_text_by_tokens(content, chunk_size, chunk_overlap, model)
+    if not chunks:
+        return ""
+    workers = max(1, min(len(chunks), max_workers or SUMMARY_MAP_CONCURRENCY))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Map
+        summaries = list(executor.map(bind_context(lambda c: _summarize_text(llm, SUMMARY_MAP_PROMPT, c, bypass_cache)), chunks))
+
+        # Reduce: merge as many summaries as fit into one window, level by level
+        for _ in range(SUMMARY_MAX_REDUCE_LEVELS):
+            if len(summaries) == 1:
+                break
+            groups, current, current_tokens = [], [], 0
+            for summary in summaries:
+                tokens = count_tokens(summary, model)
+                if current and current_tokens + tokens > chunk_size:
+                    groups.append(current)
+                    current, current_tokens = [], 0
+                current.append(summary)
+                current_tokens += tokens
+            groups.append(current)
+            if len(groups) == len(summaries):
+                # Each summary alone fills a window; pair them up to guarantee progress
+                groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+            summaries = list(executor.map(
+                bind_context(lambda g: _summarize_text(llm, SUMMARY_REDUCE_PROMPT, "\n\n---\n\n".join(g), bypass_cache)),
+                groups,
+            ))
+
+    return "\n\n".join(summaries)
@@ -0,0 +1,238 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+try:
+    from backend.utils.db import session_scope, LlmCall
+except ImportError:
+    try:
+        from utils.db import session_scope, LlmCall
+    except ImportError:
+        session_scope = None
+        LlmCall = None
+
+LLM_TELEMETRY_ENABLED = os.getenv('LLM_TELEMETRY_ENABLED', '1') == '1'
+# 批量写库：攒够条数或间隔到期即写入，避免每次调用都占用一个数据库连接
+LLM_TELEMETRY_FLUSH_SIZE = int(os.getenv('LLM_TELEMETRY_FLUSH_SIZE', '50'))
+LLM_TELEMETRY_FLUSH_INTERVAL = float(os.getenv('LLM_TELEMETRY_FLUSH_INTERVAL', '2'))
+# 无数据库时在内存中保留的最近调用数
+LLM_TELEMETRY_MEMORY_SIZE = int(os.getenv('LLM_TELEMETRY_MEMORY_SIZE', '5000'))
+
+OUTCOME_CIRCUIT_OPEN = 'circuit_open'
+
+# Attribution for the calls made in the current thread / asyncio task
+_call_context: contextvars.ContextVar = contextvars.ContextVar('llm_call_context', default={})
+
+_queue: "queue.Queue[Dict]" = queue.Queue()
+_recent = deque(maxlen=LLM_TELEMETRY_MEMORY_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+@contextmanager
+def llm_call_context(**fields):
+    """
+    Attribute LLM calls made inside the block, e.g.
+    ``with llm_call_context(task_id=task_id, step='draft'):``.
+    Nested blocks inherit the outer fields and override the ones they set.
+    """
+    token = _call_context.set({**_call_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def current_context() -> Dict:
+    return dict(_call_context.get())
+
+
+def bind_context(fn):
+    """Wrap ``fn`` so it runs with the caller's attribution in a worker thread."""
+    parent = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        return parent.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+
+def _int(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def extract_usage(response) -> Dict[str, int]:
+    """
+    Token usage of an ``AIMessage`` (or aggregated stream chunk).
+
+    Prefers LangChain's normalized ``usage_metadata`` and falls back to the
+    raw provider payload, which also carries DeepSeek's
+    ``prompt_cache_hit_tokens`` and OpenAI/DashScope ``*_tokens_details``.
+    """
+    usage = {'prompt_tokens': 0, 'completion_tokens': 0, 'reasoning_tokens': 0, 'cached_tokens': 0}
+    if response is None:
+        return usage
+
+    meta = getattr(response, 'usage_metadata', None) or {}
+    if meta:
+        usage['prompt_tokens'] = _int(meta.get('input_tokens'))
+        usage['completion_tokens'] = _int(meta.get('output_tokens'))
+        usage['cached_tokens'] = _int((meta.get('input_token_details') or {}).get('cache_read'))
+        usage['reasoning_tokens'] = _int((meta.get('output_token_details') or {}).get('reasoning'))
+
+    raw = (getattr(response, 'response_metadata', None) or {}).get('token_usage') or {}
+    if raw:
+        usage['prompt_tokens'] = usage['prompt_tokens'] or _int(raw.get('prompt_tokens'))
+        usage['completion_tokens'] = usage['completion_tokens'] or _int(raw.get('completion_tokens'))
+        usage['cached_tokens'] = usage['cached_tokens'] or _int(
+            raw.get('prompt_cache_hit_tokens') or (raw.get('prompt_tokens_details') or {}).get('cached_tokens'))
+        usage['reasoning_tokens'] = usage['reasoning_tokens'] or _int((raw.get('completion_tokens_details') or {}).get('reasoning_tokens'))
+    return usage
+
+
+def record_llm_call(provider: str, model: str, outcome: str, latency: float, response=None, ttft: Optional[float] = None, response_cached: bool = False, streamed: bool = False):
+    """Queue one row for the ``llm_call`` table, attributed to the current context."""
+    if not LLM_TELEMETRY_ENABLED:
+        return
+    ctx = _call_context.get()
+    row = {
+        'task_id': ctx.get('task_id'),
+        'record_id': str(ctx['record_id'])[:255] if ctx.get('record_id') is not None else None,
+        'step': ctx.get('step'),
+        'provider': provider,
+        'model': model,
+        'outcome': outcome,
+        'latency_ms': int(latency * 1000),
+        'ttft_ms': int(ttft * 1000) if ttft is not None else None,
+        'response_cached': response_cached,
+        'streamed': streamed,
+        'created_at': datetime.now(),
+    }
+    row.update(extract_usage(None if response_cached else response))
+    _recent.append(row)
+    if session_scope and LlmCall:
+        _queue.put(row)
+        _ensure_writer()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name='llm-telemetry-writer', daemon=True)
+            _writer.start()
+
+
+def _writer_loop():
+    while True:
+        rows = [_queue.get()]
+        deadline = time.monotonic() + LLM_TELEMETRY_FLUSH_INTERVAL
+        while len(rows) < LLM_TELEMETRY_FLUSH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _write_rows(rows)
+
+
+def _write_rows(rows: List[Dict]):
+    try:
+        from sqlalchemy import insert
+        with session_scope() as s:
+            if s is None:
+                return
+            s.execute(insert(LlmCall), rows)
+    except Exception as e:
+        print(f"LLM telemetry write failed ({len(rows)} rows): {e}")
+
+
+def _empty_group(step, model) -> Dict:
+    return {
+        'step': step, 'model': model, 'calls': 0, 'errors': 0, 'response_cache_hits': 0,
+        'prompt_tokens': 0, 'completion_tokens': 0, 'reasoning_tokens': 0, 'cached_tokens': 0,
+        'avg_latency_ms': None, 'max_latency_ms': None, 'avg_ttft_ms': None,
+    }
+
+
+def _finish_group(group: Dict, latency_sum: float, ttft_sum: float, ttft_count: int) -> Dict:
+    if group['calls']:
+        group['avg_latency_ms'] = round(latency_sum / group['calls'])
+    if ttft_count:
+        group['avg_ttft_ms'] = round(ttft_sum / ttft_count)
+    group['prompt_cache_ratio'] = round(group['cached_tokens'] / group['prompt_tokens'], 4) if group['prompt_tokens'] else 0.0
+    return group
+
+
+def aggregate_rows(rows) -> List[Dict]:
+    """Per (step, model) totals for in-memory rows."""
+    groups = {}
+    for row in rows:
+        key = (row.get('step'), row.get('model'))
+        entry = groups.get(key)
+        if entry is None:
+            entry = groups[key] = [_empty_group(*key), 0.0, 0.0, 0]
+        group = entry[0]
+        group['calls'] += 1
+        group['errors'] += 0 if row.get('outcome') == 'ok' else 1
+        group['response_cache_hits'] += 1 if row.get('response_cached') else 0
+        for field in ('prompt_tokens', 'completion_tokens', 'reasoning_tokens', 'cached_tokens'):
+            group[field] += row.get(field) or 0
+        latency = row.get('latency_ms') or 0
+        group['max_latency_ms'] = max(group['max_latency_ms'] or 0, latency)
+        entry[1] += latency
+        if row.get('ttft_ms') is not None:
+            entry[2] += row['ttft_ms']
+            entry[3] += 1
+    return [_finish_group(*entry) for entry in groups.values()]
+
+
+def _aggregate_db(s, since: datetime, task_id: Optional[str]) -> List[Dict]:
+    from sqlalchemy import select, func, case
+    query = select(
+        LlmCall.step, LlmCall.model,
+        func.count(LlmCall.id),
+        func.sum(case((LlmCall.outcome == 'ok', 0), else_=1)),
+        func.sum(case((LlmCall.response_cached == True, 1), else_=0)),  # noqa: E712
+        func.sum(LlmCall.prompt_tokens), func.sum(LlmCall.completion_tokens),
+        func.sum(LlmCall.reasoning_tokens), func.sum(LlmCall.cached_tokens),
+        func.sum(LlmCall.latency_ms), func.max(LlmCall.latency_ms),
+        func.sum(LlmCall.ttft_ms), func.count(LlmCall.ttft_ms),
+    ).where(LlmCall.created_at >= since).group_by(LlmCall.step, LlmCall.model)
+    if task_id:
+        query = query.where(LlmCall.task_id == task_id)
+
+    result = []
+    for step, model, calls, errors, hits, prompt, completion, reasoning, cached, latency_sum, latency_max, ttft_sum, ttft_count in s.execute(query):
+        group = _empty_group(step, model)
+        group.update({
+            'calls': int(calls or 0), 'errors': int(errors or 0), 'response_cache_hits': int(hits or 0),
+            'prompt_tokens': int(prompt or 0), 'completion_tokens': int(completion or 0),
+            'reasoning_tokens': int(reasoning or 0), 'cached_tokens': int(cached or 0),
+            'max_latency_ms': int(latency_max) if latency_max is not None else None,
+        })
+        result.append(_finish_group(group, float(latency_sum or 0), float(ttft_sum or 0), int(ttft_count or 0)))
+    return result
+
+
+def llm_metrics(hours: float = 24, task_id: Optional[str] = None) -> List[Dict]:
+    """Aggregated LLM usage per (step, model) over the last ``hours``."""
+    since = datetime.now() - timedelta(hours=hours)
+    if session_scope and LlmCall:
+        with session_scope() as s:
+            if s is not None:
+                return _aggregate_db(s, since, task_id)
+    rows = [r for r in list(_recent) if r['created_at'] >= since and (not task_id or r.get('task_id') == task_id)]
+    return aggregate_rows(rows)
@@ -1,9 +1,23 @@
 import os
+import tempfile
 import pytest
 from flask import Flask
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.compiler import compiles
 
 # Ensure app import uses relative package
 os.environ.setdefault('FLASK_ENV', 'test')
+# Keep records, configs, caches and logs written by tests out of the real data dirs
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='test_data_'))
+os.environ.setdefault('LOGS_DIR', tempfile.mkdtemp(prefix='test_logs_'))
+
+
+# Registered once for the whole suite, before any test module creates tables
+@compiles(BigInteger, 'sqlite')
+def _sqlite_bigint(type_, compiler, **kw):
+    # SQLite only autoincrements INTEGER primary keys
+    return 'INTEGER'
+
 
 @pytest.fixture(scope='session')
 def app():
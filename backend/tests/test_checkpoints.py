@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import AIMessage
+
+from backend.utils.disk_cache import DiskCache
+from backend.article_gen import generator_v1
+from backend.article_gen.checkpoints import CHECKPOINT_CONTEXT, TaskCheckpoints
+
+
+class TestTaskCheckpoints(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = os.path.join(self.tmp.name, 'demo')
+        for rel in ['README.md', 'src/main.py']:
+            path = os.path.join(self.repo, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(f'content of {rel}')
+        store = DiskCache('test_checkpoints')
+        store.directory = os.path.join(self.tmp.name, 'cache')
+        self.checkpoints = TaskCheckpoints('task_1', store)
+        self.llm_config = {'provider': 'openai', 'api_key': 'k', 'model_name': 'gpt-4o-mini', 'word_limit': 3000}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _generate(self, select_files, stream_llm, prompt='写一篇文章'):
+        with patch('backend.article_gen.context.get_step_llm', return_value=MagicMock()), \
+                patch('backend.article_gen.generator_v1.get_step_llm', return_value=MagicMock()), \
+                patch('backend.article_gen.context.select_files', select_files), \
+                patch('backend.article_gen.generator_v1.stream_llm_complete', stream_llm):
+            return generator_v1.generate_article_content(self.repo, 'demo', prompt, self.llm_config, checkpoints=self.checkpoints)
+
+    def test_retry_after_refine_failure_costs_one_call(self):
+        select_files = MagicMock(side_effect=[['README.md', 'src/main.py'], []])
+        stream_llm = MagicMock(side_effect=[AIMessage(content='detailed'), TimeoutError('refine timed out')])
+        with self.assertRaises(TimeoutError):
+            self._generate(select_files, stream_llm)
+        self.assertEqual(select_files.call_count, 2)
+
+        select_files = MagicMock()
+        stream_llm = MagicMock(return_value=AIMessage(content='final'))
+        result = self._generate(select_files, stream_llm)
+
+        select_files.assert_not_called()
+        self.assertEqual(stream_llm.call_count, 1)
+        self.assertEqual(result['detailed_content'], 'detailed')
+        self.assertEqual(result['final_content'], 'final')
+        self.assertIn('content of src/main.py', self.checkpoints.latest(CHECKPOINT_CONTEXT)['context'])
+
+    def test_changed_inputs_rerun_the_step(self):
+        self._generate(MagicMock(side_effect=[['README.md'], []]), MagicMock(side_effect=[AIMessage(content='d1'), AIMessage(content='f1')]))
+
+        # Edited file: the selection is reused, the contents are repacked
+        with open(os.path.join(self.repo, 'README.md'), 'w') as f:
+            f.write('new readme text')
+        select_files = MagicMock()
+        stream_llm = MagicMock(side_effect=[AIMessage(content='d2'), AIMessage(content='f2')])
+        result = self._generate(select_files, stream_llm)
+        select_files.assert_not_called()
+        self.assertEqual(result['final_content'], 'f2')
+        self.assertIn('new readme text', self.checkpoints.latest(CHECKPOINT_CONTEXT)['context'])
+
+        # New goal: file selection runs again
+        select_files = MagicMock(side_effect=[['src/main.py'], []])
+        self._generate(select_files, MagicMock(side_effect=[AIMessage(content='d3'), AIMessage(content='f3')]), prompt='另一篇')
+        self.assertEqual(select_files.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from backend.llm import concurrency
+from backend.llm.concurrency import (
+    CircuitOpenError, ProviderController, call_with_limits, classify_error, get_retry_after,
+)
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = MagicMock(status_code=status_code, headers=headers or {})
+
+
+class TestProviderController(unittest.TestCase):
+
+    def test_additive_increase_and_multiplicative_decrease(self):
+        c = ProviderController(('api.deepseek.com', 'deepseek-chat'), initial=4)
+        for _ in range(8):
+            c.acquire()
+            c.release(1.0, concurrency.OUTCOME_OK)
+        self.assertGreater(c.limit, 5)
+        grown = c.limit
+        c.acquire()
+        c.release(1.0, concurrency.OUTCOME_RATE_LIMITED)
+        self.assertAlmostEqual(c.limit, grown / 2)
+
+    def test_retry_after_pauses_admission(self):
+        c = ProviderController(('h', 'm'), initial=4)
+        c.acquire()
+        c.release(0.5, concurrency.OUTCOME_RATE_LIMITED, retry_after=60)
+        self.assertFalse(c.try_acquire())
+
+    def test_circuit_opens_and_fails_fast(self):
+        c = ProviderController(('h', 'm'), initial=8)
+        for _ in range(concurrency.LLM_BREAKER_THRESHOLD):
+            c.acquire()
+            c.release(0.5, concurrency.OUTCOME_SERVER_ERROR)
+        self.assertEqual(c.snapshot()['circuit'], 'open')
+        with self.assertRaises(CircuitOpenError):
+            c.try_acquire()
+
+    def test_half_open_probe_closes_circuit(self):
+        c = ProviderController(('h', 'm'), initial=8)
+        c._open(0.0)  # opened long ago, cooldown elapsed
+        self.assertTrue(c.try_acquire())
+        self.assertEqual(c.circuit, 'half_open')
+        self.assertFalse(c.try_acquire())  # only one probe
+        c.release(0.5, concurrency.OUTCOME_OK)
+        self.assertEqual(c.circuit, 'closed')
+
+    def test_client_errors_do_not_trip_breaker(self):
+        c = ProviderController(('h', 'm'), initial=4)
+        for _ in range(10):
+            c.acquire()
+            c.release(0.5, concurrency.OUTCOME_CLIENT_ERROR)
+        self.assertEqual(c.circuit, 'closed')
+        self.assertEqual(c.limit, 4)
+
+
+class TestErrorHandling(unittest.TestCase):
+
+    def test_classify_error(self):
+        self.assertEqual(classify_error(FakeAPIError(429)), concurrency.OUTCOME_RATE_LIMITED)
+        self.assertEqual(classify_error(FakeAPIError(503)), concurrency.OUTCOME_SERVER_ERROR)
+        self.assertEqual(classify_error(FakeAPIError(401)), concurrency.OUTCOME_CLIENT_ERROR)
+        self.assertEqual(classify_error(TimeoutError()), concurrency.OUTCOME_TIMEOUT)
+
+    def test_get_retry_after(self):
+        self.assertEqual(get_retry_after(FakeAPIError(429, {'retry-after': '7'})), 7.0)
+        self.assertEqual(get_retry_after(FakeAPIError(429, {'retry-after-ms': '1500'})), 1.5)
+        self.assertIsNone(get_retry_after(ValueError()))
+
+    def test_retry_after_is_capped(self):
+        cap = concurrency.LLM_BREAKER_MAX_COOLDOWN
+        self.assertEqual(get_retry_after(FakeAPIError(429, {'retry-after': '3600'})), cap)
+        self.assertEqual(get_retry_after(FakeAPIError(429, {'retry-after': 'Fri, 31 Dec 2100 23:59:59 GMT'})), cap)
+        self.assertIsNone(get_retry_after(FakeAPIError(429, {'retry-after': 'soon'})))
+        self.assertEqual(concurrency.backoff_delay(0, 3600), cap)
+
+    @patch('backend.llm.concurrency.time.sleep')
+    def test_call_with_limits_retries_rate_limits(self, mock_sleep):
+        llm = MagicMock(model_name='retry-model', openai_api_base='https://retry.example.com/v1')
+        fn = MagicMock(side_effect=[FakeAPIError(429, {'retry-after': '0.1'}), 'ok'])
+        self.assertEqual(call_with_limits(llm, fn), 'ok')
+        self.assertEqual(fn.call_count, 2)
+        mock_sleep.assert_called_once_with(0.1)
+
+    def test_call_with_limits_does_not_retry_client_errors(self):
+        llm = MagicMock(model_name='client-model', openai_api_base='https://client.example.com/v1')
+        fn = MagicMock(side_effect=FakeAPIError(400))
+        with self.assertRaises(FakeAPIError):
+            call_with_limits(llm, fn)
+        self.assertEqual(fn.call_count, 1)
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from backend.utils import config_service as config_module
+from backend.utils.cache_version import bump_cache_version
+from backend.utils.config_service import ConfigService, ModelSettings, MODEL_CONFIG, PULL_CONFIG
+from backend.utils.db import init_engine, Base, session_scope, MakeConfig, PullConfig
+
+
+class TestConfigService(unittest.TestCase):
+
+    def setUp(self):
+        engine = init_engine(override_url='sqlite+pysqlite:///:memory:')
+        Base.metadata.create_all(engine)
+        self.config_dir = tempfile.mkdtemp()
+        patcher = patch.object(config_module, 'CONFIG_DIR', self.config_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.service = ConfigService(check_interval=0)
+
+    def write_json(self, name, data):
+        with open(os.path.join(self.config_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def test_latest_model_row_wins(self):
+        now = datetime.now()
+        with session_scope() as s:
+            s.add(MakeConfig(provider='qwen', model='old', external_api_key='k1', updated_at=now - timedelta(days=1)))
+            s.add(MakeConfig(provider='deepseek', model='deepseek-chat', external_api_key='k2', step_profiles={'select': {'max_tokens': 256}}, updated_at=now))
+        cfg = self.service.model_config()
+        self.assertIsInstance(cfg, ModelSettings)
+        self.assertEqual((cfg.provider, cfg.model, cfg.external_api_key), ('deepseek', 'deepseek-chat', 'k2'))
+        self.assertEqual(cfg.llm_config()['model_name'], 'deepseek-chat')
+        self.assertEqual(cfg.llm_config()['step_profiles'], {'select': {'max_tokens': 256}})
+
+    def test_model_row_without_key_falls_back_to_json(self):
+        with session_scope() as s:
+            s.add(MakeConfig(provider='qwen', model='qwen-plus', updated_at=datetime.now()))
+        self.write_json('model_config.json', {'provider': 'deepseek', 'model': 'deepseek-chat', 'external_api_key': 'json-key'})
+        self.assertEqual(self.service.model_config().external_api_key, 'json-key')
+
+    def test_pull_config_json_only(self):
+        self.write_json('pull_config.json', {'keywords_list': ['llm', 'rag'], 'perProjectDelay': 3})
+        data = self.service.pull_config().to_dict()
+        self.assertEqual(data['keywords'], 'llm, rag')
+        self.assertEqual(data['perProjectDelay'], 3)
+
+    def test_invalidate_after_commit(self):
+        with session_scope() as s:
+            s.add(PullConfig(keywords='a', updated_at=datetime.now() - timedelta(minutes=1)))
+        service = ConfigService(check_interval=3600)
+        self.assertEqual(service.pull_config().keywords, 'a')
+        with session_scope() as s:
+            s.add(PullConfig(keywords='b', updated_at=datetime.now()))
+            service.invalidate(PULL_CONFIG, s)
+            # Not committed yet: still the cached value
+            self.assertEqual(service.pull_config().keywords, 'a')
+        self.assertEqual(service.pull_config().keywords, 'b')
+
+    def test_version_bump_from_other_process(self):
+        with session_scope() as s:
+            s.add(MakeConfig(model='m1', external_api_key='k', updated_at=datetime.now() - timedelta(minutes=1)))
+        self.assertEqual(self.service.model_config().model, 'm1')
+        with session_scope() as s:
+            s.add(MakeConfig(model='m2', external_api_key='k', updated_at=datetime.now()))
+            bump_cache_version(s, MODEL_CONFIG)
+        self.assertEqual(self.service.model_config().model, 'm2')
+
+    def test_unchanged_stamps_skip_reload(self):
+        with session_scope() as s:
+            s.add(MakeConfig(model='m1', external_api_key='k', updated_at=datetime.now()))
+        self.service.model_config()
+        with patch.object(self.service, '_resolve', side_effect=AssertionError('reloaded')):
+            self.assertEqual(self.service.model_config().model, 'm1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import time
+
+from backend.utils.disk_cache import DiskCache
+
+
+def _make_cache(tmp_path, **kwargs):
+    cache = DiskCache('test', **kwargs)
+    cache.directory = str(tmp_path)
+    return cache
+
+
+def test_set_and_get_roundtrip(tmp_path):
+    cache = _make_cache(tmp_path)
+    key = DiskCache.make_key('model', [('human', 'hello')])
+    assert cache.get(key) is None
+    cache.set(key, {'content': '你好'})
+    assert cache.get(key) == {'content': '你好'}
+
+
+def test_make_key_is_stable_and_content_sensitive():
+    assert DiskCache.make_key({'a': 1, 'b': 2}) == DiskCache.make_key({'b': 2, 'a': 1})
+    assert DiskCache.make_key('x') != DiskCache.make_key('y')
+
+
+def test_expired_entry_is_dropped(tmp_path):
+    cache = _make_cache(tmp_path, ttl=1)
+    key = DiskCache.make_key('k')
+    cache.set(key, 'v', ttl=-1)
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = _make_cache(tmp_path, max_bytes=1)
+    old_key, new_key = DiskCache.make_key('old'), DiskCache.make_key('new')
+    cache.set(old_key, 'a' * 100)
+    cache.set(new_key, 'b' * 100)
+    past = time.time() - 100
+    os.utime(cache._path(old_key), (past, past))
+    cache.max_bytes = int(os.path.getsize(cache._path(new_key)) / 0.9) + 10
+    cache.evict()
+    assert cache.get(old_key) is None
+    assert cache.get(new_key) == 'b' * 100
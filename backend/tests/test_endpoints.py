@@ -73,3 +73,26 @@ def test_pull_test_and_records(client):
     if len(data):
         assert 'octocat/Hello-World' in data[0]['name']
 
+
+
+def test_revise_rejected_while_task_is_queued_or_running(client):
+    from unittest.mock import patch
+    from backend import api_server as api
+    from backend.utils.db import session_scope, MakeTask
+    with session_scope() as s:
+        s.add(MakeTask(id=9001, task_id='task_revise_busy', input_ref='1', status='generated', feedback=None))
+    with patch.object(api.article_executor, 'position', return_value=0), \
+            patch.object(api, '_enqueue_article_task') as enqueue:
+        r = client.post('/api/article/audit', json={'id': 9001, 'action': 'revise', 'opinion': '补充部署说明'})
+    assert r.status_code == 409
+    enqueue.assert_not_called()
+    with session_scope() as s:
+        task = s.get(MakeTask, 9001)
+        assert (task.status, task.feedback) == ('generated', None)
+
+    # Lost the race to another submit: the row is restored
+    with patch.object(api, '_enqueue_article_task', return_value=False):
+        r = client.post('/api/article/audit', json={'id': 9001, 'action': 'revise', 'opinion': '补充部署说明'})
+    assert r.status_code == 409
+    with session_scope() as s:
+        assert s.get(MakeTask, 9001).status == 'generated'
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from backend.article_gen.file_selection import RepoIndex, parse_file_list, select_files
+
+
+class TestFileSelection(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = os.path.join(self.tmp.name, 'demo')
+        for rel in ['README.md', 'src/main.py', 'src/util.py', 'docs/util.py', 'node_modules/x/index.js']:
+            path = os.path.join(self.repo, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('x')
+        self.index = RepoIndex(self.repo)
+        self.llm = MagicMock()
+        self.llm.bind.return_value = self.llm
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_index_resolves_model_paths(self):
+        self.assertNotIn('node_modules/x/index.js', self.index.paths)
+        self.assertEqual(self.index.resolve('./src/main.py'), 'src/main.py')
+        self.assertEqual(self.index.resolve('demo/src/main.py'), 'src/main.py')
+        self.assertEqual(self.index.resolve('main.py'), 'src/main.py')
+        # Ambiguous file name
+        self.assertIsNone(self.index.resolve('util.py'))
+        self.assertIsNone(self.index.resolve('missing.py'))
+
+    def test_parse_file_list(self):
+        self.assertEqual(parse_file_list('{"files": ["a.py"]}'), (['a.py'], None))
+        self.assertEqual(parse_file_list('Sure: ```json\n{"files": []}\n```'), ([], None))
+        self.assertIsNone(parse_file_list('["a.py"')[0])
+        self.assertIsNone(parse_file_list('{"paths": ["a.py"]}')[0])
+
+    @patch('backend.article_gen.file_selection.forget_response')
+    @patch('backend.article_gen.file_selection.invoke_llm')
+    def test_valid_answer_uses_json_mode_without_retry(self, mock_invoke, mock_forget):
+        mock_invoke.return_value = AIMessage(content='{"files": ["README.md", "src/main.py", "nope.py"]}')
+        files = select_files(self.llm, [HumanMessage(content='pick')], self.index, require_files=True)
+        self.assertEqual(files, ['README.md', 'src/main.py'])
+        self.llm.bind.assert_called_once_with(response_format={'type': 'json_object'})
+        self.assertEqual(mock_invoke.call_count, 1)
+        mock_forget.assert_not_called()
+
+    @patch('backend.article_gen.file_selection.forget_response')
+    @patch('backend.article_gen.file_selection.invoke_llm')
+    def test_invalid_answer_gets_one_corrective_retry(self, mock_invoke, mock_forget):
+        mock_invoke.side_effect = [
+            AIMessage(content='I would read main.rs'),
+            AIMessage(content='{"files": ["src/util.py"]}'),
+        ]
+        files = select_files(self.llm, [HumanMessage(content='pick')], self.index, require_files=True)
+        self.assertEqual(files, ['src/util.py'])
+        retry_messages = mock_invoke.call_args_list[1][0][1]
+        self.assertEqual(retry_messages[1].content, 'I would read main.rs')
+        # Only the rejected first answer is evicted from the response cache
+        mock_forget.assert_called_once_with(self.llm, mock_invoke.call_args_list[0][0][1])
+        self.assertIn('not valid JSON', retry_messages[2].content)
+
+    @patch('backend.article_gen.file_selection.forget_response')
+    @patch('backend.article_gen.file_selection.invoke_llm')
+    def test_gives_up_after_one_retry(self, mock_invoke, mock_forget):
+        mock_invoke.return_value = AIMessage(content='{"files": ["ghost.py"]}')
+        self.assertEqual(select_files(self.llm, [HumanMessage(content='pick')], self.index), [])
+        self.assertEqual(mock_invoke.call_count, 2)
+        self.assertEqual(mock_forget.call_count, 2)
+
+    @patch('backend.article_gen.file_selection.invoke_llm')
+    def test_empty_list_is_a_valid_stop_signal(self, mock_invoke):
+        mock_invoke.return_value = AIMessage(content='{"files": []}')
+        self.assertEqual(select_files(self.llm, [HumanMessage(content='more?')], self.index), [])
+        self.assertEqual(mock_invoke.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
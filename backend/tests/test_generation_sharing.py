@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from backend import api_server as api
+from backend.utils.task_progress import TaskProgressWriter
+
+
+class TestGenerationFollowers(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.hub = MagicMock()
+        self.log_path = os.path.join(tmp.name, 'make_joiner.log')
+        self.progress = TaskProgressWriter('joiner', self.log_path, stream_hub=self.hub, flush_interval=0)
+
+    def test_owner_output_reaches_followers_until_they_leave(self):
+        with patch.object(api, 'task_streams', self.hub):
+            api._follow_generation('gen-key', 'joiner', self.progress)
+            api._forward_generation('gen-key', 'log', 'Selecting files')
+            api._forward_generation('gen-key', 'token', {'text': 'Hello'})
+            api._unfollow_generation('gen-key', 'joiner')
+            api._forward_generation('gen-key', 'log', 'after leaving')
+        self.progress.flush()
+
+        self.assertEqual(self.hub.publish.call_args_list[0].args, ('joiner', 'log', 'Selecting files'))
+        self.assertEqual(self.hub.publish.call_args_list[1].args, ('joiner', 'token', {'text': 'Hello'}))
+        self.assertEqual(self.hub.publish.call_count, 2)
+        with open(self.log_path, encoding='utf-8') as f:
+            log = f.read()
+        self.assertIn('Selecting files', log)
+        self.assertNotIn('after leaving', log)
+        self.assertNotIn('gen-key', api._generation_followers)
+
+
+if __name__ == '__main__':
+    unittest.main()
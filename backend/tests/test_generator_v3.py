@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langchain_core.messages import AIMessage
+
+from backend.utils.disk_cache import DiskCache
+from backend.article_gen import generator_v3
+from backend.article_gen.checkpoints import TaskCheckpoints
+from backend.article_gen.context import RepoContext
+from backend.article_gen.prompting import format_file_block
+
+OUTLINE = {'title': '项目解析', 'sections': [
+    {'title': '架构', 'points': ['模块划分'], 'files': ['src/main.py']},
+    {'title': '数据流', 'points': [], 'files': ['./README.md', 'missing.py']},
+    {'title': '部署', 'points': ['配置'], 'files': []},
+]}
+
+
+class TestGeneratorV3(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        store = DiskCache('test_checkpoints')
+        store.directory = self.tmp.name
+        self.checkpoints = TaskCheckpoints('task_v3', store)
+        self.repo_context = RepoContext(
+            file_tree='demo/\n    README.md\n',
+            context=format_file_block('README.md', 'readme text') + format_file_block('src/main.py', 'main code'),
+            context_tokens=10,
+            read_files={'README.md', 'src/main.py'},
+        )
+        self.llm_config = {'provider': 'openai', 'api_key': 'k', 'model_name': 'm', 'word_limit': 3000}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_parse_outline(self):
+        outline, problem = generator_v3.parse_outline(json.dumps(OUTLINE), {'README.md', 'src/main.py'})
+        self.assertIsNone(problem)
+        self.assertEqual([s['files'] for s in outline['sections']], [['src/main.py'], ['README.md'], []])
+        self.assertIsNone(generator_v3.parse_outline('{"sections": [{"title": "a"}]}', set())[0])
+        self.assertIsNone(generator_v3.parse_outline('not json', set())[0])
+
+    def test_normalize_section(self):
+        text = "## 架构\n正文\n# 小节\n```\n# comment\n```"
+        self.assertEqual(generator_v3.normalize_section('架构', text), "正文\n### 小节\n```\n# comment\n```")
+
+    def test_rejected_outline_is_evicted_from_the_response_cache(self):
+        invoke_llm = MagicMock(side_effect=[AIMessage(content='not json'), AIMessage(content=json.dumps(OUTLINE))])
+        llm = MagicMock()
+        with patch.object(generator_v3, 'invoke_llm', invoke_llm), \
+                patch.object(generator_v3, 'forget_response') as forget:
+            outline = generator_v3._generate_outline(llm, 'demo', '写一篇文章', 'tree', 'ctx', {'README.md', 'src/main.py'},
+                                                     3000, False, lambda msg: None)
+        self.assertEqual(len(outline['sections']), 3)
+        forget.assert_called_once_with(llm.bind.return_value, invoke_llm.call_args_list[0][0][1])
+
+    def _generate(self, invoke_llm, stream_llm):
+        with patch.object(generator_v3, 'get_step_llm', return_value=MagicMock()), \
+                patch.object(generator_v3, 'invoke_llm', invoke_llm), \
+                patch.object(generator_v3, 'stream_llm_complete', stream_llm):
+            return generator_v3.generate_article_content('/nonexistent', 'demo', '写一篇文章', self.llm_config,
+                                                         repo_context=self.repo_context, checkpoints=self.checkpoints)
+
+    def test_sections_use_their_files_and_resume_after_failure(self):
+        invoke_llm = MagicMock(side_effect=[
+            AIMessage(content=json.dumps(OUTLINE)),
+            AIMessage(content=json.dumps({'intro': '开篇', 'conclusion': '结语'})),
+        ])
+        prompts = []
+        lock = threading.Lock()
+
+        def flaky_stream(llm, messages, **kwargs):
+            body = messages[-1].content
+            with lock:
+                prompts.append(body)
+            if 'Write only section 3' in body:
+                raise TimeoutError('section timed out')
+            return AIMessage(content='段落内容')
+
+        with self.assertRaises(TimeoutError):
+            self._generate(invoke_llm, MagicMock(side_effect=flaky_stream))
+        section_1 = next(p for p in prompts if 'Write only section 1' in p)
+        self.assertIn('main code', section_1)
+        self.assertNotIn('readme text', section_1)
+        # Section without files gets the whole context
+        section_3 = next(p for p in prompts if 'Write only section 3' in p)
+        self.assertIn('readme text', section_3)
+
+        # Retry: outline and finished sections come from the checkpoint
+        invoke_llm = MagicMock(return_value=AIMessage(content=json.dumps({'intro': '开篇', 'conclusion': '结语'})))
+        stream_llm = MagicMock(return_value=AIMessage(content='部署内容'))
+        result = self._generate(invoke_llm, stream_llm)
+
+        self.assertEqual(stream_llm.call_count, 1)
+        self.assertEqual(invoke_llm.call_count, 1)
+        content = result['final_content']
+        self.assertTrue(content.startswith('# 项目解析\n\n开篇'))
+        self.assertLess(content.index('## 架构'), content.index('## 数据流'))
+        self.assertIn('## 部署\n\n部署内容', content)
+        self.assertIn('## 总结\n\n结语', content)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,8 @@
 import unittest
 from unittest.mock import MagicMock, patch
-from backend.llm.langchain_utils import get_llm, invoke_chain
+from backend.llm import langchain_utils
+from backend.llm.langchain_utils import get_llm, invoke_chain, summarize_large_content, split_text_by_tokens, stream_llm_complete, forget_response
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_openai import ChatOpenAI
 
 class TestLangChainUtils(unittest.TestCase):
@@ -21,3 +23,91 @@ class TestLangChainUtils(unittest.TestCase):
         llm = get_llm(provider='custom', api_key='test_key', base_url='http://custom.url', model_name='custom-model')
         self.assertEqual(llm.openai_api_base, 'http://custom.url')
         self.assertEqual(llm.model_name, 'custom-model')
+
+    def test_get_llm_reuses_cached_client(self):
+        llm1 = get_llm(provider='deepseek', api_key='test_key', max_tokens=2000)
+        llm2 = get_llm(provider='deepseek', api_key='test_key', max_tokens=2000)
+        self.assertIs(llm1, llm2)
+
+    def test_get_llm_distinct_clients_share_http_pool(self):
+        llm1 = get_llm(provider='deepseek', api_key='key_a')
+        llm2 = get_llm(provider='deepseek', api_key='key_b')
+        self.assertIsNot(llm1, llm2)
+        self.assertIs(llm1.http_client, llm2.http_client)
+
+    def test_split_text_by_tokens_respects_chunk_size(self):
+        content = "\n\n".join(f"Paragraph {i}: " + "word " * 40 for i in range(20))
+        chunks = split_text_by_tokens(content, chunk_size=100, chunk_overlap=0)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(c.startswith("Paragraph") for c in chunks))
+
+    @patch('backend.llm.langchain_utils.invoke_llm')
+    def test_summarize_large_content_map_reduce(self, mock_invoke):
+        mock_invoke.return_value = MagicMock(content="摘要")
+        content = "\n\n".join(f"Paragraph {i}: " + "word " * 40 for i in range(20))
+
+        result = summarize_large_content(MagicMock(), content, chunk_size=100, chunk_overlap=0, max_workers=4)
+
+        self.assertEqual(result, "摘要")
+        # several map calls plus at least one reduce call
+        self.assertGreater(mock_invoke.call_count, len(split_text_by_tokens(content, 100, 0)))
+
+    @patch('backend.llm.langchain_utils.call_with_limits')
+    def test_invoke_chain_goes_through_provider_limits(self, mock_limits):
+        mock_limits.return_value = '回答'
+        llm = MagicMock()
+        self.assertEqual(invoke_chain(llm, 'system', '{q}', {'q': 'hi'}), '回答')
+        self.assertIs(mock_limits.call_args[0][0], llm)
+
+    def test_forget_response_evicts_the_cached_answer(self):
+        llm = MagicMock(model_name='m', openai_api_base=None, temperature=0, max_tokens=10)
+        messages = [HumanMessage(content='pick files')]
+        cache = MagicMock()
+        with patch.object(langchain_utils, '_response_cache', cache), patch.object(langchain_utils, 'LLM_CACHE_ENABLED', True):
+            forget_response(llm, messages)
+        cache.delete.assert_called_once_with(langchain_utils._llm_cache_key(llm, messages))
+
+    @patch('backend.llm.langchain_utils.call_with_limits', side_effect=lambda llm, fn: fn())
+    def test_sampled_calls_skip_the_response_cache(self, _):
+        messages = [HumanMessage(content='write the article')]
+        cache = MagicMock()
+        cache.get.return_value = {'content': 'cached', 'additional_kwargs': {}, 'response_metadata': {}}
+        sampled = MagicMock(model_name='m', openai_api_base=None, temperature=0.7, max_tokens=10)
+        sampled.invoke.return_value = AIMessage(content='fresh')
+        deterministic = MagicMock(model_name='m', openai_api_base=None, temperature=0, max_tokens=10)
+        with patch.object(langchain_utils, '_response_cache', cache), patch.object(langchain_utils, 'LLM_CACHE_ENABLED', True):
+            self.assertEqual(langchain_utils.invoke_llm(sampled, messages).content, 'fresh')
+            cache.get.assert_not_called()
+            cache.set.assert_not_called()
+            self.assertEqual(langchain_utils.invoke_llm(deterministic, messages).content, 'cached')
+            with patch.object(langchain_utils, 'LLM_CACHE_SAMPLED', True):
+                self.assertEqual(langchain_utils.invoke_llm(sampled, messages).content, 'cached')
+
+    @patch('backend.llm.langchain_utils.stream_llm')
+    def test_stream_llm_complete_continues_truncated_output(self, mock_stream):
+        mock_stream.side_effect = [
+            AIMessage(content='第一部分，这个句子写到一半的时候', additional_kwargs={'reasoning_content': '思考'},
+                      response_metadata={'finish_reason': 'length'},
+                      usage_metadata={'input_tokens': 100, 'output_tokens': 50, 'total_tokens': 150}),
+            # Restarts inside the previous text: the repeated seam is dropped
+            AIMessage(content='这个句子写到一半的时候就停了。结束。', response_metadata={'finish_reason': 'stop'},
+                      usage_metadata={'input_tokens': 160, 'output_tokens': 10, 'total_tokens': 170}),
+        ]
+        messages = [HumanMessage(content='写文章')]
+
+        response = stream_llm_complete(MagicMock(), messages)
+
+        self.assertEqual(response.content, '第一部分，这个句子写到一半的时候就停了。结束。')
+        self.assertEqual(response.response_metadata['continuations'], 1)
+        self.assertEqual(response.usage_metadata['output_tokens'], 60)
+        self.assertEqual(response.additional_kwargs['reasoning_content'], '思考')
+        followup = mock_stream.call_args_list[1][0][1]
+        self.assertEqual(followup[0], messages[0])
+        self.assertEqual(followup[1].content, '第一部分，这个句子写到一半的时候')
+
+    @patch('backend.llm.langchain_utils.stream_llm')
+    def test_stream_llm_complete_caps_continuations(self, mock_stream):
+        mock_stream.return_value = AIMessage(content='片段内容', response_metadata={'finish_reason': 'length'})
+        response = stream_llm_complete(MagicMock(), [HumanMessage(content='x')], max_continuations=2)
+        self.assertEqual(mock_stream.call_count, 3)
+        self.assertEqual(response.response_metadata['continuations'], 2)
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from backend.utils.log_tail import iter_log_chunks, read_log_from
+
+
+class TestLogTail(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'make_t1.log')
+
+    def append(self, text):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_reads_only_new_complete_lines(self):
+        self.append('第一行\nsecond')
+        text, offset, reset = read_log_from(self.path, 0)
+        self.assertEqual((text, reset), ('第一行\n', False))
+        self.assertEqual(offset, len('第一行\n'.encode('utf-8')))
+        # The partial line is returned once it is complete
+        self.assertEqual(read_log_from(self.path, offset)[0], '')
+        self.append(' line\n')
+        self.assertEqual(read_log_from(self.path, offset)[0], 'second line\n')
+
+    def test_max_bytes_pages_through_log(self):
+        self.append(''.join(f'line {i}\n' for i in range(100)))
+        offset, pages = 0, []
+        while True:
+            text, offset, _ = read_log_from(self.path, offset, max_bytes=64)
+            if not text:
+                break
+            pages.append(text)
+        self.assertGreater(len(pages), 1)
+        self.assertEqual(''.join(pages).count('\n'), 100)
+
+    def test_recreated_file_resets(self):
+        self.append('a long first run\n')
+        _, offset, _ = read_log_from(self.path)
+        os.remove(self.path)
+        self.append('new\n')
+        self.assertEqual(read_log_from(self.path, offset), ('new\n', 4, True))
+
+    def test_iter_stops_when_finished(self):
+        self.append('one\n')
+        done = {'value': False}
+
+        def finished():
+            self.append('two\n')
+            done['value'] = True
+            return True
+
+        chunks = list(iter_log_chunks(self.path, 0, finished, poll_interval=0))
+        self.assertEqual([c[0] for c in chunks], ['one\n', 'two\n'])
+        self.assertTrue(done['value'])
+
+
+if __name__ == '__main__':
+    unittest.main()
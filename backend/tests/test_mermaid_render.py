@@ -0,0 +1,81 @@
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from backend.utils import mermaid_render
+from backend.utils.disk_cache import DiskCache
+from backend.utils.mermaid_render import MermaidSyntaxError, render_diagrams
+
+
+class FakeRenderer:
+    name = 'fake'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def render(self, code, theme):
+        with self.lock:
+            self.calls.append(code)
+        time.sleep(self.delay)
+        if 'broken' in code:
+            raise MermaidSyntaxError('Parse error on line 1')
+        if 'offline' in code:
+            raise ConnectionError('mermaid.ink unreachable')
+        return 'image/png', f'{theme}:{code}'.encode('utf-8')
+
+
+class TestMermaidRender(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = DiskCache('test_mermaid')
+        cache.directory = tmp.name
+        patcher = patch.object(mermaid_render, '_cache', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_diagrams_render_concurrently_and_rerenders_are_cached(self):
+        renderer = FakeRenderer(delay=0.2)
+        codes = [f'graph TD; A{i}-->B' for i in range(6)]
+        started = time.monotonic()
+        results = render_diagrams(codes + codes[:2], renderer=renderer)
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(sorted(renderer.calls), sorted(codes))
+        self.assertTrue(results[codes[0]]['data_uri'].startswith('data:image/png;base64,'))
+
+        renderer.calls.clear()
+        self.assertEqual(render_diagrams(codes, renderer=renderer), results)
+        self.assertEqual(renderer.calls, [])
+
+    def test_theme_is_part_of_the_key(self):
+        renderer = FakeRenderer()
+        render_diagrams(['graph TD; A-->B'], theme='default', renderer=renderer)
+        render_diagrams(['graph TD; A-->B'], theme='dark', renderer=renderer)
+        self.assertEqual(len(renderer.calls), 2)
+
+    def test_syntax_errors_are_cached_but_outages_are_not(self):
+        renderer = FakeRenderer()
+        for _ in range(2):
+            results = render_diagrams(['broken -->', 'offline'], renderer=renderer)
+        self.assertEqual(results['broken -->'], {'error': 'Parse error on line 1'})
+        self.assertIn('unreachable', results['offline']['error'])
+        self.assertEqual(renderer.calls.count('broken -->'), 1)
+        self.assertEqual(renderer.calls.count('offline'), 2)
+
+    def test_registered_renderer_is_selectable(self):
+        mermaid_render.register_renderer('fake', FakeRenderer)
+        self.addCleanup(mermaid_render._renderers.pop, 'fake')
+        with patch.object(mermaid_render, 'MERMAID_RENDERER', 'fake'):
+            results = render_diagrams(['graph LR; X-->Y'])
+        self.assertIn('data_uri', results['graph LR; X-->Y'])
+        with self.assertRaises(ValueError):
+            mermaid_render.get_renderer('missing')
+
+
+if __name__ == '__main__':
+    unittest.main()
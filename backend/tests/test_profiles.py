@@ -0,0 +1,34 @@
+import unittest
+
+from backend.article_gen.profiles import STEP_DRAFT, STEP_SELECT, get_step_profile
+
+MAIN = {'provider': 'deepseek', 'api_key': 'sk-main', 'base_url': 'https://api.deepseek.com', 'model_name': 'deepseek-chat'}
+
+
+class TestStepProfiles(unittest.TestCase):
+
+    def test_same_provider_inherits_main_connection(self):
+        config = dict(MAIN, step_profiles={STEP_SELECT: {'max_tokens': 256}})
+        profile = get_step_profile(config, STEP_SELECT)
+        self.assertEqual((profile['provider'], profile['api_key'], profile['base_url'], profile['model']),
+                         ('deepseek', 'sk-main', 'https://api.deepseek.com', 'deepseek-chat'))
+        self.assertEqual(profile['max_tokens'], 256)
+        self.assertEqual(get_step_profile(MAIN, STEP_DRAFT)['api_key'], 'sk-main')
+
+    def test_other_provider_without_key_fails(self):
+        config = dict(MAIN, step_profiles={STEP_SELECT: {'provider': 'openai', 'model': 'gpt-4o-mini'}})
+        with self.assertRaises(ValueError) as ctx:
+            get_step_profile(config, STEP_SELECT)
+        self.assertIn("'select'", str(ctx.exception))
+
+    def test_other_provider_never_gets_main_key_or_endpoint(self):
+        config = dict(MAIN, step_profiles={STEP_SELECT: {'provider': 'openai', 'api_key': 'sk-openai'}})
+        profile = get_step_profile(config, STEP_SELECT)
+        self.assertEqual(profile['api_key'], 'sk-openai')
+        # Provider defaults (resolved by get_llm), not the main DeepSeek endpoint/model
+        self.assertIsNone(profile['base_url'])
+        self.assertEqual(profile['model'], 'gpt-3.5-turbo')
+
+
+if __name__ == '__main__':
+    unittest.main()
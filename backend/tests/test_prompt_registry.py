@@ -0,0 +1,55 @@
+import unittest
+
+from backend.utils.db import init_engine, Base, session_scope, PromptConfig
+from backend.utils.cache_version import bump_cache_version
+from backend.utils.prompt_registry import PromptRegistry, PROMPT_CACHE_NAME
+
+
+class TestPromptRegistry(unittest.TestCase):
+
+    def setUp(self):
+        engine = init_engine(override_url='sqlite+pysqlite:///:memory:')
+        Base.metadata.create_all(engine)
+        with session_scope() as s:
+            s.add(PromptConfig(scene='a', name='old', content='A1', is_default=False))
+            s.add(PromptConfig(scene='a', name='active', content='A2', is_default=True))
+            s.add(PromptConfig(scene='b', name='only', content='B1', is_default=False))
+        # check_interval=0: consult cache_version on every lookup
+        self.registry = PromptRegistry(check_interval=0)
+
+    def test_prefers_default_then_oldest_row(self):
+        self.assertEqual(self.registry.get_many({'a': 'x', 'b': 'y'}), {'a': 'A2', 'b': 'B1'})
+
+    def test_missing_scene_stores_default(self):
+        self.assertEqual(self.registry.get('c', 'C-default'), 'C-default')
+        with session_scope() as s:
+            row = s.query(PromptConfig).filter_by(scene='c').one()
+            self.assertTrue(row.is_default)
+        self.assertEqual(self.registry.get('c', 'other'), 'C-default')
+
+    def test_invalidate_applies_after_commit(self):
+        self.registry.get('a', 'x')
+        with session_scope() as s:
+            s.query(PromptConfig).filter_by(scene='a', is_default=True).one().content = 'A3'
+            self.registry.invalidate(s)
+        self.assertEqual(self.registry.get('a', 'x'), 'A3')
+
+    def test_other_process_change_detected_by_version(self):
+        self.registry.get('b', 'y')
+        # A write made elsewhere: only the shared version row tells us
+        with session_scope() as s:
+            s.query(PromptConfig).filter_by(scene='b').one().content = 'B2'
+            bump_cache_version(s, PROMPT_CACHE_NAME)
+        self.assertEqual(self.registry.get('b', 'y'), 'B2')
+
+    def test_cached_within_check_interval(self):
+        registry = PromptRegistry(check_interval=3600)
+        registry.get('b', 'y')
+        with session_scope() as s:
+            s.query(PromptConfig).filter_by(scene='b').one().content = 'B2'
+            bump_cache_version(s, PROMPT_CACHE_NAME)
+        self.assertEqual(registry.get('b', 'y'), 'B1')
+
+
+if __name__ == '__main__':
+    unittest.main()
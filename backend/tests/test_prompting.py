@@ -0,0 +1,28 @@
+import unittest
+from types import SimpleNamespace
+
+from backend.article_gen.prompting import SUFFIX_SEPARATOR, build_repo_messages, build_repo_prefix, describe_prompt_cache, format_file_block
+
+
+class TestPrompting(unittest.TestCase):
+
+    def test_later_steps_extend_the_same_prefix(self):
+        context = ""
+        first = build_repo_messages('demo', 'demo/\n    main.py\n', context, 'Goal: pick files')
+        context += format_file_block('main.py', 'print(1)')
+        second = build_repo_messages('demo', 'demo/\n    main.py\n', context, 'Goal: need more?')
+        draft = build_repo_messages('demo', 'demo/\n    main.py\n', context, 'Write the article')
+
+        self.assertEqual(first[0].content, second[0].content)
+        first_prefix = first[1].content.split(SUFFIX_SEPARATOR)[0]
+        self.assertTrue(second[1].content.startswith(first_prefix))
+        self.assertTrue(draft[1].content.startswith(build_repo_prefix('demo', 'demo/\n    main.py\n', context) + SUFFIX_SEPARATOR))
+
+    def test_describe_prompt_cache(self):
+        response = SimpleNamespace(usage_metadata={'input_tokens': 2000, 'output_tokens': 10, 'input_token_details': {'cache_read': 1500}}, response_metadata={})
+        self.assertEqual(describe_prompt_cache(response), "prompt cache: 1500/2000 tokens hit (75%)")
+        self.assertEqual(describe_prompt_cache(SimpleNamespace(usage_metadata=None, response_metadata={})), "prompt cache: no usage reported")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from backend import api_server as api
+from backend.utils.db import init_engine, Base, session_scope, PullRecord, ReanalyzeJob
+
+
+def make_job(**fields):
+    job = dict(
+        job_id='job1', status='running', filter='stale', options={}, target_ids=list(range(100)),
+        cursor=40, succeeded=38, failed_ids=[3, 7], error=None,
+        created_at=None, started_at=None, finished_at=None,
+        resumed_at=datetime.now() - timedelta(minutes=2), resumed_cursor=20,
+    )
+    job.update(fields)
+    return SimpleNamespace(**job)
+
+
+class TestReanalyzeStatus(unittest.TestCase):
+
+    def test_progress_and_eta_use_current_run(self):
+        data = api._reanalyze_job_status(make_job())
+        self.assertEqual((data['total'], data['processed'], data['succeeded'], data['failed']), (100, 40, 38, 2))
+        self.assertEqual(data['percent'], 40.0)
+        # 20 records in the two minutes since the resume, 60 left
+        self.assertAlmostEqual(data['throughput_per_min'], 10, delta=0.5)
+        self.assertAlmostEqual(data['eta_seconds'], 360, delta=20)
+
+    def test_no_eta_before_first_batch_or_after_finish(self):
+        self.assertIsNone(api._reanalyze_job_status(make_job(cursor=20))['eta_seconds'])
+        finished = api._reanalyze_job_status(make_job(status='finished', cursor=100))
+        self.assertEqual(finished['percent'], 100.0)
+        self.assertIsNone(finished['eta_seconds'])
+
+    def test_pending_job_without_targets(self):
+        data = api._reanalyze_job_status(make_job(status='pending', target_ids=None, cursor=0, failed_ids=None))
+        self.assertEqual((data['total'], data['percent'], data['failed']), (0, 0.0, 0))
+
+
+
+class TestReanalyzeJob(unittest.TestCase):
+    """_run_reanalyze_job against SQLite with the summarizer stubbed out."""
+
+    def setUp(self):
+        engine = init_engine(override_url='sqlite+pysqlite:///:memory:')
+        Base.metadata.create_all(engine)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.paths = {}
+        with session_scope() as s:
+            for i in range(1, 8):
+                path = os.path.join(self.tmp.name, f'repo{i}')
+                if i != 3:  # record 3 was deleted from disk
+                    os.makedirs(path)
+                self.paths[i] = path
+                s.add(PullRecord(id=i, repo_full_name=f'o/repo{i}', save_path=path, token_count=10,
+                                 summary='旧简介' if i in (2, 5) else ('暂无介绍' if i == 4 else None),
+                                 detail='旧详情' if i in (2, 5) else None,
+                                 summary_key='key:repo5' if i == 5 else None))
+
+        self.summarized = []
+        self.record_ids = {}
+        self.fail_on_call = None
+        self.calls = 0
+
+        def fake_batch(paths, **kwargs):
+            self.calls += 1
+            if self.calls == self.fail_on_call:
+                raise RuntimeError('worker restarted')
+            self.summarized.extend(paths)
+            self.record_ids.update(kwargs.get('record_ids') or {})
+            return [{'repo_dir': p, 'summary': f'简介 {os.path.basename(p)}', 'detail': '详情', 'error': None} for p in paths]
+
+        for name, value in [
+            ('generate_summaries_batch', fake_batch),
+            ('_current_summary_key', lambda path, templates, cfg: f'key:{os.path.basename(path)}'),
+            ('_get_summary_llm_config', lambda: {'provider': 'openai', 'base_url': None, 'model_name': 'm', 'api_key': 'k'}),
+            ('_get_summary_templates', lambda: {'detail': 'd', 'summary': 's'}),
+            ('_sync_pull_records_from_json', lambda: None),
+        ]:
+            patcher = patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def add_job(self, job_id, filter_name, **fields):
+        with session_scope() as s:
+            s.add(ReanalyzeJob(job_id=job_id, status='pending', filter=filter_name, options={'batch_size': 2},
+                               cursor=0, succeeded=0, **fields))
+
+    def job(self, job_id):
+        with session_scope() as s:
+            job = s.query(ReanalyzeJob).filter_by(job_id=job_id).one()
+            return SimpleNamespace(status=job.status, cursor=job.cursor, succeeded=job.succeeded, target_ids=job.target_ids)
+
+    def test_interrupted_job_resumes_from_its_cursor(self):
+        self.add_job('j1', 'all')
+        self.fail_on_call = 2
+        api._run_reanalyze_job('j1')
+        job = self.job('j1')
+        self.assertEqual(job.status, 'failed')
+        # Batch 1 committed with its cursor, the interrupted batch 2 did not
+        self.assertEqual((job.target_ids, job.cursor, job.succeeded), ([1, 2, 4, 5, 6, 7], 2, 2))
+        with session_scope() as s:
+            self.assertEqual(s.get(PullRecord, 2).summary, '简介 repo2')
+            self.assertEqual(s.get(PullRecord, 4).summary, '暂无介绍')
+
+        api._run_reanalyze_job('j1')
+        job = self.job('j1')
+        self.assertEqual((job.status, job.cursor, job.succeeded), ('finished', 6, 6))
+        # Every record summarized exactly once across both runs
+        self.assertEqual(sorted(self.summarized), sorted(self.paths[i] for i in (1, 2, 4, 5, 6, 7)))
+        # LLM calls are attributed to the pull records, not to repo directories
+        self.assertEqual(self.record_ids, {self.paths[i]: i for i in (1, 2, 4, 5, 6, 7)})
+        with session_scope() as s:
+            record = s.get(PullRecord, 7)
+            self.assertEqual((record.summary, record.summary_key), ('简介 repo7', 'key:repo7'))
+
+    def test_filters_select_the_right_records(self):
+        templates, cfg = api._get_summary_templates(), api._get_summary_llm_config()
+        self.assertEqual(api._select_reanalyze_targets('all', templates, cfg), [1, 2, 4, 5, 6, 7])
+        # No summary/detail yet, or the placeholder summary
+        self.assertEqual(api._select_reanalyze_targets('missing', templates, cfg), [1, 4, 6, 7])
+        # summary_key differs from what would be generated now
+        self.assertEqual(api._select_reanalyze_targets('stale', templates, cfg), [1, 2, 4, 6, 7])
+        with session_scope() as s:
+            s.add(ReanalyzeJob(job_id='old', status='finished', filter='all', failed_ids=[4, 3, 7]))
+        # Records of the last finished job that failed (3 is gone from disk)
+        self.assertEqual(api._select_reanalyze_targets('failed', templates, cfg), [4, 7])
+
+    def test_finished_job_is_not_run_again(self):
+        self.add_job('j2', 'missing')
+        api._run_reanalyze_job('j2')
+        self.assertEqual(self.job('j2').target_ids, [1, 4, 6, 7])
+        api._run_reanalyze_job('j2')
+        self.assertEqual(len(self.summarized), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
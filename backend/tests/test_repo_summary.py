@@ -0,0 +1,120 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from backend import api_server as api
+from backend.llm.telemetry import current_context
+
+
+class FakeCache:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value, ttl=None):
+        self.data[key] = value
+
+
+CFG = {'provider': 'deepseek', 'base_url': None, 'model_name': 'deepseek-chat', 'api_key': 'sk-test'}
+TEMPLATES = {'detail': api.DEFAULT_REPO_DETAIL_PROMPT, 'summary': api.DEFAULT_REPO_SUMMARY_PROMPT}
+
+
+@patch.object(api, '_get_summary_templates', return_value=TEMPLATES)
+@patch.object(api, '_get_summary_llm_config', return_value=CFG)
+@patch('pull.github_pull.get_readme_content', return_value='# Demo\nA demo project.')
+class TestRepoSummary(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = FakeCache()
+        patcher = patch.object(api, '_repo_summary_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch.object(api, 'REPO_SUMMARY_MODE', 'single')
+    @patch.object(api, '_call_llm_service', return_value='{"detail": "## 详细介绍", "summary": "一个演示项目"}')
+    def test_single_call_then_readme_hash_skip(self, mock_call, *_):
+        self.assertEqual(api._generate_ai_summary_detail('/tmp/demo'), ('一个演示项目', '## 详细介绍'))
+        self.assertEqual(mock_call.call_count, 1)
+        self.assertTrue(mock_call.call_args.kwargs['json_mode'])
+
+        # Unchanged README and templates: no LLM call at all
+        self.assertEqual(api._generate_ai_summary_detail('/tmp/demo'), ('一个演示项目', '## 详细介绍'))
+        self.assertEqual(mock_call.call_count, 1)
+
+        # bypass_cache forces regeneration
+        api._generate_ai_summary_detail('/tmp/demo', bypass_cache=True)
+        self.assertEqual(mock_call.call_count, 2)
+
+    @patch.object(api, 'REPO_SUMMARY_MODE', 'single')
+    @patch.object(api, '_call_llm_service', side_effect=['not json', '## 详细介绍', '一个演示项目'])
+    def test_malformed_answer_falls_back_to_two_calls(self, mock_call, *_):
+        self.assertEqual(api._generate_ai_summary_detail('/tmp/demo'), ('一个演示项目', '## 详细介绍'))
+        self.assertEqual(mock_call.call_count, 3)
+        self.assertEqual(len(self.cache.data), 1)
+
+    @patch.object(api, 'REPO_SUMMARY_MODE', 'two_step')
+    def test_llm_calls_are_attributed_to_the_pull_record(self, *_):
+        record_ids = []
+
+        def fake_call(*args, **kwargs):
+            record_ids.append(current_context().get('record_id'))
+            return '一个演示项目'
+
+        with patch.object(api, '_call_llm_service', side_effect=fake_call):
+            api._generate_ai_summary_detail('/tmp/demo', record_id=42)
+        self.assertEqual(record_ids, [42, 42])
+
+    @patch.object(api, 'SUMMARY_DETAIL_MAX_TOKENS', 50)
+    def test_summary_prompt_detail_is_cut_by_tokens(self, *_):
+        detail = '项目说明' * 200 + '结尾标记'
+        prompt = api._build_summary_messages(detail, TEMPLATES)[1]['content']
+        self.assertIn(api.truncate_to_tokens(detail, 50), prompt)
+        self.assertNotIn('结尾标记', prompt)
+
+    def test_template_change_invalidates_cache(self, *_):
+        changed = dict(TEMPLATES, summary='一句话概括：{detail}')
+        self.assertNotEqual(api._summary_cache_key('readme', TEMPLATES, CFG), api._summary_cache_key('readme', changed, CFG))
+        self.assertNotEqual(api._summary_cache_key('readme', TEMPLATES, CFG), api._summary_cache_key('readme v2', TEMPLATES, CFG))
+
+    def test_parse_summary_detail(self, *_):
+        self.assertEqual(api._parse_summary_detail('```json\n{"detail": "d", "summary": "s"}\n```'), ('s', 'd'))
+        self.assertIsNone(api._parse_summary_detail('{"detail": "d"}'))
+        self.assertIsNone(api._parse_summary_detail(None))
+
+
+@patch.object(api, '_get_summary_templates', return_value=TEMPLATES)
+@patch.object(api, '_get_summary_llm_config', return_value=CFG)
+@patch.object(api, 'session_scope', None)
+@patch.object(api, '_read_json', return_value=[])
+class TestBackgroundClone(unittest.TestCase):
+
+    def test_each_repo_is_summarized_as_soon_as_it_is_cloned(self, *_):
+        first_summary_started = threading.Event()
+        order = []
+
+        def fake_clone(url, path, trace_id=None):
+            if url.endswith('/b'):
+                # The second clone only finishes once the first repo's summary has started
+                first_summary_started.wait(2)
+            order.append(f'clone {path}')
+            return True, 10
+
+        async def fake_summary(repo_dir, cfg, bypass_cache=False, templates=None, record_id=None):
+            order.append(f'summary {repo_dir} #{record_id}')
+            first_summary_started.set()
+            return 'summary', 'detail'
+
+        items = [{'url': 'https://github.com/x/a', 'path': '/tmp/pipeline/a', 'record_id': 1},
+                 {'url': 'https://github.com/x/b', 'path': '/tmp/pipeline/b', 'record_id': 2}]
+        with patch.object(api, '_clone_and_count', side_effect=fake_clone), \
+                patch.object(api, '_agenerate_ai_summary_detail', side_effect=fake_summary):
+            api._background_clone(items)
+
+        self.assertEqual(order, ['clone /tmp/pipeline/a', 'summary /tmp/pipeline/a #1',
+                                 'clone /tmp/pipeline/b', 'summary /tmp/pipeline/b #2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
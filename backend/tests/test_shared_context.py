@@ -0,0 +1,49 @@
+import threading
+import time
+import unittest
+
+from backend.article_gen.context import RepoContext, SharedContexts
+
+
+class TestSharedContexts(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_build(self):
+        store = SharedContexts(ttl=60)
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.2)
+            return RepoContext(file_tree='tree', context='ctx')
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(store.get('b1:7', build))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_failed_build_is_not_kept(self):
+        store = SharedContexts(ttl=60)
+
+        def fail():
+            raise RuntimeError('llm down')
+
+        with self.assertRaises(RuntimeError):
+            store.get('b1:7', fail)
+        ctx = store.get('b1:7', lambda: RepoContext(file_tree='tree'))
+        self.assertEqual(ctx.file_tree, 'tree')
+
+    def test_expired_entries_are_rebuilt(self):
+        store = SharedContexts(ttl=0)
+        store.get('k', lambda: RepoContext(file_tree='old'))
+        time.sleep(0.01)
+        self.assertEqual(store.get('k', lambda: RepoContext(file_tree='new')).file_tree, 'new')
+
+
+if __name__ == '__main__':
+    unittest.main()
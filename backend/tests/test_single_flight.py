@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from backend.utils.single_flight import ResourceBusy, SingleFlight, advisory_lock
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        flights = SingleFlight('test')
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do('/repo', work))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        self.assertTrue(flights.in_flight('/repo'))
+        release.set()
+        for t in threads:
+            t.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result'] * 5)
+        self.assertFalse(flights.in_flight('/repo'))
+        # Finished keys run again
+        self.assertEqual(flights.do('/repo', lambda: 'again'), 'again')
+
+    def test_joiners_see_the_owner_label(self):
+        flights = SingleFlight('test')
+        started, release = threading.Event(), threading.Event()
+        seen = []
+
+        def work():
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        owner = threading.Thread(target=lambda: flights.do('key', work, owner='task-a'))
+        owner.start()
+        started.wait(5)
+        joiner = threading.Thread(target=lambda: flights.do('key', work, on_join=lambda: seen.append(flights.owner_of('key'))))
+        joiner.start()
+        time.sleep(0.1)
+        release.set()
+        owner.join(5)
+        joiner.join(5)
+        self.assertEqual(seen, ['task-a'])
+        self.assertIsNone(flights.owner_of('key'))
+
+    def test_errors_reach_every_waiter_and_no_wait_raises_busy(self):
+        flights = SingleFlight('test')
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def fail():
+            started.set()
+            release.wait(5)
+            raise RuntimeError('git failed')
+
+        def call():
+            try:
+                flights.do('k', fail)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        owner = threading.Thread(target=call)
+        owner.start()
+        self.assertTrue(started.wait(5))
+        waiter = threading.Thread(target=call)
+        waiter.start()
+        with self.assertRaises(ResourceBusy):
+            flights.do('k', lambda: 'x', wait=False)
+        release.set()
+        owner.join(5)
+        waiter.join(5)
+        self.assertEqual(errors, ['git failed', 'git failed'])
+
+    def test_async_caller_joins_sync_call(self):
+        flights = SingleFlight('test')
+        started, release = threading.Event(), threading.Event()
+
+        def work():
+            started.set()
+            release.wait(5)
+            return ('summary', 'detail')
+
+        owner_result = []
+        owner = threading.Thread(target=lambda: owner_result.append(flights.do('repo:0', work)))
+        owner.start()
+        self.assertTrue(started.wait(5))
+
+        async def should_not_run():
+            raise AssertionError('joined call must not run')
+
+        async def joined():
+            threading.Timer(0.1, release.set).start()
+            return await flights.ado('repo:0', should_not_run)
+
+        self.assertEqual(asyncio.run(joined()), ('summary', 'detail'))
+        owner.join(5)
+        self.assertEqual(owner_result, [('summary', 'detail')])
+
+    def test_distributed_lock_without_server_database(self):
+        # SQLite / no database: single process, the lock is always granted
+        with advisory_lock('clone:/repo', timeout=0) as acquired:
+            self.assertTrue(acquired)
+        self.assertEqual(SingleFlight('test').do('k', lambda: 1, distributed=True, wait=False), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import builtins
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from backend.utils.task_progress import TaskProgressWriter
+
+
+class FakeHub:
+    def __init__(self):
+        self.events = []
+
+    def publish(self, task_id, event, data):
+        self.events.append((event, data))
+
+    def close(self, task_id, status=None):
+        self.events.append(('end', status))
+
+
+class TestTaskProgressWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.log_path = os.path.join(tempfile.mkdtemp(), 'make_t1.log')
+        self.persisted = []
+        self.hub = FakeHub()
+        self.writer = TaskProgressWriter('t1', self.log_path, lambda status, fields: self.persisted.append((status, fields)), self.hub, flush_interval=60)
+
+    def read_log(self):
+        with open(self.log_path, encoding='utf-8') as f:
+            return f.read()
+
+    def test_db_written_only_on_changes(self):
+        self.writer.update('processing', 'start')
+        for i in range(20):
+            self.writer.update('processing', f'step {i}')
+        self.writer.update('processing', 'found', repo_name='a/b')
+        self.writer.update('processing', 'again', repo_name='a/b')
+        self.writer.update('generated', 'done', content='# Article')
+        self.assertEqual(self.persisted, [
+            ('processing', {}),
+            ('processing', {'repo_name': 'a/b'}),
+            ('generated', {'content': '# Article'}),
+        ])
+
+    def test_logs_buffered_until_terminal_status(self):
+        self.writer.update('processing', 'start')  # first line flushes: nothing written recently
+        for i in range(5):
+            self.writer.log(f'line {i}')
+        self.assertNotIn('line 0', self.read_log())
+        self.writer.update('failed', 'boom')
+        log = self.read_log()
+        self.assertIn('line 4', log)
+        self.assertIn('Status changed to failed', log)
+        self.assertEqual(log.count('Status changed to processing'), 1)
+        self.assertEqual(self.hub.events[-1], ('end', 'failed'))
+        self.assertEqual(sum(1 for e, _ in self.hub.events if e == 'log'), 7)
+
+    def test_timer_flushes_idle_buffer(self):
+        writer = TaskProgressWriter('t1', self.log_path, flush_interval=0.05)
+        writer.log('first')
+        writer.log('second')
+        time.sleep(0.3)
+        self.assertIn('second', self.read_log())
+
+
+    def test_concurrent_flushes_keep_line_order(self):
+        self.writer.log('first')  # written at once
+        self.writer.log('early')
+        release = threading.Event()
+        real_open = builtins.open
+        calls = []
+
+        def slow_open(*args, **kwargs):
+            calls.append(args[0])
+            if len(calls) == 1:
+                # The timer's flush has taken 'early' but not written it yet
+                release.wait(5)
+            return real_open(*args, **kwargs)
+
+        with patch('backend.utils.task_progress.open', slow_open, create=True):
+            timer_flush = threading.Thread(target=self.writer.flush)
+            timer_flush.start()
+            time.sleep(0.05)
+            terminal = threading.Thread(target=self.writer.update, args=('failed', 'late'))
+            terminal.start()
+            time.sleep(0.05)
+            release.set()
+            timer_flush.join(5)
+            terminal.join(5)
+        log = self.read_log()
+        self.assertLess(log.index('early'), log.index('late'))
+        self.assertLess(log.index('late'), log.index('Status changed to failed'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import threading
+import unittest
+
+from backend.utils.task_queue import TaskExecutor, PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+
+
+class TestTaskExecutor(unittest.TestCase):
+
+    def test_lanes_and_bounded_workers(self):
+        executor = TaskExecutor(workers=1, name='test')
+        gate = threading.Event()
+        done = threading.Event()
+        order = []
+
+        started = threading.Event()
+        executor.submit('blocker', lambda: (started.set(), gate.wait()))
+        self.assertTrue(started.wait(5))
+        executor.submit('bulk-1', order.append, 'bulk-1', priority=PRIORITY_BULK)
+        executor.submit('normal', order.append, 'normal', priority=PRIORITY_NORMAL)
+        executor.submit('bulk-2', order.append, 'bulk-2', priority=PRIORITY_BULK)
+        executor.submit('revise', order.append, 'revise', priority=PRIORITY_INTERACTIVE)
+        executor.submit('last', done.set, priority=PRIORITY_BULK)
+
+        stats = executor.stats()
+        self.assertEqual(stats['queued_by_lane'], {'interactive': 1, 'normal': 1, 'bulk': 3})
+        self.assertEqual(executor.position('revise'), 1)
+        self.assertEqual(executor.position('last'), 5)
+
+        gate.set()
+        self.assertTrue(done.wait(5))
+        self.assertEqual(order, ['revise', 'normal', 'bulk-1', 'bulk-2'])
+        self.assertEqual(executor.stats()['queued'], 0)
+        self.assertIsNotNone(executor.stats()['max_wait_seconds'])
+
+    def test_same_task_not_queued_twice(self):
+        executor = TaskExecutor(workers=1, name='test')
+        gate = threading.Event()
+        self.assertTrue(executor.submit('t1', gate.wait))
+        self.assertFalse(executor.submit('t1', gate.wait))
+        gate.set()
+
+    def test_failing_task_does_not_kill_worker(self):
+        executor = TaskExecutor(workers=1, name='test')
+        done = threading.Event()
+        executor.submit('boom', lambda: 1 / 0)
+        executor.submit('ok', done.set)
+        self.assertTrue(done.wait(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import threading
+
+from backend.utils.task_stream import TaskStreamHub
+
+
+def test_late_subscriber_replays_buffered_events():
+    hub = TaskStreamHub()
+    hub.publish('t1', 'content', '你好')
+    hub.publish('t1', 'content', '世界')
+    hub.close('t1', 'generated')
+    events = list(hub.iter_events('t1'))
+    assert events == [('content', '你好'), ('content', '世界'), ('end', {'status': 'generated'})]
+
+
+def test_live_subscriber_receives_events_until_close():
+    hub = TaskStreamHub()
+    received = []
+
+    def consume():
+        for item in hub.iter_events('t2', keepalive=0.05):
+            if item is not None:
+                received.append(item)
+
+    t = threading.Thread(target=consume)
+    t.start()
+    hub.publish('t2', 'reasoning', 'thinking')
+    hub.close('t2', 'failed')
+    t.join(timeout=5)
+    assert not t.is_alive()
+    assert received == [('reasoning', 'thinking'), ('end', {'status': 'failed'})]
+
+
+def test_idle_stream_yields_keepalive_then_gives_up():
+    hub = TaskStreamHub()
+    items = list(hub.iter_events('t3', keepalive=0.01, idle_timeout=0.05))
+    assert items and all(item is None for item in items)
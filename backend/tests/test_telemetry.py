@@ -0,0 +1,74 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from backend.llm import telemetry
+from backend.llm.telemetry import aggregate_rows, bind_context, current_context, extract_usage, llm_call_context, llm_metrics, record_llm_call
+
+
+class TestTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        telemetry._recent.clear()
+        # Keep rows in memory only
+        patcher = patch.object(telemetry, 'LlmCall', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_extract_usage_normalized_metadata(self):
+        response = SimpleNamespace(
+            usage_metadata={'input_tokens': 1200, 'output_tokens': 300, 'input_token_details': {'cache_read': 1024}, 'output_token_details': {'reasoning': 120}},
+            response_metadata={},
+        )
+        self.assertEqual(extract_usage(response), {'prompt_tokens': 1200, 'completion_tokens': 300, 'reasoning_tokens': 120, 'cached_tokens': 1024})
+
+    def test_extract_usage_deepseek_raw_payload(self):
+        response = SimpleNamespace(usage_metadata=None, response_metadata={'token_usage': {
+            'prompt_tokens': 900, 'completion_tokens': 50, 'prompt_cache_hit_tokens': 640,
+            'completion_tokens_details': {'reasoning_tokens': 20},
+        }})
+        self.assertEqual(extract_usage(response), {'prompt_tokens': 900, 'completion_tokens': 50, 'reasoning_tokens': 20, 'cached_tokens': 640})
+
+    def test_context_nests_and_follows_worker_threads(self):
+        with llm_call_context(task_id='t1'):
+            with llm_call_context(step='draft'):
+                self.assertEqual(current_context(), {'task_id': 't1', 'step': 'draft'})
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    seen = list(executor.map(bind_context(lambda _: current_context()), range(2)))
+            self.assertEqual(current_context(), {'task_id': 't1'})
+        self.assertEqual(seen, [{'task_id': 't1', 'step': 'draft'}] * 2)
+        self.assertEqual(current_context(), {})
+
+    def test_record_and_aggregate_by_step_and_model(self):
+        usage = SimpleNamespace(usage_metadata={'input_tokens': 100, 'output_tokens': 10, 'input_token_details': {'cache_read': 50}}, response_metadata={})
+        with llm_call_context(task_id='t1', step='select'):
+            record_llm_call('api.deepseek.com', 'deepseek-chat', 'ok', 0.5, response=usage)
+            record_llm_call('api.deepseek.com', 'deepseek-chat', 'rate_limited', 1.5)
+            record_llm_call('api.deepseek.com', 'deepseek-chat', 'ok', 0, response=usage, response_cached=True)
+        with llm_call_context(task_id='t2', step='draft'):
+            record_llm_call('api.deepseek.com', 'deepseek-reasoner', 'ok', 10, response=usage, ttft=2, streamed=True)
+
+        groups = {(g['step'], g['model']): g for g in llm_metrics(hours=1)}
+        select = groups[('select', 'deepseek-chat')]
+        self.assertEqual(select['calls'], 3)
+        self.assertEqual(select['errors'], 1)
+        self.assertEqual(select['response_cache_hits'], 1)
+        # Cached responses cost no provider tokens
+        self.assertEqual(select['prompt_tokens'], 100)
+        self.assertEqual(select['prompt_cache_ratio'], 0.5)
+        self.assertEqual(select['max_latency_ms'], 1500)
+        self.assertIsNone(select['avg_ttft_ms'])
+
+        draft = groups[('draft', 'deepseek-reasoner')]
+        self.assertEqual(draft['avg_ttft_ms'], 2000)
+        self.assertEqual(draft['avg_latency_ms'], 10000)
+
+        self.assertEqual([g['step'] for g in llm_metrics(hours=1, task_id='t2')], ['draft'])
+
+    def test_aggregate_empty(self):
+        self.assertEqual(aggregate_rows([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from unittest.mock import patch
+
+from backend.utils import tokenizer
+from backend.utils.tokenizer import count_tokens, count_tokens_batch, encoding_name_for, estimate_tokens, truncate_to_tokens
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def test_estimate_weights_cjk_higher_than_ascii(self):
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens('a' * 400), 100)
+        self.assertEqual(estimate_tokens('项目' * 50), 100)
+        self.assertGreater(estimate_tokens('这是一个中文句子'), estimate_tokens('an English one'))
+
+    def test_encoding_name_for_unknown_model_uses_default(self):
+        self.assertEqual(encoding_name_for(None), 'cl100k_base')
+        self.assertEqual(encoding_name_for('deepseek-chat'), 'cl100k_base')
+
+    def test_falls_back_to_estimates_without_encoding(self):
+        with patch.dict(tokenizer._encodings, {'cl100k_base': None}):
+            self.assertEqual(count_tokens('a' * 40), 10)
+            self.assertEqual(count_tokens_batch(['a' * 40, '项目']), [10, 2])
+            truncated = truncate_to_tokens('中' * 1000, 100)
+            self.assertLessEqual(estimate_tokens(truncated), 100)
+            self.assertGreater(len(truncated), 90)
+
+    def test_truncate_short_text_untouched(self):
+        with patch.object(tokenizer, 'get_encoding', side_effect=AssertionError('should not tokenize')):
+            self.assertEqual(truncate_to_tokens('short text', 100), 'short text')
+        self.assertEqual(truncate_to_tokens('anything', 0), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
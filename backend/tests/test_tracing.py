@@ -0,0 +1,83 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from backend.llm.telemetry import bind_context
+from backend.utils import tracing
+from backend.utils.tracing import get_spans, record_span, span, step_percentiles, to_otlp, trace, waterfall
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        tracing._recent.clear()
+        # Keep spans in memory only
+        patcher = patch.object(tracing, 'TraceSpan', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_no_trace_records_nothing(self):
+        with span('select') as attrs:
+            attrs['files'] = 3
+        record_span('queue', 0, 1)
+        self.assertEqual(len(tracing._recent), 0)
+
+    def test_spans_nest_under_the_task_and_follow_worker_threads(self):
+        with trace('t1'), span('task'):
+            with span('index') as attrs:
+                attrs['files'] = 12
+            def section(i):
+                with span('generate', section=i):
+                    pass
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(bind_context(section), range(2)))
+        spans = get_spans('t1')
+        by_name = {}
+        for s in spans:
+            by_name.setdefault(s['name'], []).append(s)
+        task_id = by_name['task'][0]['span_id']
+        self.assertEqual(by_name['index'][0]['parent_id'], task_id)
+        self.assertEqual(by_name['index'][0]['attributes'], {'files': 12})
+        self.assertEqual([s['parent_id'] for s in by_name['generate']], [task_id, task_id])
+
+        view = waterfall(spans)
+        self.assertEqual(view['spans'][0]['name'], 'task')
+        self.assertEqual([s['depth'] for s in view['spans']], [0, 1, 1, 1])
+        self.assertGreaterEqual(view['total_ms'], view['spans'][1]['offset_ms'])
+
+    def test_error_marks_span_and_propagates(self):
+        with self.assertRaises(ValueError):
+            with span('clone', trace_id='pull:r1:a/b'):
+                raise ValueError('git failed')
+        [s] = get_spans('pull:r1:a/b')
+        self.assertEqual(s['status'], 'error')
+        self.assertEqual(s['attributes']['error'], 'git failed')
+
+    def test_record_span_and_percentiles(self):
+        for i, ms in enumerate([100, 200, 300, 400, 1000]):
+            record_span('generate', 1000.0, 1000.0 + ms / 1000, trace_id=f"task{i}")
+        record_span('clone', 1000.0, 1002.0, trace_id='pull:r1:a/b', status='error')
+        steps = {s['name']: s for s in step_percentiles()}
+        self.assertEqual(steps['generate']['count'], 5)
+        self.assertEqual(steps['generate']['p50_ms'], 300)
+        self.assertEqual(steps['generate']['p95_ms'], 1000)
+        self.assertEqual(steps['clone']['errors'], 1)
+        self.assertEqual([s['name'] for s in step_percentiles(trace_prefix='pull:')], ['clone'])
+
+    def test_otlp_export(self):
+        with trace('t2'), span('task'):
+            with span('pack', tokens=1500):
+                pass
+        export = to_otlp('t2', get_spans('t2'))
+        otlp_spans = export['resourceSpans'][0]['scopeSpans'][0]['spans']
+        self.assertEqual(len(otlp_spans), 2)
+        self.assertEqual(len({s['traceId'] for s in otlp_spans}), 1)
+        self.assertEqual(len(otlp_spans[0]['traceId']), 32)
+        pack = next(s for s in otlp_spans if s['name'] == 'pack')
+        self.assertEqual(pack['parentSpanId'], otlp_spans[0]['spanId'])
+        self.assertIn({'key': 'app.tokens', 'value': {'intValue': '1500'}}, pack['attributes'])
+        self.assertLessEqual(int(pack['startTimeUnixNano']), int(pack['endTimeUnixNano']))
+
+
+if __name__ == '__main__':
+    unittest.main()
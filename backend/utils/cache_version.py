@@ -0,0 +1,25 @@
+from datetime import datetime
+
+try:
+    from backend.utils.db import CacheVersion
+except ImportError:
+    from utils.db import CacheVersion
+
+
+def get_cache_version(session, name: str) -> int:
+    """Current version of cache ``name`` (0 until first bumped)."""
+    from sqlalchemy import select
+    version = session.execute(select(CacheVersion.version).where(CacheVersion.name == name)).scalar()
+    return int(version or 0)
+
+
+def bump_cache_version(session, name: str):
+    """Increment the version of cache ``name`` in the caller's transaction, so readers see it together with the data change."""
+    from sqlalchemy import update
+    result = session.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1, updated_at=datetime.now())
+    )
+    if not result.rowcount:
+        session.add(CacheVersion(name=name, version=1, updated_at=datetime.now()))
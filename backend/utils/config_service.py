@@ -0,0 +1,287 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from backend.utils.store import CONFIG_DIR, read_json
+    from backend.utils.db import session_scope, MakeConfig, PullConfig, PublishConfig
+    from backend.utils.cache_version import get_cache_version, bump_cache_version
+except ImportError:
+    from utils.store import CONFIG_DIR, read_json
+    try:
+        from utils.db import session_scope, MakeConfig, PullConfig, PublishConfig
+        from utils.cache_version import get_cache_version, bump_cache_version
+    except ImportError:
+        session_scope = None
+        MakeConfig = PullConfig = PublishConfig = None
+
+# 多进程部署时，其他进程保存的配置最迟在这么多秒后生效
+CONFIG_CHECK_INTERVAL = float(os.getenv('CONFIG_CHECK_INTERVAL', '5'))
+
+MODEL_CONFIG = 'make_config'
+PULL_CONFIG = 'pull_config'
+PUBLISH_CONFIG = 'publish_config'
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _hhmm(value) -> Optional[str]:
+    return value.strftime('%H:%M') if value else None
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+@dataclass(frozen=True)
+class ModelSettings:
+    provider: str = 'openai'
+    base_url: str = ''
+    model: str = ''
+    external_api_key: str = ''
+    engine_version: str = 'v1'
+    word_limit: int = 8000
+    step_profiles: Dict[str, Any] = field(default_factory=dict)
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row) -> 'ModelSettings':
+        return cls(
+            provider=_text(row.provider) or 'openai',
+            base_url=_text(row.base_url) or '',
+            model=_text(row.model) or '',
+            external_api_key=_text(row.external_api_key) or '',
+            engine_version=_text(row.engine_version) or 'v1',
+            word_limit=row.word_limit or 8000,
+            step_profiles=row.step_profiles or {},
+            updated_at=_iso(row.updated_at),
+        )
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'ModelSettings':
+        return cls(
+            provider=data.get('provider') or 'openai',
+            base_url=data.get('base_url') or '',
+            model=data.get('model') or '',
+            external_api_key=_text(data.get('external_api_key')) or '',
+            engine_version=data.get('engine_version') or 'v1',
+            word_limit=data.get('word_limit') or 8000,
+            step_profiles=data.get('step_profiles') or {},
+            updated_at=data.get('updated_at'),
+        )
+
+    def to_dict(self) -> Dict:
+        """Shape of /api/config/model."""
+        return asdict(self)
+
+    def llm_config(self) -> Dict:
+        """The ``llm_config`` dict passed to generators and summary helpers."""
+        return {
+            'provider': self.provider,
+            'base_url': self.base_url,
+            'model_name': self.model,
+            'api_key': self.external_api_key,
+            'engine_version': self.engine_version,
+            'word_limit': self.word_limit,
+            'step_profiles': dict(self.step_profiles),
+        }
+
+
+@dataclass(frozen=True)
+class PullSettings:
+    sources: Any = None
+    keywords: Optional[str] = None
+    keywords_list: List[str] = field(default_factory=list)
+    rule: Optional[str] = None
+    frequency: Optional[str] = None
+    weekday: Optional[int] = None
+    times_per_week: Optional[int] = None
+    start_time: Optional[str] = None
+    concurrency: Optional[int] = None
+    per_project_delay: Optional[int] = None
+    batch: Optional[int] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row) -> 'PullSettings':
+        return cls(
+            sources=row.sources, keywords=row.keywords, keywords_list=row.keywords_list or [],
+            rule=row.rule, frequency=row.frequency, weekday=row.weekday, times_per_week=row.times_per_week,
+            start_time=_hhmm(row.start_time), concurrency=row.concurrency, per_project_delay=row.per_project_delay,
+            batch=row.batch, updated_at=_iso(row.updated_at),
+        )
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'PullSettings':
+        return cls(
+            sources=data.get('sources'), keywords=data.get('keywords'), keywords_list=data.get('keywords_list') or [],
+            rule=data.get('rule'), frequency=data.get('frequency'), weekday=data.get('weekday'),
+            times_per_week=data.get('timesPerWeek'), start_time=data.get('startTime'),
+            concurrency=data.get('concurrency'), per_project_delay=data.get('perProjectDelay'),
+            batch=data.get('batch'), updated_at=data.get('updated_at'),
+        )
+
+    def to_dict(self) -> Dict:
+        """Shape of /api/pull/config; ``keywords`` is derived from ``keywords_list`` when missing."""
+        keywords = self.keywords
+        if not keywords and isinstance(self.keywords_list, list):
+            keywords = ', '.join([str(s).strip() for s in self.keywords_list if str(s).strip()])
+        return {
+            'sources': self.sources,
+            'keywords': keywords,
+            'keywords_list': list(self.keywords_list),
+            'rule': self.rule,
+            'frequency': self.frequency,
+            'weekday': self.weekday,
+            'timesPerWeek': self.times_per_week,
+            'startTime': self.start_time,
+            'concurrency': self.concurrency,
+            'perProjectDelay': self.per_project_delay,
+            'batch': self.batch,
+            'updated_at': self.updated_at,
+        }
+
+
+@dataclass(frozen=True)
+class PublishSettings:
+    platforms: Any = None
+    account: Optional[str] = None
+    api_key: Optional[str] = None
+    publish_time: Optional[str] = None
+    updated_at: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row) -> 'PublishSettings':
+        return cls(platforms=row.platforms, account=_text(row.account), api_key=_text(row.api_key),
+                   publish_time=_hhmm(row.publish_time), updated_at=_iso(row.updated_at))
+
+    @classmethod
+    def from_json(cls, data: Dict) -> 'PublishSettings':
+        return cls(platforms=data.get('platforms'), account=data.get('account'), api_key=data.get('apiKey'),
+                   publish_time=data.get('publishTime'), updated_at=data.get('updated_at'))
+
+    def to_dict(self) -> Dict:
+        """Shape of /api/publish/config."""
+        return {
+            'platforms': self.platforms,
+            'account': self.account,
+            'apiKey': self.api_key,
+            'publishTime': self.publish_time,
+            'updated_at': self.updated_at,
+        }
+
+
+@dataclass
+class _Source:
+    model: Any
+    json_file: str
+    settings: type
+    # DB row is only used when it passes; otherwise the JSON file wins if it has content
+    row_usable: Callable[[Any], bool] = lambda row: True
+
+
+class ConfigService:
+    """
+    Effective configuration (latest DB row, falling back to ``configs/*.json``),
+    resolved once and cached per kind.
+
+    Each cached value is stamped with its ``cache_version`` row and the JSON
+    file's mtime. Lookups re-check those stamps at most every
+    ``check_interval`` seconds; saves call ``invalidate`` so they are visible
+    immediately in this process and at the next check in others.
+    """
+
+    def __init__(self, check_interval: float = CONFIG_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.sources = {
+            MODEL_CONFIG: _Source(MakeConfig, 'model_config.json', ModelSettings, lambda row: bool(row.external_api_key)),
+            PULL_CONFIG: _Source(PullConfig, 'pull_config.json', PullSettings),
+            PUBLISH_CONFIG: _Source(PublishConfig, 'publish_config.json', PublishSettings),
+        }
+        self._cache: Dict[str, tuple] = {}  # kind -> (value, version, json_mtime, checked_at)
+        self._lock = threading.Lock()
+
+    def _json_path(self, kind: str) -> str:
+        return os.path.join(CONFIG_DIR, self.sources[kind].json_file)
+
+    def _json_mtime(self, kind: str) -> Optional[float]:
+        try:
+            return os.stat(self._json_path(kind)).st_mtime
+        except OSError:
+            return None
+
+    def _db_version(self, kind: str) -> Optional[int]:
+        if not session_scope or self.sources[kind].model is None:
+            return None
+        try:
+            with session_scope() as s:
+                return get_cache_version(s, kind) if s is not None else None
+        except Exception:
+            return None
+
+    def _resolve(self, kind: str):
+        """(settings, version) read from the DB and the JSON file."""
+        source = self.sources[kind]
+        row_settings, version = None, None
+        if session_scope and source.model is not None:
+            try:
+                from sqlalchemy import select, desc
+                with session_scope() as s:
+                    if s is not None:
+                        version = get_cache_version(s, kind)
+                        row = s.execute(select(source.model).order_by(desc(source.model.updated_at)).limit(1)).scalars().first()
+                        if row is not None:
+                            row_settings = source.settings.from_row(row)
+                            if source.row_usable(row):
+                                return row_settings, version
+            except Exception as e:
+                print(f"Config load failed for {kind}: {e}")
+        data = read_json(self._json_path(kind), {}) or {}
+        if data or row_settings is None:
+            return source.settings.from_json(data), version
+        return row_settings, version
+
+    def get(self, kind: str):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(kind)
+        if cached is not None:
+            value, version, mtime, checked_at = cached
+            if now - checked_at < self.check_interval:
+                return value
+            if self._json_mtime(kind) == mtime and self._db_version(kind) == version:
+                with self._lock:
+                    self._cache[kind] = (value, version, mtime, now)
+                return value
+
+        mtime = self._json_mtime(kind)
+        value, version = self._resolve(kind)
+        with self._lock:
+            self._cache[kind] = (value, version, mtime, time.monotonic())
+        return value
+
+    def model_config(self) -> ModelSettings:
+        return self.get(MODEL_CONFIG)
+
+    def pull_config(self) -> PullSettings:
+        return self.get(PULL_CONFIG)
+
+    def publish_config(self) -> PublishSettings:
+        return self.get(PUBLISH_CONFIG)
+
+    def invalidate(self, kind: str, session=None):
+        """Drop the cached ``kind``; with ``session``, also bump its version in the caller's transaction."""
+        if session is not None:
+            from sqlalchemy import event
+            bump_cache_version(session, kind)
+            event.listen(session, 'after_commit', lambda _s: self.invalidate(kind), once=True)
+            return
+        with self._lock:
+            self._cache.pop(kind, None)
+
+
+config_service = ConfigService()
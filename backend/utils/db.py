@@ -67,7 +67,7 @@ class PullConfig(Base):
     concurrency = Column(Integer)
     per_project_delay = Column(Integer)
     batch = Column(Integer)
-    updated_at = Column(DateTime)
+    updated_at = Column(DateTime, index=True)  # effective config = latest row
 
 
 class PullRecord(Base):
@@ -85,6 +85,8 @@ class PullRecord(Base):
     summary = Column(Text)
     detail = Column(Text)
     token_count = Column(Integer, default=0)
+    # README hash + template version the current summary was generated from
+    summary_key = Column(String(64))
 
 
 class MakeTask(Base):
@@ -99,6 +101,10 @@ class MakeTask(Base):
     thinking_content = Column(Text)
     feedback = Column(Text)
     status = Column(String(32))
+    priority = Column(Integer)  # executor lane, see utils/task_queue.py
+    bypass_cache = Column(Boolean, default=False)
+    prompt_id = Column(BigInteger)  # prompt_config template; None = scene default
+    batch_id = Column(String(64), index=True)
     log_file = Column(String(512))
     created_at = Column(DateTime)
     started_at = Column(DateTime)
@@ -124,7 +130,9 @@ class MakeConfig(Base):
     external_api_key = Column(String(4096))
     engine_version = Column(String(16), default='v1')
     word_limit = Column(Integer, default=8000)
-    updated_at = Column(DateTime)
+    # Per-step model routing, e.g. {"select": {"model": "...", "max_tokens": 512, "temperature": 0, "reasoning": false}}
+    step_profiles = Column(JSON)
+    updated_at = Column(DateTime, index=True)  # effective config = latest row
 
 
 class PublishConfig(Base):
@@ -134,7 +142,7 @@ class PublishConfig(Base):
     account = Column(String(128))
     api_key = Column(String(4096))
     publish_time = Column(Time)
-    updated_at = Column(DateTime)
+    updated_at = Column(DateTime, index=True)  # effective config = latest row
 
 
 class PromptConfig(Base):
@@ -146,3 +154,66 @@ class PromptConfig(Base):
     is_default = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
+class LlmCall(Base):
+    __tablename__ = 'llm_call'
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    task_id = Column(String(64), index=True)  # make_task.task_id
+    record_id = Column(String(255))  # pull record id for summaries
+    step = Column(String(32))  # select | draft | refine | repo_detail | repo_summary | ...
+    provider = Column(String(255))
+    model = Column(String(128))
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    reasoning_tokens = Column(Integer, default=0)
+    cached_tokens = Column(Integer, default=0)  # prompt tokens served from the provider's prefix cache
+    ttft_ms = Column(Integer)  # streaming calls only
+    latency_ms = Column(Integer)
+    outcome = Column(String(32))
+    response_cached = Column(Boolean, default=False)  # served from our local response cache
+    streamed = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+
+class TraceSpan(Base):
+    """One timed step (clone, select, generate, ...) of an article task or pull record."""
+    __tablename__ = 'trace_span'
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    trace_id = Column(String(255), index=True)  # make_task.task_id, pull:<run>:<owner/repo> or reanalyze:<job>:<record id>
+    span_id = Column(String(16))
+    parent_id = Column(String(16))
+    name = Column(String(64), index=True)  # clone | index | summarize | select | pack | generate | refine | render | queue ...
+    status = Column(String(16))  # ok | error
+    start_ms = Column(BigInteger)  # epoch milliseconds
+    duration_ms = Column(Integer)
+    attributes = Column(JSON)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+
+
+class ReanalyzeJob(Base):
+    __tablename__ = 'reanalyze_job'
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    job_id = Column(String(64), unique=True)
+    status = Column(String(32))  # pending | running | finished | failed
+    filter = Column(String(16))  # all | stale | failed | missing
+    options = Column(JSON)  # bypass_cache, batch_size, concurrency, recount_tokens
+    target_ids = Column(JSON)  # pull_record ids selected when the job started
+    cursor = Column(Integer, default=0)  # number of target_ids already committed
+    succeeded = Column(Integer, default=0)
+    failed_ids = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime)
+    resumed_at = Column(DateTime)  # start of the current run, for throughput
+    resumed_cursor = Column(Integer, default=0)
+    finished_at = Column(DateTime)
+    updated_at = Column(DateTime)
+
+
+class CacheVersion(Base):
+    """Change counter per cached table, bumped on every write so each process can cheaply detect stale caches."""
+    __tablename__ = 'cache_version'
+    name = Column(String(64), primary_key=True)
+    version = Column(BigInteger, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Optional
+
+try:
+    from backend.utils.store import DATA_DIR
+except ImportError:
+    from utils.store import DATA_DIR
+
+CACHE_BASE_DIR = os.path.join(DATA_DIR, 'cache')
+
+# 每写入多少次检查一次淘汰，避免每次写入都遍历目录
+EVICT_EVERY_N_WRITES = 200
+
+
+class DiskCache:
+    """
+    Content-addressed JSON cache stored under ``data/cache/<namespace>``.
+
+    Entries are keyed by a sha256 hash, expire after ``ttl`` seconds and the
+    least recently used files are evicted once the namespace grows beyond
+    ``max_bytes``. Writes are atomic, so several worker processes can share
+    the same directory.
+    """
+
+    def __init__(self, namespace: str, ttl: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.namespace = namespace
+        self.directory = os.path.join(CACHE_BASE_DIR, namespace)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}.json')
+
+    def get(self, key: str, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return default
+
+        expires_at = entry.get('expires_at')
+        if expires_at and expires_at < time.time():
+            self.delete(key)
+            return default
+
+        try:
+            # Touch mtime so size-based eviction is LRU rather than FIFO
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry.get('value', default)
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.ttl if ttl is None else ttl
+        entry = {
+            'expires_at': time.time() + ttl if ttl else None,
+            'value': value,
+        }
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"DiskCache[{self.namespace}] write failed: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            should_evict = self._writes % EVICT_EVERY_N_WRITES == 0
+        if should_evict:
+            self.evict()
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Drop expired entries, then the oldest ones until under ``max_bytes``."""
+        if not os.path.isdir(self.directory):
+            return
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.tmp'):
+                    # Leftover from a crashed writer
+                    if now - st.st_mtime > 3600:
+                        self._remove(path)
+                    continue
+                if self.ttl and now - st.st_mtime > self.ttl:
+                    # mtime is refreshed on read, so this entry is idle and most likely expired
+                    self._remove(path)
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+        if not self.max_bytes:
+            return
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% to avoid thrashing at the boundary
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
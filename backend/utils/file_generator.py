@@ -1,11 +1,7 @@
 import os
 import markdown2
-import base64
 import re
-import requests
 import logging
-import json
-import zlib
 try:
     from xhtml2pdf import pisa
 except ImportError:
@@ -14,6 +10,10 @@ from htmldocx import HtmlToDocx
 import htmldocx.h2d
 from docx import Document
 from bs4 import BeautifulSoup
+try:
+    from backend.utils.mermaid_render import render_diagrams
+except ImportError:
+    from utils.mermaid_render import render_diagrams
 
 # Monkey patch htmldocx.h2d.is_url to support data URIs
 # This fixes [Errno 63] File name too long when using data URIs in DOCX
@@ -24,39 +24,35 @@ def patched_is_url(url):
     return original_is_url(url)
 htmldocx.h2d.is_url = patched_is_url
 
-def replace_mermaid_with_images(markdown_text):
+def _mermaid_source(block):
+    code = block.strip()
+    # Common LLM mistake: repeating 'mermaid' inside the block
+    if code.startswith('mermaid'):
+        code = code[7:].strip()
+    return code
+
+def replace_mermaid_with_images(markdown_text, renderer=None):
     """
-    Replace mermaid code blocks with embedded images from mermaid.ink
+    Replace mermaid code blocks with embedded images.
+    All diagrams are rendered at once (see utils.mermaid_render) and cached by source.
     """
-    def replacer(match):
-        code = match.group(1).strip()
-        # Common LLM mistake: repeating 'mermaid' inside the block
-        if code.startswith('mermaid'):
-            code = code[7:].strip()
-            
-        try:
-            # Use Pako (Deflate) encoding for better compatibility (especially with Chinese characters)
-            json_obj = {"code": code, "mermaid": {"theme": "default"}}
-            json_str = json.dumps(json_obj)
-            compressed = zlib.compress(json_str.encode('utf-8'))
-            # Use URL-safe Base64 and strip padding
-            code_b64 = base64.urlsafe_b64encode(compressed).decode('ascii').rstrip('=')
-            url = f"https://mermaid.ink/img/pako:{code_b64}"
-            
-            # Fetch the image to embed it (avoids network issues during PDF/Docx gen)
-            response = requests.get(url, timeout=30)
-            if response.status_code == 200:
-                img_b64 = base64.b64encode(response.content).decode('ascii')
-                content_type = response.headers.get('Content-Type', 'image/jpeg')
-                data_uri = f"data:{content_type};base64,{img_b64}"
-                return f"![Mermaid Diagram]({data_uri})"
-            else:
-                return f"> **Mermaid Diagram Error**: Failed to generate image (Status {response.status_code}). Please check the diagram syntax."
-        except Exception as e:
-            return f"> **Mermaid Diagram Error**: {str(e)}"
-    
     # Regex for fenced code blocks with mermaid
     pattern = r"```mermaid\s+(.*?)```"
+    codes = [_mermaid_source(m.group(1)) for m in re.finditer(pattern, markdown_text, flags=re.DOTALL)]
+    if not codes:
+        return markdown_text
+    try:
+        results = render_diagrams(codes, renderer=renderer)
+    except Exception as e:
+        results = {code: {'error': str(e)} for code in codes}
+
+    def replacer(match):
+        result = results[_mermaid_source(match.group(1))]
+        if result.get('data_uri'):
+            # Embedded so PDF/Docx generation needs no network
+            return f"![Mermaid Diagram]({result['data_uri']})"
+        return f"> **Mermaid Diagram Error**: {result['error']}"
+
     return re.sub(pattern, replacer, markdown_text, flags=re.DOTALL)
 
 def generate_files(article_id, title, content, output_dir):
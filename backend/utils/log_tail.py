@@ -0,0 +1,69 @@
+import os
+import time
+from typing import Callable, Iterator, Optional, Tuple
+
+# 单次返回的最大字节数，超长日志由客户端按 offset 继续拉取
+LOG_TAIL_MAX_BYTES = int(os.getenv('LOG_TAIL_MAX_BYTES', str(256 * 1024)))
+LOG_TAIL_POLL_INTERVAL = 0.5
+LOG_TAIL_KEEPALIVE = 15
+
+
+def read_log_from(path: str, offset: int = 0, max_bytes: int = LOG_TAIL_MAX_BYTES) -> Tuple[str, int, bool]:
+    """
+    ``(text, next_offset, reset)`` for the complete lines of ``path`` after byte ``offset``.
+
+    A trailing partial line is left for the next read. If the file is
+    shorter than ``offset`` (recreated), reading restarts at 0 and ``reset``
+    is True so the client can clear what it shows.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return '', 0, offset > 0
+    reset = False
+    if offset < 0 or offset > size:
+        offset, reset = 0, True
+    if offset == size:
+        return '', offset, reset
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        chunk = f.read(max_bytes)
+    end = chunk.rfind(b'\n')
+    if end < 0:
+        # One line longer than max_bytes: return it in pieces rather than stall
+        end = len(chunk) - 1 if len(chunk) == max_bytes else -1
+    if end < 0:
+        return '', offset, reset
+    chunk = chunk[:end + 1]
+    return chunk.decode('utf-8', errors='replace'), offset + len(chunk), reset
+
+
+def iter_log_chunks(path: str, offset: int = 0, is_finished: Optional[Callable[[], bool]] = None,
+                    poll_interval: float = LOG_TAIL_POLL_INTERVAL, keepalive: float = LOG_TAIL_KEEPALIVE,
+                    idle_timeout: float = 600) -> Iterator[Optional[Tuple[str, int, bool]]]:
+    """
+    Follow ``path`` like ``tail -f``: yields ``(text, next_offset, reset)`` when
+    lines are appended and ``None`` every ``keepalive`` seconds without output.
+    Stops once ``is_finished()`` is true and everything has been read; it is
+    only consulted when the file is idle, and the iteration also gives up
+    after ``idle_timeout`` seconds without output. Each reader keeps its own
+    offset, so any number can follow the same file.
+    """
+    idle_since = last_output = time.monotonic()
+    while True:
+        text, offset, reset = read_log_from(path, offset)
+        if text or reset:
+            idle_since = last_output = time.monotonic()
+            yield text, offset, reset
+            continue
+        if is_finished is not None and is_finished():
+            text, offset, reset = read_log_from(path, offset)
+            if text or reset:
+                yield text, offset, reset
+            return
+        if time.monotonic() - last_output > idle_timeout:
+            return
+        if time.monotonic() - idle_since >= keepalive:
+            idle_since = time.monotonic()
+            yield None
+        time.sleep(poll_interval)
@@ -0,0 +1,146 @@
+import base64
+import json
+import os
+import subprocess
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+try:
+    from backend.utils.disk_cache import DiskCache
+    from backend.utils.single_flight import SingleFlight
+except ImportError:
+    from utils.disk_cache import DiskCache
+    from utils.single_flight import SingleFlight
+
+# 渲染后端：ink（mermaid.ink 或自建的同款服务）| mmdc（本地 mermaid-cli）
+MERMAID_RENDERER = os.getenv('MERMAID_RENDERER', 'ink')
+MERMAID_INK_URL = os.getenv('MERMAID_INK_URL', 'https://mermaid.ink')
+MERMAID_MMDC_PATH = os.getenv('MERMAID_MMDC_PATH', 'mmdc')
+MERMAID_THEME = os.getenv('MERMAID_THEME', 'default')
+MERMAID_RENDER_TIMEOUT = float(os.getenv('MERMAID_RENDER_TIMEOUT', '30'))
+# 一篇文章内同时渲染的图表数
+MERMAID_RENDER_CONCURRENCY = int(os.getenv('MERMAID_RENDER_CONCURRENCY', '6'))
+# 渲染结果缓存时长（秒）；语法错误的负缓存时长更短，渲染器升级后可重新尝试
+MERMAID_CACHE_TTL = int(os.getenv('MERMAID_CACHE_TTL', str(180 * 24 * 3600)))
+MERMAID_ERROR_TTL = int(os.getenv('MERMAID_ERROR_TTL', str(24 * 3600)))
+
+_cache = DiskCache('mermaid_renders', ttl=MERMAID_CACHE_TTL, max_bytes=256 * 1024 * 1024)
+# Concurrent renders of the same diagram (e.g. two approvals) share one request
+_render_flights = SingleFlight('mermaid')
+
+
+class MermaidSyntaxError(Exception):
+    """The renderer rejected the diagram source; retrying it cannot succeed."""
+
+
+class InkRenderer:
+    """mermaid.ink, or a self-hosted instance of it at ``base_url``."""
+
+    def __init__(self, base_url: str = MERMAID_INK_URL, timeout: float = MERMAID_RENDER_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.name = f'ink:{self.base_url}'
+
+    def render(self, code: str, theme: str) -> Tuple[str, bytes]:
+        # Pako (Deflate) encoding for better compatibility (especially with Chinese characters)
+        json_str = json.dumps({"code": code, "mermaid": {"theme": theme}})
+        compressed = zlib.compress(json_str.encode('utf-8'))
+        # URL-safe Base64 without padding
+        code_b64 = base64.urlsafe_b64encode(compressed).decode('ascii').rstrip('=')
+        response = requests.get(f"{self.base_url}/img/pako:{code_b64}", timeout=self.timeout)
+        if response.status_code == 200:
+            return response.headers.get('Content-Type', 'image/jpeg'), response.content
+        if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+            raise MermaidSyntaxError(f"Failed to generate image (Status {response.status_code}). Please check the diagram syntax.")
+        raise RuntimeError(f"Failed to generate image (Status {response.status_code})")
+
+
+class MmdcRenderer:
+    """Local mermaid-cli (``mmdc``), for offline deployments."""
+
+    def __init__(self, command: str = MERMAID_MMDC_PATH, timeout: float = MERMAID_RENDER_TIMEOUT):
+        self.command = command
+        self.timeout = timeout
+        self.name = 'mmdc'
+
+    def render(self, code: str, theme: str) -> Tuple[str, bytes]:
+        with tempfile.TemporaryDirectory(prefix='mermaid_') as tmp:
+            src, out = os.path.join(tmp, 'diagram.mmd'), os.path.join(tmp, 'diagram.png')
+            with open(src, 'w', encoding='utf-8') as f:
+                f.write(code)
+            result = subprocess.run([self.command, '-i', src, '-o', out, '-t', theme, '-q'],
+                                    capture_output=True, text=True, timeout=self.timeout)
+            if result.returncode != 0:
+                message = (result.stderr or result.stdout).strip()[-500:]
+                if 'error' in message.lower() and ('parse' in message.lower() or 'syntax' in message.lower()):
+                    raise MermaidSyntaxError(message)
+                raise RuntimeError(f"mmdc exited with {result.returncode}: {message}")
+            with open(out, 'rb') as f:
+                return 'image/png', f.read()
+
+
+_renderers: Dict[str, Callable[[], object]] = {
+    'ink': InkRenderer,
+    'mmdc': MmdcRenderer,
+}
+
+
+def register_renderer(name: str, factory: Callable[[], object]):
+    """Make a renderer selectable with MERMAID_RENDERER=<name>.
+
+    A renderer has a ``name`` (part of the cache key) and
+    ``render(code, theme) -> (content_type, bytes)``, raising
+    MermaidSyntaxError for diagrams it rejects.
+    """
+    _renderers[name] = factory
+
+
+def get_renderer(name: Optional[str] = None):
+    name = name or MERMAID_RENDERER
+    if name not in _renderers:
+        raise ValueError(f"Unknown mermaid renderer: {name}")
+    return _renderers[name]()
+
+
+def _render_one(renderer, code: str, theme: str) -> Dict:
+    key = DiskCache.make_key('mermaid', renderer.name, theme, code)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    def run():
+        try:
+            content_type, image = renderer.render(code, theme)
+        except MermaidSyntaxError as e:
+            result = {'error': str(e)}
+            _cache.set(key, result, ttl=MERMAID_ERROR_TTL)
+            return result
+        except Exception as e:
+            # Network errors and outages are not cached
+            return {'error': str(e)}
+        result = {'data_uri': f"data:{content_type};base64,{base64.b64encode(image).decode('ascii')}"}
+        _cache.set(key, result)
+        return result
+
+    return _render_flights.do(key, run)
+
+
+def render_diagrams(codes: List[str], theme: Optional[str] = None, renderer=None) -> Dict[str, Dict]:
+    """
+    Render mermaid sources concurrently; returns ``{code: {'data_uri'} or {'error'}}``.
+
+    Results are cached by renderer, theme and source, so re-rendering an
+    article costs no request. Syntax errors are cached for MERMAID_ERROR_TTL.
+    """
+    theme = theme or MERMAID_THEME
+    renderer = renderer or get_renderer()
+    unique = list(dict.fromkeys(codes))
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(MERMAID_RENDER_CONCURRENCY, len(unique)))) as executor:
+        results = list(executor.map(lambda code: _render_one(renderer, code, theme), unique))
+    return dict(zip(unique, results))
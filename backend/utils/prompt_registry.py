@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    from backend.utils.db import session_scope, PromptConfig
+    from backend.utils.cache_version import get_cache_version, bump_cache_version
+except ImportError:
+    try:
+        from utils.db import session_scope, PromptConfig
+        from utils.cache_version import get_cache_version, bump_cache_version
+    except ImportError:
+        session_scope = None
+        PromptConfig = None
+
+PROMPT_CACHE_NAME = 'prompt_config'
+# 多进程部署时，其他进程的修改最迟在这么多秒后生效（每次检查只读一行 cache_version）
+PROMPT_REGISTRY_CHECK_INTERVAL = float(os.getenv('PROMPT_REGISTRY_CHECK_INTERVAL', '5'))
+
+
+class PromptRegistry:
+    """
+    In-memory copy of the active template per scene in ``prompt_config``.
+
+    All templates are loaded in one query and served from memory. Writers call
+    ``invalidate(session)``, which bumps the ``cache_version`` row in the same
+    transaction and drops this process's copy once it commits; other
+    processes notice the new version at their next check.
+    """
+
+    def __init__(self, check_interval: float = PROMPT_REGISTRY_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._prompts: Optional[Dict[str, str]] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self, session=None):
+        """(Re)load every scene's template: the default row, otherwise the oldest one."""
+        if session is None:
+            with session_scope() as s:
+                return self.load(s) if s is not None else None
+        from sqlalchemy import select
+        version = get_cache_version(session, PROMPT_CACHE_NAME)
+        prompts, defaults = {}, {}
+        for row in session.execute(select(PromptConfig).order_by(PromptConfig.id)).scalars():
+            prompts.setdefault(row.scene, row.content)
+            if row.is_default:
+                defaults.setdefault(row.scene, row.content)
+        prompts.update(defaults)
+        with self._lock:
+            self._prompts, self._version, self._checked_at = prompts, version, time.monotonic()
+
+    def _fresh(self, session) -> Dict[str, str]:
+        with self._lock:
+            prompts, version, checked_at = self._prompts, self._version, self._checked_at
+        if prompts is not None and time.monotonic() - checked_at < self.check_interval:
+            return prompts
+        if prompts is not None and get_cache_version(session, PROMPT_CACHE_NAME) == version:
+            with self._lock:
+                self._checked_at = time.monotonic()
+            return prompts
+        self.load(session)
+        return self._prompts
+
+    def get_many(self, defaults: Dict[str, str]) -> Dict[str, str]:
+        """Template per scene of ``defaults``; scenes without any row get their default stored."""
+        if not session_scope or not PromptConfig:
+            return dict(defaults)
+        with self._lock:
+            prompts, checked_at = self._prompts, self._checked_at
+        if prompts is not None and time.monotonic() - checked_at < self.check_interval and all(scene in prompts for scene in defaults):
+            return {scene: prompts[scene] for scene in defaults}
+
+        with session_scope() as s:
+            if s is None:
+                return dict(defaults)
+            prompts = self._fresh(s)
+            missing = {scene: content for scene, content in defaults.items() if scene not in prompts}
+            for scene, content in missing.items():
+                s.add(PromptConfig(scene=scene, name="默认模板", content=content, is_default=True))
+            if missing:
+                self.invalidate(s)
+            return {scene: prompts.get(scene, defaults[scene]) for scene in defaults}
+
+    def get(self, scene: str, default_content: str) -> str:
+        return self.get_many({scene: default_content})[scene]
+
+    def invalidate(self, session=None):
+        """Mark templates changed; with ``session``, the version bump commits together with the caller's writes."""
+        if session is None:
+            with self._lock:
+                self._prompts = None
+            return
+        from sqlalchemy import event
+        bump_cache_version(session, PROMPT_CACHE_NAME)
+        event.listen(session, 'after_commit', lambda _s: self.invalidate(), once=True)
+
+
+prompt_registry = PromptRegistry()
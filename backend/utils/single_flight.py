@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+try:
+    from backend.utils.db import get_engine
+except ImportError:
+    try:
+        from utils.db import get_engine
+    except ImportError:
+        get_engine = None
+
+# 跨进程锁的最长等待时间（秒），超时视为资源被占用
+SINGLE_FLIGHT_LOCK_TIMEOUT = int(os.getenv('SINGLE_FLIGHT_LOCK_TIMEOUT', '1800'))
+# MySQL GET_LOCK names are limited to 64 characters
+MAX_LOCK_NAME = 64
+PG_LOCK_POLL_INTERVAL = 0.5
+
+
+class ResourceBusy(Exception):
+    """The resource is being worked on and the caller chose not to wait."""
+
+
+def _lock_name(name: str) -> str:
+    if len(name) <= MAX_LOCK_NAME:
+        return name
+    return 'sf:' + hashlib.sha1(name.encode('utf-8')).hexdigest()
+
+
+@contextmanager
+def advisory_lock(name: str, timeout: float = SINGLE_FLIGHT_LOCK_TIMEOUT):
+    """
+    Database-wide named lock, held on a dedicated connection for the block;
+    yields whether it was acquired within ``timeout`` seconds (0 = try once).
+
+    Uses ``GET_LOCK`` on MySQL and ``pg_try_advisory_lock`` on PostgreSQL.
+    Without a database, or on SQLite, there is only one process and the lock
+    is always granted.
+    """
+    engine = get_engine() if get_engine else None
+    dialect = engine.dialect.name if engine is not None else None
+    if dialect not in ('mysql', 'postgresql'):
+        yield True
+        return
+
+    from sqlalchemy import text
+    lock_name = _lock_name(name)
+    conn = engine.connect()
+    acquired = False
+    try:
+        if dialect == 'mysql':
+            acquired = conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {'name': lock_name, 'timeout': int(timeout)}).scalar() == 1
+        else:
+            key = int.from_bytes(hashlib.sha1(lock_name.encode('utf-8')).digest()[:8], 'big', signed=True)
+            deadline = time.monotonic() + timeout
+            while True:
+                acquired = bool(conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': key}).scalar())
+                if acquired or time.monotonic() >= deadline:
+                    break
+                time.sleep(PG_LOCK_POLL_INTERVAL)
+        yield acquired
+    finally:
+        try:
+            if acquired and dialect == 'mysql':
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': lock_name})
+            elif acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': key})
+        finally:
+            conn.close()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.owner: Optional[str] = None
+
+    def outcome(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """
+    Keyed single-flight table: while ``fn`` runs for a key, other callers
+    with the same key (in any thread, sync or async) wait for it and get its
+    result or exception instead of running it again.
+
+    With ``distributed=True`` the owner also takes the database advisory
+    lock ``<name>:<key>``, so the same key never runs in two processes at
+    once. A waiter in another process cannot receive the result; it runs
+    ``fn`` itself once the lock is released, which should then be cheap
+    (checkout already up to date, LLM responses cached).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: str, owner: Optional[str] = None):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                call.owner = owner
+                return call, True
+            return call, False
+
+    def _finish(self, key: str, call: _Call):
+        with self._lock:
+            self._calls.pop(key, None)
+        call.done.set()
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def owner_of(self, key: str) -> Optional[str]:
+        """The ``owner`` label passed by the caller running ``key``, if any."""
+        with self._lock:
+            call = self._calls.get(key)
+            return call.owner if call is not None else None
+
+    def do(self, key: str, fn: Callable[[], Any], distributed: bool = False, wait: bool = True,
+           on_join: Optional[Callable[[], None]] = None, owner: Optional[str] = None):
+        """
+        Run ``fn()`` for ``key`` or join the call already running.
+        ``wait=False`` raises ResourceBusy instead of waiting for another caller.
+        ``owner`` labels the call (e.g. a task id) for joiners, see ``owner_of``.
+        """
+        call, is_owner = self._join(key, owner)
+        if not is_owner:
+            if not wait:
+                raise ResourceBusy(f"{self.name}:{key}")
+            if on_join:
+                on_join()
+            call.done.wait()
+            return call.outcome()
+
+        try:
+            if distributed:
+                with advisory_lock(f"{self.name}:{key}", SINGLE_FLIGHT_LOCK_TIMEOUT if wait else 0) as acquired:
+                    if not acquired:
+                        raise ResourceBusy(f"{self.name}:{key}")
+                    call.result = fn()
+            else:
+                call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]], on_join: Optional[Callable[[], None]] = None):
+        """Async ``do`` (in-process only): awaits ``fn()`` or the call already running for ``key``."""
+        call, owner = self._join(key)
+        if not owner:
+            if on_join:
+                on_join()
+            await asyncio.to_thread(call.done.wait)
+            return call.outcome()
+
+        try:
+            call.result = await fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+
+# One table per kind of work; keys are absolute repo paths or task ids
+clone_flights = SingleFlight('clone')
+summary_flights = SingleFlight('summary')
+article_flights = SingleFlight('article')
+generation_flights = SingleFlight('generation')
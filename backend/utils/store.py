@@ -9,13 +9,18 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 # Determine Data Dir
 # Local: backend/../data -> backend/data (Wrong if data is at root)
 # But let's check if ../data exists relative to backend
-if os.path.exists(os.path.join(BASE_DIR, '..', 'data')):
+# 可用环境变量 DATA_DIR / LOGS_DIR 覆盖（测试使用临时目录）
+if os.getenv('DATA_DIR'):
+    DATA_DIR = os.path.abspath(os.getenv('DATA_DIR'))
+elif os.path.exists(os.path.join(BASE_DIR, '..', 'data')):
     DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'data'))
 else:
     DATA_DIR = os.path.join(BASE_DIR, 'data')
 
 # Determine Logs Dir
-if os.path.exists(os.path.join(BASE_DIR, '..', 'logs')):
+if os.getenv('LOGS_DIR'):
+    LOGS_DIR = os.path.abspath(os.getenv('LOGS_DIR'))
+elif os.path.exists(os.path.join(BASE_DIR, '..', 'logs')):
     LOGS_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', 'logs'))
 else:
     LOGS_DIR = os.path.join(BASE_DIR, 'logs')
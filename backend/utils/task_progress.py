@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+# 日志行在内存中缓冲，最多这么多秒落盘一次
+TASK_LOG_FLUSH_INTERVAL = float(os.getenv('TASK_LOG_FLUSH_INTERVAL', '1'))
+# 缓冲超过这么多行时立即落盘
+TASK_LOG_MAX_BUFFERED_LINES = 200
+
+TERMINAL_STATUSES = ('finished', 'failed', 'generated')
+
+
+class TaskProgressWriter:
+    """
+    Status and log sink for one running task.
+
+    Log lines are published to the live stream right away, buffered in memory
+    and appended to the log file at most every ``flush_interval`` seconds.
+    ``persist(status, fields)`` (the DB write) only runs when the status
+    changes or a field gets a new value. Terminal statuses flush everything
+    and close the stream.
+    """
+
+    def __init__(self, task_id: str, log_path: str, persist: Optional[Callable[[str, Dict], None]] = None,
+                 stream_hub=None, flush_interval: float = TASK_LOG_FLUSH_INTERVAL):
+        self.task_id = task_id
+        self.log_path = log_path
+        self.persist = persist
+        self.stream_hub = stream_hub
+        self.flush_interval = flush_interval
+        self.status = None
+        self._fields: Dict = {}
+        self._lines: List[str] = []
+        self._lock = threading.Lock()
+        # Serializes take-and-write so concurrent flushes (timer, size, terminal) append in order
+        self._write_lock = threading.Lock()
+        self._timer = None
+        # The first line is written at once so the log file shows up immediately
+        self._last_flush = float('-inf')
+
+    def log(self, msg: str):
+        if not msg:
+            return
+        if self.stream_hub is not None:
+            self.stream_hub.publish(self.task_id, 'log', msg)
+        self._append(f"{datetime.now().isoformat()} {msg}\n")
+
+    def _append(self, line: str):
+        with self._lock:
+            self._lines.append(line)
+            due = len(self._lines) >= TASK_LOG_MAX_BUFFERED_LINES or time.monotonic() - self._last_flush >= self.flush_interval
+            if not due and self._timer is None:
+                # Flush lines that would otherwise wait for the next log call
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                lines, self._lines = self._lines, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                self._last_flush = time.monotonic()
+            if not lines:
+                return
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
+            except Exception as e:
+                print(f"Task log write failed for {self.task_id}: {e}")
+
+    def update(self, status: str, log_msg: Optional[str] = None, **fields):
+        """Log ``log_msg`` and record ``status``/``fields``; the DB is written only when something changed."""
+        self.log(log_msg)
+        changed = {k: v for k, v in fields.items() if v and self._fields.get(k) != v}
+        if status != self.status:
+            self._append(f"{datetime.now().isoformat()} Status changed to {status}\n")
+        if (status != self.status or changed) and self.persist is not None:
+            try:
+                self.persist(status, changed)
+            except Exception as e:
+                print(f"Task update failed: {e}")
+        self.status = status
+        self._fields.update(changed)
+        if status in TERMINAL_STATUSES:
+            self.flush()
+            if self.stream_hub is not None:
+                self.stream_hub.close(self.task_id, status)
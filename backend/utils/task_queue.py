@@ -0,0 +1,105 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+# Lower value runs first; FIFO within a lane
+PRIORITY_INTERACTIVE = 0   # reviewer revisions: someone is waiting on the page
+PRIORITY_NORMAL = 5        # single article created from the UI
+PRIORITY_BULK = 10         # batch generation
+TASK_PRIORITIES = {'interactive': PRIORITY_INTERACTIVE, 'normal': PRIORITY_NORMAL, 'bulk': PRIORITY_BULK}
+
+# 统计排队等待时间时保留的最近任务数
+WAIT_SAMPLE_SIZE = 200
+
+
+class TaskExecutor:
+    """
+    Fixed pool of worker threads draining a priority queue of tasks.
+
+    ``submit`` never blocks; tasks wait in their lane until a worker is free,
+    so at most ``workers`` tasks run at once. A task id that is already
+    queued or running is not queued twice.
+    """
+
+    def __init__(self, workers: int, name: str = 'task'):
+        self.workers = max(1, int(workers))
+        self.name = name
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued: Dict[str, tuple] = {}   # task_id -> (priority, enqueued_at)
+        self._running: Dict[str, float] = {}  # task_id -> started_at
+        self._waits = deque(maxlen=WAIT_SAMPLE_SIZE)
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self.workers:
+            return
+        for i in range(len(self._threads), self.workers):
+            t = threading.Thread(target=self._worker_loop, name=f'{self.name}-worker-{i}', daemon=True)
+            self._threads.append(t)
+            t.start()
+
+    def submit(self, task_id: str, fn: Callable, *args, priority: int = PRIORITY_NORMAL, **kwargs) -> bool:
+        """Queue ``fn(*args, **kwargs)``; returns False if ``task_id`` is already queued or running."""
+        with self._cond:
+            if task_id in self._queued or task_id in self._running:
+                return False
+            now = time.time()
+            self._queued[task_id] = (priority, now)
+            heapq.heappush(self._heap, (priority, next(self._seq), task_id, fn, args, kwargs))
+            self._ensure_workers()
+            self._cond.notify()
+            return True
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, task_id, fn, args, kwargs = heapq.heappop(self._heap)
+                _, enqueued_at = self._queued.pop(task_id)
+                started = time.time()
+                self._running[task_id] = started
+                self._waits.append(started - enqueued_at)
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                print(f"{self.name} {task_id} crashed: {e}")
+            finally:
+                with self._cond:
+                    self._running.pop(task_id, None)
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based place in the queue (1 = runs next), 0 if running, None if neither queued nor running."""
+        with self._cond:
+            if task_id in self._running:
+                return 0
+            if task_id not in self._queued:
+                return None
+            order = sorted((p, seq, tid) for p, seq, tid, *_ in self._heap)
+            return 1 + [tid for _, _, tid in order].index(task_id)
+
+    def stats(self) -> Dict:
+        """Queue depth per lane, running tasks and queue wait times in seconds."""
+        now = time.time()
+        with self._cond:
+            lanes = {name: 0 for name in TASK_PRIORITIES}
+            names = {v: k for k, v in TASK_PRIORITIES.items()}
+            for priority, _ in self._queued.values():
+                lane = names.get(priority, str(priority))
+                lanes[lane] = lanes.get(lane, 0) + 1
+            waits = list(self._waits)
+            oldest = min((t for _, t in self._queued.values()), default=None)
+            return {
+                'workers': self.workers,
+                'running': len(self._running),
+                'queued': len(self._queued),
+                'queued_by_lane': lanes,
+                'oldest_wait_seconds': round(now - oldest, 1) if oldest else 0,
+                'avg_wait_seconds': round(sum(waits) / len(waits), 1) if waits else None,
+                'max_wait_seconds': round(max(waits), 1) if waits else None,
+            }
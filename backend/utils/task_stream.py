@@ -0,0 +1,92 @@
+import threading
+import time
+from typing import Any, Iterator, Optional, Tuple
+
+# 任务结束后保留事件多久，供晚到的订阅者回放
+STREAM_RETENTION_SECONDS = 600
+
+
+class _TaskStream:
+    def __init__(self):
+        self.events = []
+        self.closed = False
+        self.closed_at = None
+        self.cond = threading.Condition()
+
+
+class TaskStreamHub:
+    """
+    In-process pub/sub for live task output (tokens, reasoning, log lines).
+
+    Producers call ``publish``/``close``; each subscriber iterates
+    ``iter_events`` and first replays everything buffered so far, so a
+    reviewer who opens the stream late still sees the whole document.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def _get(self, task_id: str) -> _TaskStream:
+        with self._lock:
+            self._cleanup()
+            stream = self._streams.get(task_id)
+            if stream is None:
+                stream = _TaskStream()
+                self._streams[task_id] = stream
+            return stream
+
+    def _cleanup(self):
+        now = time.time()
+        expired = [k for k, s in self._streams.items() if s.closed and now - s.closed_at > STREAM_RETENTION_SECONDS]
+        for k in expired:
+            del self._streams[k]
+
+    def publish(self, task_id: str, event: str, data: Any):
+        stream = self._get(task_id)
+        with stream.cond:
+            if stream.closed:
+                # A re-run (e.g. revision) reuses the task id: start a fresh stream
+                stream.events = []
+                stream.closed = False
+                stream.closed_at = None
+            stream.events.append((event, data))
+            stream.cond.notify_all()
+
+    def close(self, task_id: str, status: Optional[str] = None):
+        stream = self._get(task_id)
+        with stream.cond:
+            stream.events.append(('end', {'status': status}))
+            stream.closed = True
+            stream.closed_at = time.time()
+            stream.cond.notify_all()
+
+    def iter_events(self, task_id: str, keepalive: float = 15, idle_timeout: float = 600) -> Iterator[Optional[Tuple[str, Any]]]:
+        """
+        Yield ``(event, data)`` tuples until the task stream ends. ``None`` is
+        yielded every ``keepalive`` seconds without events so the caller can
+        send a heartbeat; the iteration gives up after ``idle_timeout``.
+        """
+        stream = self._get(task_id)
+        index = 0
+        idle_since = time.time()
+        while True:
+            with stream.cond:
+                if index >= len(stream.events) and not stream.closed:
+                    stream.cond.wait(timeout=keepalive)
+                pending = stream.events[index:]
+                closed = stream.closed
+            index += len(pending)
+            for item in pending:
+                yield item
+            if pending:
+                idle_since = time.time()
+                if closed:
+                    return
+                continue
+            if closed or time.time() - idle_since > idle_timeout:
+                return
+            yield None
+
+
+task_streams = TaskStreamHub()
@@ -1,14 +1,19 @@
 import os
+try:
+    from backend.utils.tokenizer import estimate_tokens
+except ImportError:
+    from utils.tokenizer import estimate_tokens
 
 def count_tokens_in_dir(directory: str) -> int:
     """
-    Estimate token count for a directory by counting characters in source files.
-    1 token approx 4 chars.
+    Estimate token count for a directory from its source files.
+    Uses the tokenizer's fast estimator (CJK-aware) instead of a full
+    tokenization, since whole repositories can be many megabytes.
     """
     if not os.path.exists(directory):
         return 0
 
-    total_chars = 0
+    total_tokens = 0
     # Extensions to include
     extensions = {
         '.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.c', '.cpp', '.h', '.hpp', 
@@ -34,9 +39,8 @@ def count_tokens_in_dir(directory: str) -> int:
                     # Try reading as utf-8, ignore errors if binary/mixed
                     with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                         content = f.read()
-                        total_chars += len(content)
+                        total_tokens += estimate_tokens(content)
                 except Exception:
                     pass
-                    
-    # Estimate tokens: chars / 4
-    return int(total_chars / 4)
+
+    return total_tokens
@@ -0,0 +1,108 @@
+import math
+import re
+import threading
+from typing import Dict, List, Optional
+
+DEFAULT_ENCODING = 'cl100k_base'
+
+# Rough tokens per character for cl100k-style BPEs: English/code packs about
+# four characters per token, a CJK character costs about one token, other
+# non-ASCII text (accents, Cyrillic, emoji) sits in between.
+ASCII_TOKENS_PER_CHAR = 0.25
+CJK_TOKENS_PER_CHAR = 1.0
+OTHER_TOKENS_PER_CHAR = 0.5
+
+_CJK_RE = re.compile(r'[　-〿぀-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]')
+
+# encoding name -> tiktoken.Encoding, or None if it could not be loaded
+_encodings: Dict[str, object] = {}
+_encodings_lock = threading.Lock()
+
+
+def encoding_name_for(model: Optional[str] = None) -> str:
+    """tiktoken encoding for ``model``; non-OpenAI models (DeepSeek, Qwen, ...) use cl100k_base."""
+    if not model:
+        return DEFAULT_ENCODING
+    try:
+        from tiktoken.model import encoding_name_for_model
+        return encoding_name_for_model(model)
+    except Exception:
+        return DEFAULT_ENCODING
+
+
+def get_encoding(model: Optional[str] = None):
+    """
+    Process-wide tiktoken encoding for ``model``, loaded once.
+
+    Returns None when tiktoken or its BPE file is unavailable (e.g. offline
+    on first use); callers then fall back to ``estimate_tokens``. A failed
+    load is remembered so it is not retried on every call.
+    """
+    name = encoding_name_for(model)
+    if name in _encodings:
+        return _encodings[name]
+    with _encodings_lock:
+        if name not in _encodings:
+            try:
+                import tiktoken
+                _encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                print(f"Tokenizer: cannot load {name}, using estimates: {e}")
+                _encodings[name] = None
+    return _encodings[name]
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast character-class estimate, aware that CJK text costs far more tokens per character."""
+    if not text:
+        return 0
+    total = len(text)
+    non_ascii = total - len(text.encode('ascii', 'ignore'))
+    cjk = len(_CJK_RE.findall(text)) if non_ascii else 0
+    return math.ceil((total - non_ascii) * ASCII_TOKENS_PER_CHAR + cjk * CJK_TOKENS_PER_CHAR + (non_ascii - cjk) * OTHER_TOKENS_PER_CHAR)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    if not text:
+        return 0
+    enc = get_encoding(model)
+    if enc is None:
+        return estimate_tokens(text)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def encode_batch(texts: List[str], model: Optional[str] = None) -> List[List[int]]:
+    """Token ids for many texts at once (tiktoken encodes the batch on its own thread pool)."""
+    enc = get_encoding(model)
+    if enc is None:
+        raise RuntimeError(f"Tokenizer {encoding_name_for(model)} is not available")
+    return enc.encode_batch(texts, disallowed_special=())
+
+
+def count_tokens_batch(texts: List[str], model: Optional[str] = None) -> List[int]:
+    enc = get_encoding(model)
+    if enc is None:
+        return [estimate_tokens(t) for t in texts]
+    return [len(ids) for ids in enc.encode_batch(texts, disallowed_special=())]
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: Optional[str] = None) -> str:
+    """Longest prefix of ``text`` that fits in ``max_tokens`` tokens."""
+    if not text or max_tokens <= 0:
+        return ""
+    # Every token covers at least one UTF-8 byte, so short texts need no tokenizing
+    if len(text) <= max_tokens and len(text.encode('utf-8')) <= max_tokens:
+        return text
+    enc = get_encoding(model)
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        if len(ids) <= max_tokens:
+            return text
+        # Decoding may end in a partial multi-byte character; drop it
+        return enc.decode(ids[:max_tokens]).rstrip('�')
+
+    estimate = estimate_tokens(text)
+    while estimate > max_tokens:
+        text = text[:max(0, int(len(text) * max_tokens / estimate) - 1)]
+        estimate = estimate_tokens(text)
+    return text
@@ -0,0 +1,295 @@
+import contextvars
+import hashlib
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+try:
+    from backend.utils.db import session_scope, TraceSpan
+except ImportError:
+    try:
+        from utils.db import session_scope, TraceSpan
+    except ImportError:
+        session_scope = None
+        TraceSpan = None
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '1') == '1'
+# 批量写库，与 LLM 调用遥测相同的策略
+TRACING_FLUSH_SIZE = int(os.getenv('TRACING_FLUSH_SIZE', '100'))
+TRACING_FLUSH_INTERVAL = float(os.getenv('TRACING_FLUSH_INTERVAL', '2'))
+# 无数据库时在内存中保留的最近 span 数
+TRACING_MEMORY_SIZE = int(os.getenv('TRACING_MEMORY_SIZE', '20000'))
+# Rows read when computing percentiles over a time window
+MAX_PERCENTILE_ROWS = 100000
+
+SERVICE_NAME = 'github-daily-report'
+
+# (trace_id, current span_id) of the current thread / asyncio task
+_current: contextvars.ContextVar = contextvars.ContextVar('trace_span', default=None)
+
+_queue: "queue.Queue[Dict]" = queue.Queue()
+_recent = deque(maxlen=TRACING_MEMORY_SIZE)
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _new_span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current.get()
+    return current[0] if current else None
+
+
+@contextmanager
+def trace(trace_id: Optional[str]):
+    """Attribute spans opened inside the block to ``trace_id`` (as root spans)."""
+    token = _current.set((trace_id, None) if trace_id else None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, trace_id: Optional[str] = None, **attributes):
+    """
+    Time the block as span ``name``, nested under the enclosing span.
+
+    Outside any trace (and without ``trace_id``) nothing is recorded. Yields
+    the attribute dict, so the block can add results such as file counts.
+    An exception marks the span as an error and propagates.
+    """
+    current = _current.get()
+    if (trace_id is None and current is None) or not TRACING_ENABLED:
+        yield attributes
+        return
+    tid = trace_id or current[0]
+    parent = current[1] if current and current[0] == tid else None
+    span_id = _new_span_id()
+    token = _current.set((tid, span_id))
+    start = time.time()
+    status = 'ok'
+    try:
+        yield attributes
+    except BaseException as e:
+        status = 'error'
+        attributes['error'] = str(e)[:500]
+        raise
+    finally:
+        _current.reset(token)
+        _emit(tid, span_id, parent, name, status, start, time.time(), attributes)
+
+
+def record_span(name: str, start: float, end: float, trace_id: Optional[str] = None, status: str = 'ok', **attributes):
+    """Record a span measured elsewhere (epoch seconds), e.g. time spent waiting in a queue."""
+    current = _current.get()
+    tid = trace_id or (current[0] if current else None)
+    if not tid or not TRACING_ENABLED:
+        return
+    parent = current[1] if current and current[0] == tid else None
+    _emit(tid, _new_span_id(), parent, name, status, start, end, attributes)
+
+
+def _emit(trace_id, span_id, parent_id, name, status, start, end, attributes):
+    row = {
+        'trace_id': str(trace_id)[:255],
+        'span_id': span_id,
+        'parent_id': parent_id,
+        'name': name,
+        'status': status,
+        'start_ms': round(start * 1000),
+        'duration_ms': max(0, round((end - start) * 1000)),
+        'attributes': {k: v for k, v in attributes.items() if v is not None} or None,
+        'created_at': datetime.now(),
+    }
+    _recent.append(row)
+    if session_scope and TraceSpan:
+        _queue.put(row)
+        _ensure_writer()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name='trace-writer', daemon=True)
+            _writer.start()
+
+
+def _writer_loop():
+    while True:
+        rows = [_queue.get()]
+        deadline = time.monotonic() + TRACING_FLUSH_INTERVAL
+        while len(rows) < TRACING_FLUSH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _write_rows(rows)
+
+
+def _write_rows(rows: List[Dict]):
+    try:
+        from sqlalchemy import insert
+        with session_scope() as s:
+            if s is None:
+                return
+            s.execute(insert(TraceSpan), rows)
+    except Exception as e:
+        print(f"Trace write failed ({len(rows)} spans): {e}")
+
+
+def _row_dict(row) -> Dict:
+    if isinstance(row, dict):
+        return row
+    return {k: getattr(row, k) for k in ('trace_id', 'span_id', 'parent_id', 'name', 'status', 'start_ms', 'duration_ms', 'attributes', 'created_at')}
+
+
+def get_spans(trace_id: str) -> List[Dict]:
+    """Spans of one trace, oldest first (spans still queued for the DB included)."""
+    spans = {}
+    if session_scope and TraceSpan:
+        try:
+            from sqlalchemy import select
+            with session_scope() as s:
+                if s is not None:
+                    for row in s.execute(select(TraceSpan).filter_by(trace_id=trace_id)).scalars().all():
+                        spans[row.span_id] = _row_dict(row)
+        except Exception as e:
+            print(f"Trace read failed for {trace_id}: {e}")
+    for row in list(_recent):
+        if row['trace_id'] == trace_id:
+            spans.setdefault(row['span_id'], row)
+    spans = list(spans.values())
+    depths = _depths(spans)
+    # Parents before the children that started in the same millisecond
+    return sorted(spans, key=lambda r: (r['start_ms'], depths[r['span_id']], -r['duration_ms']))
+
+
+def _depths(spans: List[Dict]) -> Dict[str, int]:
+    by_id = {s['span_id']: s for s in spans}
+    depths = {}
+    for s in spans:
+        d, parent, seen = 0, s.get('parent_id'), set()
+        while parent in by_id and parent not in seen:
+            seen.add(parent)
+            d += 1
+            parent = by_id[parent].get('parent_id')
+        depths[s['span_id']] = d
+    return depths
+
+
+def waterfall(spans: List[Dict]) -> Dict:
+    """Spans (as ordered by ``get_spans``) with their offset from the trace start and nesting depth."""
+    if not spans:
+        return {'start_ms': None, 'total_ms': 0, 'spans': []}
+    start = min(s['start_ms'] for s in spans)
+    end = max(s['start_ms'] + s['duration_ms'] for s in spans)
+    depths = _depths(spans)
+    rows = [{
+        'span_id': s['span_id'],
+        'parent_id': s.get('parent_id'),
+        'name': s['name'],
+        'status': s['status'],
+        'depth': depths[s['span_id']],
+        'offset_ms': s['start_ms'] - start,
+        'duration_ms': s['duration_ms'],
+        'attributes': s.get('attributes') or {},
+    } for s in spans]
+    return {'start_ms': start, 'total_ms': end - start, 'spans': rows}
+
+
+def _percentile(sorted_values: List[int], pct: float) -> Optional[int]:
+    if not sorted_values:
+        return None
+    # Nearest rank
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def step_percentiles(hours: float = 24, trace_prefix: Optional[str] = None) -> List[Dict]:
+    """Count, errors, p50/p95/max duration per span name over the last ``hours``."""
+    since = datetime.now() - timedelta(hours=hours)
+    rows = []
+    if session_scope and TraceSpan:
+        from sqlalchemy import select
+        with session_scope() as s:
+            if s is not None:
+                query = select(TraceSpan.name, TraceSpan.duration_ms, TraceSpan.status).where(TraceSpan.created_at >= since)
+                if trace_prefix:
+                    query = query.where(TraceSpan.trace_id.like(f"{trace_prefix}%"))
+                rows = [tuple(r) for r in s.execute(query.limit(MAX_PERCENTILE_ROWS))]
+    if not rows:
+        rows = [(r['name'], r['duration_ms'], r['status']) for r in list(_recent)
+                if r['created_at'] >= since and (not trace_prefix or r['trace_id'].startswith(trace_prefix))]
+
+    groups: Dict[str, Dict] = {}
+    for name, duration, status in rows:
+        group = groups.setdefault(name, {'durations': [], 'errors': 0})
+        group['durations'].append(int(duration or 0))
+        group['errors'] += 0 if status == 'ok' else 1
+    result = []
+    for name, group in sorted(groups.items()):
+        durations = sorted(group['durations'])
+        result.append({
+            'name': name,
+            'count': len(durations),
+            'errors': group['errors'],
+            'p50_ms': _percentile(durations, 50),
+            'p95_ms': _percentile(durations, 95),
+            'max_ms': durations[-1],
+            'total_ms': sum(durations),
+        })
+    return result
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(trace_id: str, spans: List[Dict]) -> Dict:
+    """
+    The trace as OpenTelemetry OTLP/JSON (``ExportTraceServiceRequest``), which
+    Jaeger, Tempo and the OpenTelemetry collector import. Our trace id is kept
+    in the ``app.trace_id`` attribute; the OTLP id is derived from it.
+    """
+    otlp_trace_id = hashlib.md5(trace_id.encode('utf-8')).hexdigest()
+    otlp_spans = []
+    for s in spans:
+        attributes = [{'key': 'app.trace_id', 'value': {'stringValue': trace_id}}]
+        attributes += [{'key': f'app.{k}', 'value': _otlp_value(v)} for k, v in (s.get('attributes') or {}).items()]
+        otlp_spans.append({
+            'traceId': otlp_trace_id,
+            'spanId': s['span_id'],
+            'parentSpanId': s.get('parent_id') or '',
+            'name': s['name'],
+            'kind': 1,  # SPAN_KIND_INTERNAL
+            'startTimeUnixNano': str(s['start_ms'] * 1000000),
+            'endTimeUnixNano': str((s['start_ms'] + s['duration_ms']) * 1000000),
+            'attributes': attributes,
+            'status': {'code': 1 if s['status'] == 'ok' else 2},
+        })
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+        'scopeSpans': [{'scope': {'name': 'backend.utils.tracing'}, 'spans': otlp_spans}],
+    }]}
@@ -93,6 +93,15 @@ export default {
   createArticleTask(data) {
     return api.post('/article/create_task', data)
   },
+  createArticleBatch(data) {
+    return api.post('/article/create_batch', data)
+  },
+  getArticleBatch(batchId) {
+    return api.get(`/article/batch/${batchId}`)
+  },
+  retryMakeTask(taskId) {
+    return api.post(`/make/retry/${taskId}`)
+  },
   getRepoReadme(path) {
     return api.get('/repo/readme', { params: { path } })
   },
@@ -111,8 +120,11 @@ export default {
   getMakeTasks() {
     return api.get('/make/tasks')
   },
-  getMakeLogs(taskId) {
-    return api.get(`/make/logs/${taskId}`)
+  getMakeLogs(taskId, offset) {
+    return api.get(`/make/logs/${taskId}`, { params: offset != null ? { offset } : {} })
+  },
+  makeLogsStreamUrl(taskId, offset = 0) {
+    return `${API_BASE}/make/logs/${taskId}/stream?offset=${offset}`
   },
   enqueueMakeTask(data) {
     return api.post('/make/enqueue', data)